@@ -0,0 +1,293 @@
+"""
+BENCHMARK DO PIPELINE (OFFLINE)
+===============================
+
+Mede cada etapa do pipeline sobre dados sintéticos (gerar_dados_sinteticos.py):
+
+    etapa2_descompactar, etapa3_filtrar, etapa4_normalizar, etapa5_consolidar,
+    validar_dados, executar_enriquecimento, executar_agregacao
+
+Cada etapa roda num processo próprio, para que o pico de memória (RSS) seja
+o da etapa e não o acumulado da execução. Para cada etapa são registrados:
+tempo de parede, tempo de CPU, linhas de entrada, linhas/s e pico de RSS (MB).
+
+O resultado vai para um JSON (baseline) que pode ser comparado com
+execuções futuras:
+
+    python benchmarks/executar_benchmark.py --linhas 1e6 --saida benchmarks/resultados/base.json
+    python benchmarks/executar_benchmark.py --linhas 1e6 --comparar benchmarks/resultados/base.json
+
+Roda totalmente offline: o download do cadastro (Teste 2.2) é desligado e
+o Relatorio_cadop.csv sintético é usado no lugar.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import queue
+import contextlib
+import multiprocessing
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PASTA_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+PASTA_SRC = os.path.join(os.path.dirname(PASTA_BENCHMARKS), "src")
+sys.path.insert(0, PASTA_SRC)
+sys.path.insert(0, PASTA_BENCHMARKS)
+
+import pandas as pd
+from gerar_dados_sinteticos import gerar_dados, ler_meta, ler_escala
+
+
+# CONFIGURAÇÕES
+PASTA_TRABALHO = os.path.join(PASTA_BENCHMARKS, "_trabalho")
+PASTA_RESULTADOS = os.path.join(PASTA_BENCHMARKS, "resultados")
+TOLERANCIA = 0.10  # piora acima de 10% é sinalizada na comparação
+DIFERENCA_MINIMA_SEGUNDOS = 0.05  # abaixo disso é ruído de medição
+
+# pastas geradas pelo pipeline (limpas antes de cada execução)
+PASTAS_GERADAS = [
+    "dados_extraidos", "dados_despesas_sinistros", "dados_normalizados",
+    "dados_consolidados", "dados_validados", "dados_agregados",
+]
+
+# (nome, módulo, função, entrada usada para contar as linhas)
+ETAPAS = [
+    ("etapa2_descompactar", "teste1_pipeline", "etapa2_descompactar", "brutas"),
+    ("etapa3_filtrar", "teste1_pipeline", "etapa3_filtrar", "brutas"),
+    ("etapa4_normalizar", "teste1_pipeline", "etapa4_normalizar", "dados_despesas_sinistros"),
+    ("etapa5_consolidar", "teste1_pipeline", "etapa5_consolidar", "dados_normalizados"),
+    ("validar_dados", "teste2_1_validacao", "validar_dados", "dados_consolidados/consolidado_despesas"),
+    ("executar_enriquecimento", "teste2_2_enriquecimento", "executar_enriquecimento", "dados_validados/despesas_validadas"),
+    ("executar_agregacao", "teste2_3_agregacao", "executar_agregacao", "dados_enriquecidos/consolidado_enriquecido"),
+]
+
+
+# HELPERS
+def _vmhwm_mb():
+    """Pico de RSS do próprio processo no Linux (zerado no exec, ao contrário do ru_maxrss)."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for linha in f:
+                if linha.startswith("VmHWM:"):
+                    return int(linha.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def pico_rss_mb():
+    """Pico de RSS deste processo ou do maior processo filho (workers), em MB."""
+    if resource is None:
+        return None
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024  # macOS: bytes; Linux: KB
+    proprio = _vmhwm_mb()
+    if proprio is None:
+        proprio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor
+    filhos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor
+    return round(max(proprio, filhos), 1)
+
+
+def contar_linhas(entrada, meta):
+    """Linhas de entrada de uma etapa (fora da medição de tempo)."""
+    from formato_intermediario import eh_tabela_binaria, iterar_tabela, localizar_tabela
+
+    if entrada == "brutas":
+        return meta["linhas"]
+
+    if os.path.isdir(entrada) and not eh_tabela_binaria(entrada):
+        # pasta de uma etapa: soma das tabelas (CSV ou binárias) dentro dela
+        caminhos = [
+            os.path.join(entrada, f) for f in os.listdir(entrada)
+            if not f.startswith("_") and (f.endswith(".csv") or eh_tabela_binaria(f))
+        ]
+    else:
+        caminho = localizar_tabela(entrada)
+        caminhos = [caminho] if caminho else []
+
+    total = 0
+    for caminho in caminhos:
+        if eh_tabela_binaria(caminho):
+            total += sum(len(c) for c in iterar_tabela(caminho))
+        else:
+            with open(caminho, "rb") as f:
+                total += max(sum(1 for _ in f) - 1, 0)
+    return total
+
+
+def _executar_etapa(nome_modulo, nome_funcao, pasta, verboso, fila):
+    """Roda uma etapa dentro do processo filho e devolve as medições pela fila."""
+    os.chdir(pasta)
+    sys.path.insert(0, PASTA_SRC)
+    try:
+        import importlib
+        modulo = importlib.import_module(nome_modulo)
+        if nome_modulo == "teste2_2_enriquecimento":
+            modulo.baixar_cadastro_se_precisar = lambda: None  # offline: usa o cadastro sintético
+
+        funcao = getattr(modulo, nome_funcao)
+        saida = contextlib.nullcontext() if verboso else contextlib.redirect_stdout(open(os.devnull, "w"))
+
+        inicio, inicio_cpu = time.perf_counter(), time.process_time()
+        with saida:
+            funcao()
+        segundos, cpu = time.perf_counter() - inicio, time.process_time() - inicio_cpu
+
+        fila.put({"segundos": segundos, "cpu_segundos": cpu, "pico_rss_mb": pico_rss_mb(), "erro": None})
+    except Exception as e:
+        fila.put({"erro": f"{type(e).__name__}: {e}"})
+
+
+# EXECUÇÃO
+def executar_benchmark(linhas, pasta=PASTA_TRABALHO, regerar=False, verboso=False):
+    """Gera os dados (se preciso), roda todas as etapas e retorna o resultado."""
+    pasta = os.path.abspath(pasta)
+    meta = ler_meta(pasta)
+    if regerar or meta is None or meta["linhas"] != linhas:
+        print(f"Gerando dados sintéticos: {linhas:,} linhas...")
+        for p in ("dados_ans", "dados_enriquecidos"):
+            shutil.rmtree(os.path.join(pasta, p), ignore_errors=True)
+        meta = gerar_dados(pasta, linhas)
+    else:
+        print(f"✓ Reaproveitando dados sintéticos em {pasta}")
+
+    # saídas de execuções anteriores (o cadastro sintético é preservado)
+    for p in PASTAS_GERADAS:
+        shutil.rmtree(os.path.join(pasta, p), ignore_errors=True)
+    for f in os.listdir(os.path.join(pasta, "dados_enriquecidos")):
+        if f != "Relatorio_cadop.csv":
+            caminho = os.path.join(pasta, "dados_enriquecidos", f)
+            shutil.rmtree(caminho) if os.path.isdir(caminho) else os.remove(caminho)
+
+    contexto = multiprocessing.get_context("spawn")
+    etapas = []
+
+    print(f"\n{'Etapa':<26}{'Tempo (s)':>11}{'CPU (s)':>10}{'Linhas':>14}{'Linhas/s':>14}{'Pico (MB)':>11}")
+    print("-" * 86)
+
+    for nome, modulo, funcao, entrada in ETAPAS:
+        cwd = os.getcwd()
+        os.chdir(pasta)
+        try:
+            linhas_entrada = contar_linhas(entrada, meta)
+        finally:
+            os.chdir(cwd)
+
+        fila = contexto.Queue()
+        processo = contexto.Process(target=_executar_etapa, args=(modulo, funcao, pasta, verboso, fila))
+        processo.start()
+        medicao = None
+        while medicao is None:
+            try:
+                medicao = fila.get(timeout=1)
+            except queue.Empty:
+                if not processo.is_alive():
+                    # morreu sem responder (ex: sem memória, morto pelo sistema)
+                    medicao = {"erro": f"processo terminou com código {processo.exitcode}"}
+        processo.join()
+
+        if medicao["erro"]:
+            print(f"{nome:<26} ❌ {medicao['erro']}")
+            etapas.append({"etapa": nome, "erro": medicao["erro"]})
+            break
+
+        medicao.pop("erro")
+        medicao["linhas"] = linhas_entrada
+        medicao["linhas_por_segundo"] = round(linhas_entrada / medicao["segundos"], 1) if medicao["segundos"] else None
+        etapas.append({"etapa": nome, **medicao})
+
+        print(
+            f"{nome:<26}{medicao['segundos']:>11.2f}{medicao['cpu_segundos']:>10.2f}"
+            f"{linhas_entrada:>14,}{medicao['linhas_por_segundo'] or 0:>14,.0f}"
+            f"{medicao['pico_rss_mb'] or 0:>11.1f}"
+        )
+
+    total = sum(e.get("segundos", 0) for e in etapas)
+    print("-" * 86)
+    print(f"{'TOTAL':<26}{total:>11.2f}")
+
+    return {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "linhas": linhas,
+        "dados": meta,
+        "ambiente": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "etapas": etapas,
+        "total_segundos": round(total, 3),
+    }
+
+
+def comparar(atual, baseline, tolerancia=TOLERANCIA):
+    """
+    Compara com um resultado anterior (mesmas etapas). Retorna a lista de
+    etapas que ficaram mais lentas que a tolerância.
+    """
+    anteriores = {e["etapa"]: e for e in baseline.get("etapas", []) if "segundos" in e}
+    pioras = []
+
+    if baseline.get("linhas") != atual["linhas"]:
+        print(f"⚠️ Baseline com outra escala ({baseline.get('linhas'):,} linhas): compare linhas/s, não tempo")
+
+    print(f"\n{'Etapa':<26}{'Antes (s)':>11}{'Agora (s)':>11}{'Variação':>11}{'Pico antes':>12}{'Pico agora':>12}")
+    print("-" * 83)
+    for etapa in atual["etapas"]:
+        antes = anteriores.get(etapa["etapa"])
+        if not antes or "segundos" not in etapa:
+            continue
+        variacao = etapa["segundos"] / antes["segundos"] - 1 if antes["segundos"] else 0.0
+        mais_lenta = (
+            variacao > tolerancia
+            and etapa["segundos"] - antes["segundos"] > DIFERENCA_MINIMA_SEGUNDOS
+        )
+        marca = " ⚠️" if mais_lenta else ""
+        if marca:
+            pioras.append(etapa["etapa"])
+        print(
+            f"{etapa['etapa']:<26}{antes['segundos']:>11.2f}{etapa['segundos']:>11.2f}"
+            f"{variacao:>+10.1%}{antes.get('pico_rss_mb') or 0:>12.1f}{etapa.get('pico_rss_mb') or 0:>12.1f}{marca}"
+        )
+
+    if pioras:
+        print(f"\n⚠️ {len(pioras)} etapa(s) mais lenta(s) que a baseline (> {tolerancia:.0%}): {', '.join(pioras)}")
+    else:
+        print("\n✓ Nenhuma etapa mais lenta que a baseline")
+    return pioras
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline do pipeline com dados sintéticos.")
+    parser.add_argument("--linhas", default="1e5", help="total de linhas sintéticas (1e5 a 1e8)")
+    parser.add_argument("--pasta", default=PASTA_TRABALHO, help="pasta de trabalho (dados gerados)")
+    parser.add_argument("--saida", help="JSON de resultado (padrão: benchmarks/resultados/benchmark_<linhas>.json)")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior (baseline)")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    parser.add_argument("--regerar", action="store_true", help="gera os dados sintéticos de novo")
+    parser.add_argument("--verboso", action="store_true", help="mostra a saída das etapas")
+    args = parser.parse_args()
+
+    linhas = ler_escala(args.linhas)
+    resultado = executar_benchmark(linhas, args.pasta, args.regerar, args.verboso)
+
+    saida = args.saida or os.path.join(PASTA_RESULTADOS, f"benchmark_{linhas}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"\n📁 Resultado salvo: {saida}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if comparar(resultado, baseline, args.tolerancia):
+            sys.exit(1)
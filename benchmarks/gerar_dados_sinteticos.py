@@ -0,0 +1,230 @@
+"""
+GERADOR DE DADOS SINTÉTICOS DA ANS
+==================================
+
+Gera, sem acesso à rede, arquivos no mesmo layout dos dados abertos da ANS:
+
+- ZIPs trimestrais das demonstrações contábeis (1T2025.zip, 2T2025.zip, ...)
+  com um CSV em latin-1, separador ';', campos entre aspas e valores com
+  vírgula decimal (pt-BR):
+
+    "DATA";"REG_ANS";"CD_CONTA_CONTABIL";"DESCRICAO";"VL_SALDO_INICIAL";"VL_SALDO_FINAL"
+
+- Relatorio_cadop.csv (cadastro de operadoras) com as mesmas operadoras,
+  CNPJs com dígitos verificadores válidos e alguns registros duplicados
+
+As linhas são geradas em blocos com NumPy e gravadas em stream dentro do
+ZIP, então a escala vai de 1e5 a 1e8 linhas sem estourar a memória.
+
+Uso:
+    python benchmarks/gerar_dados_sinteticos.py --linhas 1e6 --pasta benchmarks/_trabalho
+"""
+
+import os
+import io
+import csv
+import json
+import argparse
+import zipfile
+import numpy as np
+import pandas as pd
+
+
+# CONFIGURAÇÕES
+TRIMESTRES = ("1T2025", "2T2025", "3T2025")
+OPERADORAS = 1000
+LINHAS_POR_BLOCO = 500_000
+SEMENTE = 42
+ARQUIVO_META = "_dados_sinteticos.json"
+
+# plano de contas resumido: (código, descrição, peso na amostra)
+# contas da classe 3 com palavras-chave são as que o filtro do Teste 1 mantém
+PLANO_CONTAS = [
+    ("1", "ATIVO", 4),
+    ("12", "ATIVO CIRCULANTE", 4),
+    ("1211", "Aplicações Financeiras", 6),
+    ("2", "PASSIVO", 4),
+    ("2111", "Provisões Técnicas de Operações de Assistência à Saúde", 6),
+    ("3", "RECEITAS", 3),
+    ("31", "Contraprestações Efetivas de Plano de Assistência à Saúde", 6),
+    ("3111", "Eventos Indenizáveis Líquidos / Sinistros Retidos", 8),
+    ("31111", "Despesas com Eventos / Sinistros", 8),
+    ("311111", "Eventos / Sinistros Conhecidos ou Avisados", 10),
+    ("3117", "Variação da Provisão de Eventos Ocorridos e Não Avisados", 6),
+    ("3411", "Despesas com Procedimentos Odontológicos", 5),
+    ("3412", "Despesas de Atendimento Ambulatorial", 5),
+    ("3511", "Receitas de Assistência Médico-Hospitalar", 4),
+    ("4", "DESPESAS", 3),
+    ("41", "Despesas Administrativas", 6),
+    ("4611", "Despesas de Comercialização", 5),
+    ("6", "RESULTADO", 2),
+]
+
+MODALIDADES = [
+    "Cooperativa Médica", "Medicina de Grupo", "Autogestão",
+    "Seguradora Especializada em Saúde", "Odontologia de Grupo",
+    "Cooperativa Odontológica", "Filantropia",
+]
+UFS = ["SP", "RJ", "MG", "RS", "PR", "BA", "SC", "PE", "CE", "GO", "DF", "ES"]
+
+
+# HELPERS
+def ler_escala(texto):
+    """'1e6' / '1000000' / '1_000_000' -> 1000000."""
+    return int(float(str(texto).replace("_", "")))
+
+
+def digitos_cnpj(base12):
+    """Completa os 12 primeiros dígitos com os 2 dígitos verificadores."""
+    pesos1 = [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+    pesos2 = [6] + pesos1
+    numeros = [int(d) for d in base12]
+
+    resto = sum(n * p for n, p in zip(numeros, pesos1)) % 11
+    numeros.append(0 if resto < 2 else 11 - resto)
+    resto = sum(n * p for n, p in zip(numeros, pesos2)) % 11
+    numeros.append(0 if resto < 2 else 11 - resto)
+
+    return "".join(str(n) for n in numeros)
+
+
+def formatar_cnpj(cnpj):
+    return f"{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:8]}/{cnpj[8:12]}-{cnpj[12:]}"
+
+
+def registros_ans(operadoras, rng):
+    """Registros ANS de 6 dígitos, distintos."""
+    return np.sort(rng.choice(np.arange(300000, 430000), size=operadoras, replace=False)).astype(str)
+
+
+# GERAÇÃO
+def gerar_bloco(rng, registros, tamanho, data):
+    """Um bloco de linhas no layout das demonstrações contábeis."""
+    codigos = np.array([c for c, _, _ in PLANO_CONTAS])
+    descricoes = np.array([d for _, d, _ in PLANO_CONTAS])
+    pesos = np.array([p for _, _, p in PLANO_CONTAS], dtype=float)
+
+    conta = rng.choice(len(PLANO_CONTAS), size=tamanho, p=pesos / pesos.sum())
+    saldo_inicial = np.round(rng.lognormal(11, 2, size=tamanho), 2)
+    saldo_final = np.round(saldo_inicial * rng.uniform(0.5, 1.5, size=tamanho), 2)
+    # alguns saldos negativos / zerados, como nos arquivos reais
+    saldo_final[rng.random(tamanho) < 0.02] *= -1
+    saldo_final[rng.random(tamanho) < 0.01] = 0
+
+    return pd.DataFrame({
+        "DATA": data,
+        "REG_ANS": rng.choice(registros, size=tamanho),
+        "CD_CONTA_CONTABIL": codigos[conta],
+        "DESCRICAO": descricoes[conta],
+        "VL_SALDO_INICIAL": saldo_inicial,
+        "VL_SALDO_FINAL": saldo_final,
+    })
+
+
+def gerar_trimestre(caminho_zip, trimestre, linhas, registros, rng):
+    """Grava '<trimestre>.zip' com '<trimestre>.csv' dentro, em stream."""
+    numero, ano = trimestre[0], trimestre[2:]
+    data = f"{ano}-{(int(numero) - 1) * 3 + 1:02d}-01"
+
+    with zipfile.ZipFile(caminho_zip, "w", zipfile.ZIP_DEFLATED) as zf:
+        with zf.open(f"{trimestre}.csv", "w", force_zip64=True) as bruto:
+            texto = io.TextIOWrapper(bruto, encoding="latin-1", newline="")
+            cabecalho = True
+            for inicio in range(0, linhas, LINHAS_POR_BLOCO):
+                tamanho = min(LINHAS_POR_BLOCO, linhas - inicio)
+                gerar_bloco(rng, registros, tamanho, data).to_csv(
+                    texto,
+                    sep=";",
+                    decimal=",",
+                    index=False,
+                    header=cabecalho,
+                    quoting=csv.QUOTE_ALL,
+                    lineterminator="\r\n",
+                )
+                cabecalho = False
+            texto.flush()
+            texto.detach()
+
+
+def gerar_cadastro(caminho, registros, rng, duplicados=0.01):
+    """
+    Relatorio_cadop.csv com uma linha por operadora e uma fração de
+    registros duplicados com dados divergentes (para o desempate do Teste 2.2).
+    """
+    linhas = []
+    for i, reg in enumerate(registros):
+        cnpj = digitos_cnpj(f"{rng.integers(10**7, 10**8)}0001")
+        linhas.append({
+            "REGISTRO_OPERADORA": reg,
+            "CNPJ": formatar_cnpj(cnpj),
+            "Razao_Social": f"OPERADORA SINTETICA {i:05d} LTDA",
+            "Nome_Fantasia": f"SINTETICA {i:05d}",
+            "Modalidade": MODALIDADES[i % len(MODALIDADES)],
+            "UF": UFS[i % len(UFS)],
+        })
+
+    por_registro = {l["REGISTRO_OPERADORA"]: l for l in linhas}
+    for reg in rng.choice(registros, size=int(len(registros) * duplicados), replace=False):
+        copia = dict(por_registro[reg])
+        copia["Modalidade"] = MODALIDADES[(MODALIDADES.index(copia["Modalidade"]) + 1) % len(MODALIDADES)]
+        linhas.append(copia)
+
+    pd.DataFrame(linhas).to_csv(caminho, sep=";", index=False, encoding="utf-8", quoting=csv.QUOTE_ALL)
+
+
+def gerar_dados(pasta, linhas, trimestres=TRIMESTRES, operadoras=OPERADORAS, semente=SEMENTE):
+    """
+    Gera os ZIPs em '<pasta>/dados_ans' e o cadastro em
+    '<pasta>/dados_enriquecidos'. 'linhas' é o total, dividido entre os trimestres.
+
+    Retorna os metadados gravados em '<pasta>/_dados_sinteticos.json'.
+    """
+    rng = np.random.default_rng(semente)
+    registros = registros_ans(operadoras, rng)
+
+    pasta_zips = os.path.join(pasta, "dados_ans")
+    pasta_cadastro = os.path.join(pasta, "dados_enriquecidos")
+    os.makedirs(pasta_zips, exist_ok=True)
+    os.makedirs(pasta_cadastro, exist_ok=True)
+
+    por_trimestre = [linhas // len(trimestres)] * len(trimestres)
+    por_trimestre[-1] += linhas - sum(por_trimestre)
+
+    for trimestre, n in zip(trimestres, por_trimestre):
+        caminho_zip = os.path.join(pasta_zips, f"{trimestre}.zip")
+        gerar_trimestre(caminho_zip, trimestre, n, registros, rng)
+        print(f"  ✓ {trimestre}.zip: {n:,} linhas ({os.path.getsize(caminho_zip) / (1024 * 1024):.2f} MB)")
+
+    gerar_cadastro(os.path.join(pasta_cadastro, "Relatorio_cadop.csv"), registros, rng)
+    print(f"  ✓ Relatorio_cadop.csv: {operadoras:,} operadoras")
+
+    meta = {
+        "linhas": linhas,
+        "trimestres": list(trimestres),
+        "linhas_por_trimestre": por_trimestre,
+        "operadoras": operadoras,
+        "semente": semente,
+    }
+    with open(os.path.join(pasta, ARQUIVO_META), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    return meta
+
+
+def ler_meta(pasta):
+    try:
+        with open(os.path.join(pasta, ARQUIVO_META), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos no layout da ANS (offline).")
+    parser.add_argument("--linhas", default="1e5", help="total de linhas (1e5 a 1e8)")
+    parser.add_argument("--pasta", default=os.path.join("benchmarks", "_trabalho"))
+    parser.add_argument("--operadoras", type=int, default=OPERADORAS)
+    parser.add_argument("--semente", type=int, default=SEMENTE)
+    args = parser.parse_args()
+
+    print(f"Gerando {ler_escala(args.linhas):,} linhas em {args.pasta}...")
+    gerar_dados(args.pasta, ler_escala(args.linhas), operadoras=args.operadoras, semente=args.semente)
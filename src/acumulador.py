@@ -0,0 +1,101 @@
+"""
+ACUMULADOR - TOTAIS POR CHAVE EM ARRAYS NUMPY
+=============================================
+
+Acumula soma, contagem, mínimo e máximo por chave (ex: reg_ans) ao longo
+de vários chunks, sem dict Python e sem loop por chave.
+
+- cada chave distinta recebe um código inteiro denso (0, 1, 2, ...),
+  guardado num pd.Index; os chunks são traduzidos com get_indexer()
+- os totais ficam em arrays NumPy indexados pelo código e são atualizados
+  com np.bincount (soma/contagem) e np.minimum.at / np.maximum.at
+- só no final os arrays viram um DataFrame (para_dataframe)
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class AcumuladorPorChave:
+    """
+    Totais por chave acumulados chunk a chunk.
+
+        acumulador = AcumuladorPorChave()
+        for chunk in chunks:
+            acumulador.adicionar(chunk["reg_ans"], chunk["vl_saldo_final"])
+        acumulador.para_dataframe("reg_ans", "valor_despesas")
+
+    Com extremos=True também guarda mínimo e máximo por chave (custa um
+    pouco mais por chunk, então fica desligado por padrão).
+    """
+
+    def __init__(self, extremos=False):
+        self.extremos = extremos
+        self.chaves = pd.Index([], dtype=object)
+        self.soma = np.zeros(0, dtype=np.float64)
+        self.contagem = np.zeros(0, dtype=np.int64)
+        self.minimo = np.zeros(0, dtype=np.float64)
+        self.maximo = np.zeros(0, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def _codificar(self, chaves):
+        """Chaves do chunk -> códigos globais (cria códigos para chaves novas)."""
+        # códigos locais do chunk: só as chaves distintas passam pelo índice global
+        locais, distintas = pd.factorize(chaves, sort=False)
+        globais = self.chaves.get_indexer(distintas)
+
+        novas = globais < 0
+        if novas.any():
+            inicio = len(self.chaves)
+            total_novas = int(novas.sum())
+            self.chaves = self.chaves.append(pd.Index(distintas[novas], dtype=object))
+            globais[novas] = np.arange(inicio, inicio + total_novas)
+            self._crescer(inicio + total_novas)
+
+        return globais[locais]
+
+    def _crescer(self, tamanho):
+        extra = tamanho - len(self.soma)
+        self.soma = np.concatenate([self.soma, np.zeros(extra)])
+        self.contagem = np.concatenate([self.contagem, np.zeros(extra, dtype=np.int64)])
+        if self.extremos:
+            self.minimo = np.concatenate([self.minimo, np.full(extra, np.inf)])
+            self.maximo = np.concatenate([self.maximo, np.full(extra, -np.inf)])
+
+    def adicionar(self, chaves, valores):
+        """
+        Acumula um chunk. 'chaves' e 'valores' têm o mesmo tamanho;
+        valores NaN devem ser removidos antes (entram na soma como NaN).
+        """
+        valores = np.asarray(valores, dtype=np.float64)
+        if len(valores) == 0:
+            return
+
+        codigos = self._codificar(np.asarray(chaves, dtype=object))
+        n = len(self.chaves)
+
+        self.soma += np.bincount(codigos, weights=valores, minlength=n)
+        self.contagem += np.bincount(codigos, minlength=n)
+        if self.extremos:
+            np.minimum.at(self.minimo, codigos, valores)
+            np.maximum.at(self.maximo, codigos, valores)
+
+    def para_dataframe(self, nome_chave="chave", nome_soma="soma", contagem=None, extremos=False):
+        """
+        Materializa os totais. 'contagem' é o nome da coluna de contagem
+        (None = não incluir); extremos=True inclui as colunas min/max.
+        """
+        df = pd.DataFrame({
+            nome_chave: self.chaves.to_numpy(dtype=object),
+            nome_soma: self.soma,
+        })
+        if contagem:
+            df[contagem] = self.contagem
+        if extremos:
+            if not self.extremos:
+                raise ValueError("Acumulador criado sem extremos=True")
+            df[f"{nome_soma}_min"] = self.minimo
+            df[f"{nome_soma}_max"] = self.maximo
+        return df
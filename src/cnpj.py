@@ -0,0 +1,153 @@
+"""
+CNPJ - NORMALIZAÇÃO E DÍGITOS VERIFICADORES, VETORIZADOS
+========================================================
+
+Funções para colunas inteiras de CNPJ (milhões de valores), sem loop
+Python por valor:
+
+- o texto vira uma matriz de códigos de caractere (array NumPy 'U' visto
+  como uint32, uma linha por valor)
+- os dígitos são localizados por máscara e copiados, por grupo de valores
+  com o mesmo layout, para a direita de uma matriz (n, 14) de zeros
+  (zeros à esquerda)
+- os dois dígitos verificadores são calculados com produto de matrizes
+  pelos pesos oficiais (módulo 11)
+
+    normalizar_cnpj(["11.222.333/0001-81", "1222333000181", None])
+    # -> ['11222333000181', '01222333000181', '']
+    cnpj_valido(["11.222.333/0001-81", "11.222.333/0001-80"])
+    # -> [True, False]
+
+Valores sem nenhum dígito normalizam para "". Valores com mais de 14
+dígitos não são truncados (ficam só com os dígitos) e são inválidos.
+Sequências repetidas (00000000000000, 11111111111111...) passam na conta
+do módulo 11, mas são tratadas como inválidas.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+TAMANHO_CNPJ = 14
+PESOS_DV1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+PESOS_DV2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+ZERO = ord("0")
+NOVE = ord("9")
+
+
+def _como_texto(valores):
+    """Array NumPy 'U' (nulo -> ''); inteiros/floats inteiros sem '.0'."""
+    serie = valores if isinstance(valores, pd.Series) else pd.Series(valores)
+    if pd.api.types.is_integer_dtype(serie.dtype) or (
+        pd.api.types.is_float_dtype(serie.dtype)
+        and np.array_equal(serie.dropna(), np.trunc(serie.dropna()))
+    ):
+        serie = serie.astype("Int64")  # 1.1222333000181e13 -> 11222333000181
+    return serie.astype("string").fillna("").to_numpy(dtype=str)
+
+
+def _matriz_caracteres(texto):
+    """(n, largura) uint32 com os códigos dos caracteres (0 = preenchimento)."""
+    largura = texto.dtype.itemsize // 4
+    if largura == 0:
+        return np.zeros((len(texto), 0), dtype=np.uint32)
+    return np.ascontiguousarray(texto).view(np.uint32).reshape(len(texto), largura)
+
+
+def _digitos_a_direita(valores):
+    """
+    (matriz (n, 14) de dígitos 0-9 com zeros à esquerda, quantidade de
+    dígitos por valor, texto original). Com mais de 14 dígitos, a matriz
+    guarda só os 14 últimos (o valor é inválido de qualquer forma).
+
+    Os valores são agrupados pelo "layout" (em quais posições há dígitos):
+    uma coluna costuma ter poucos layouts ('11.222.333/0001-81',
+    '11222333000181', ...), e em cada um os dígitos estão nas mesmas
+    colunas da matriz de caracteres, então a cópia é uma fatia só.
+    """
+    texto = _como_texto(valores)
+    codigos = _matriz_caracteres(texto)
+    eh_digito = (codigos >= ZERO) & (codigos <= NOVE)
+    quantidade = eh_digito.sum(axis=1)
+
+    digitos = np.zeros((len(texto), TAMANHO_CNPJ), dtype=np.int64)
+    if codigos.shape[1] == 0:
+        return digitos, quantidade, texto
+
+    grupos = _agrupar_layouts(eh_digito)
+    ordem = np.argsort(grupos, kind="stable")
+    limites = np.cumsum(np.bincount(grupos))
+
+    inicio = 0
+    for fim in limites:
+        linhas = ordem[inicio:fim]
+        inicio = fim
+        colunas = np.flatnonzero(eh_digito[linhas[0]])[-TAMANHO_CNPJ:]
+        if len(colunas):
+            digitos[linhas, TAMANHO_CNPJ - len(colunas):] = codigos[linhas[:, None], colunas] - ZERO
+    return digitos, quantidade, texto
+
+
+def _agrupar_layouts(eh_digito):
+    """Código do layout (0, 1, 2...) de cada linha."""
+    bits = np.packbits(eh_digito, axis=1)
+    if bits.shape[1] <= 8:
+        # layout cabe num inteiro de 64 bits: pd.factorize (hash) é direto
+        chaves = np.zeros((len(bits), 8), dtype=np.uint8)
+        chaves[:, :bits.shape[1]] = bits
+        grupos, _ = pd.factorize(chaves.view(np.uint64).reshape(-1))
+    else:
+        # textos com mais de 64 caracteres (raro): compara os bytes do layout
+        chaves = np.ascontiguousarray(bits).view(f"V{bits.shape[1]}").reshape(-1)
+        _, grupos = np.unique(chaves, return_inverse=True)
+        grupos = grupos.reshape(-1)
+    return grupos
+
+
+def somente_digitos(valores):
+    """Só os dígitos de cada valor (sem completar com zeros); nulo -> ''."""
+    texto = _como_texto(valores)
+    codigos = _matriz_caracteres(texto)
+    eh_digito = (codigos >= ZERO) & (codigos <= NOVE)
+    # dígitos para a esquerda, na ordem original; o resto vira preenchimento
+    ordem = np.argsort(~eh_digito, axis=1, kind="stable")
+    compactado = np.where(
+        np.take_along_axis(eh_digito, ordem, axis=1),
+        np.take_along_axis(codigos, ordem, axis=1),
+        0,
+    ).astype(np.uint32)
+    return np.ascontiguousarray(compactado).view(texto.dtype).reshape(-1)
+
+
+def _verificadores_corretos(digitos):
+    dv1 = digitos[:, :12] @ PESOS_DV1 % 11
+    dv1 = np.where(dv1 < 2, 0, 11 - dv1)
+    dv2 = np.column_stack([digitos[:, :12], dv1]) @ PESOS_DV2 % 11
+    dv2 = np.where(dv2 < 2, 0, 11 - dv2)
+    return (digitos[:, 12] == dv1) & (digitos[:, 13] == dv2)
+
+
+def normalizar_cnpj(valores):
+    """CNPJ só com dígitos e com zeros à esquerda até 14; sem dígitos -> ''."""
+    digitos, quantidade, texto = _digitos_a_direita(valores)
+    normalizado = (digitos + ZERO).astype(np.uint32).view(f"U{TAMANHO_CNPJ}").reshape(-1)
+    normalizado = normalizado.astype(object)
+    normalizado[quantidade == 0] = ""
+
+    longos = quantidade > TAMANHO_CNPJ
+    if longos.any():  # raro: mantém todos os dígitos, sem truncar
+        normalizado[longos] = somente_digitos(texto[longos])
+    return normalizado
+
+
+def cnpj_valido(valores):
+    """Máscara: CNPJ com até 14 dígitos (completado com zeros) e DVs corretos."""
+    digitos, quantidade, _ = _digitos_a_direita(valores)
+    repetido = (digitos == digitos[:, :1]).all(axis=1)
+    return (
+        (quantidade > 0)
+        & (quantidade <= TAMANHO_CNPJ)
+        & ~repetido
+        & _verificadores_corretos(digitos)
+    )
@@ -0,0 +1,308 @@
+"""
+DOWNLOADS - MOTOR DE DOWNLOAD DOS ARQUIVOS DA ANS
+=================================================
+
+Baixa vários arquivos em paralelo, com limite de downloads simultâneos.
+
+- downloads interrompidos ficam em '<arquivo>.part' e são retomados
+  com requisições HTTP Range (se o servidor não aceitar Range, recomeça do zero)
+- o arquivo final só aparece na pasta depois de completo (rename atômico)
+- antes de pular um arquivo já existente, confere tamanho (Content-Length)
+  e/ou checksum SHA-256, quando disponíveis
+- cache HTTP condicional: guarda ETag / Last-Modified de cada URL em
+  '_cache_http.json' (na pasta de destino) e envia If-None-Match /
+  If-Modified-Since. Resposta 304 = cópia local reaproveitada, sem baixar o corpo
+
+Usa apenas a biblioteca padrão (urllib), então pode ser testado contra
+um servidor local (python -m http.server).
+"""
+
+import os
+import json
+import hashlib
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+# CONFIGURAÇÕES
+MAX_DOWNLOADS_SIMULTANEOS = 3
+TAMANHO_BLOCO = 1024 * 1024  # 1 MB por leitura
+TIMEOUT_SEGUNDOS = 60
+TENTATIVAS = 3
+ARQUIVO_CACHE = "_cache_http.json"  # um por pasta de destino
+
+_trava_cache = threading.Lock()
+
+
+# HELPERS
+def nome_arquivo_da_url(url):
+    """Nome do arquivo local a partir da URL (último trecho do caminho)."""
+    caminho = urllib.parse.urlparse(url).path
+    return urllib.parse.unquote(os.path.basename(caminho))
+
+
+def calcular_sha256(caminho):
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _validadores(cabecalhos):
+    """Extrai ETag e Last-Modified dos cabeçalhos de uma resposta."""
+    return {
+        "etag": cabecalhos.get("ETag"),
+        "last_modified": cabecalhos.get("Last-Modified"),
+    }
+
+
+def consultar_remoto(url):
+    """
+    Faz um HEAD e retorna {'tamanho', 'etag', 'last_modified'}.
+    Campos que o servidor não informar (ou se o HEAD falhar) ficam None.
+    """
+    info = {"tamanho": None, "etag": None, "last_modified": None}
+    try:
+        req = urllib.request.Request(url, method="HEAD")
+        with urllib.request.urlopen(req, timeout=TIMEOUT_SEGUNDOS) as resp:
+            tamanho = resp.headers.get("Content-Length")
+            info.update(_validadores(resp.headers))
+        info["tamanho"] = int(tamanho) if tamanho is not None else None
+    except (urllib.error.URLError, OSError, ValueError):
+        pass
+    return info
+
+
+def arquivo_completo(caminho, tamanho_esperado=None, sha256_esperado=None):
+    """
+    Confere se um arquivo local já está completo.
+
+    - com checksum: compara o SHA-256
+    - com tamanho remoto: compara o tamanho em bytes
+    - sem nenhuma das duas informações: confia no arquivo, pois ele só
+      recebe o nome final depois que o download termina
+    """
+    if not os.path.exists(caminho) or os.path.getsize(caminho) == 0:
+        return False
+
+    if sha256_esperado:
+        return calcular_sha256(caminho) == sha256_esperado.lower()
+
+    if tamanho_esperado is not None:
+        return os.path.getsize(caminho) == tamanho_esperado
+
+    return True
+
+
+# CACHE HTTP (ETag / Last-Modified por URL)
+def _caminho_cache(pasta):
+    return os.path.join(pasta, ARQUIVO_CACHE)
+
+
+def ler_cache(pasta):
+    try:
+        with open(_caminho_cache(pasta), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _atualizar_cache(pasta, url, info):
+    """Grava os validadores da URL no cache da pasta (escrita atômica)."""
+    if not (info.get("etag") or info.get("last_modified")):
+        return
+
+    with _trava_cache:
+        cache = ler_cache(pasta)
+        cache[url] = {
+            "etag": info.get("etag"),
+            "last_modified": info.get("last_modified"),
+            "tamanho": info.get("tamanho"),
+        }
+        temporario = _caminho_cache(pasta) + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2, ensure_ascii=False)
+        os.replace(temporario, _caminho_cache(pasta))
+
+
+def _remover_do_cache(pasta, url):
+    with _trava_cache:
+        cache = ler_cache(pasta)
+        if cache.pop(url, None) is None:
+            return
+        temporario = _caminho_cache(pasta) + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2, ensure_ascii=False)
+        os.replace(temporario, _caminho_cache(pasta))
+
+
+# DOWNLOAD DE UM ARQUIVO
+def _transferir(url, caminho_parcial, info, condicional=None):
+    """
+    Uma tentativa de download para o arquivo parcial.
+
+    - 'info' tem tamanho/etag/last_modified do recurso remoto e é atualizado
+      com os cabeçalhos da resposta
+    - com 'condicional' (validadores da cópia local), envia If-None-Match /
+      If-Modified-Since e retorna None se o servidor responder 304
+    - sem 'condicional', retoma o parcial com Range (+ If-Range, para não
+      emendar pedaços de versões diferentes do arquivo)
+
+    Retorna o total de bytes do arquivo parcial.
+    """
+    inicio = os.path.getsize(caminho_parcial) if os.path.exists(caminho_parcial) else 0
+
+    if info.get("tamanho") is not None and inicio == info["tamanho"]:
+        return inicio  # parcial já tem tudo (faltou só renomear)
+
+    req = urllib.request.Request(url)
+    if condicional:
+        if condicional.get("etag"):
+            req.add_header("If-None-Match", condicional["etag"])
+        if condicional.get("last_modified"):
+            req.add_header("If-Modified-Since", condicional["last_modified"])
+    elif inicio > 0:
+        req.add_header("Range", f"bytes={inicio}-")
+        if info.get("etag") or info.get("last_modified"):
+            req.add_header("If-Range", info.get("etag") or info.get("last_modified"))
+
+    try:
+        resp = urllib.request.urlopen(req, timeout=TIMEOUT_SEGUNDOS)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            info.update({k: v for k, v in _validadores(e.headers).items() if v})
+            return None
+        if e.code == 416:
+            # Range inválido: parcial maior/diferente do remoto -> recomeça
+            os.remove(caminho_parcial)
+            return _transferir(url, caminho_parcial, info)
+        raise
+
+    with resp:
+        info.update(_validadores(resp.headers))
+        tamanho_corpo = resp.headers.get("Content-Length")
+
+        # 206 = servidor aceitou o Range; 200 = mandou o arquivo inteiro
+        if inicio > 0 and resp.status == 206:
+            modo = "ab"
+            total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+            info["tamanho"] = int(total) if total.isdigit() else None
+        else:
+            modo = "wb"
+            info["tamanho"] = int(tamanho_corpo) if tamanho_corpo is not None else None
+
+        with open(caminho_parcial, modo) as f:
+            for bloco in iter(lambda: resp.read(TAMANHO_BLOCO), b""):
+                f.write(bloco)
+
+    return os.path.getsize(caminho_parcial)
+
+
+def baixar_arquivo(url, pasta, sha256_esperado=None, tentativas=TENTATIVAS, usar_cache=True):
+    """
+    Baixa uma URL para a pasta, retomando downloads parciais.
+
+    Se a cópia local tem ETag/Last-Modified no cache, faz uma requisição
+    condicional: com 304 a cópia local é mantida sem baixar o corpo.
+    Antes, a cópia local é conferida (tamanho gravado no cache e/ou
+    'sha256_esperado'); se não conferir, a entrada do cache é descartada
+    e o arquivo é baixado de novo.
+
+    Retorna um dict com: url, arquivo, status ('baixado', 'nao_modificado',
+    'existente' ou 'erro'), tamanho (bytes) e erro (mensagem, se houver).
+    """
+    os.makedirs(pasta, exist_ok=True)
+    destino = os.path.join(pasta, nome_arquivo_da_url(url))
+    parcial = destino + ".part"
+    resultado = {"url": url, "arquivo": destino, "status": "erro", "tamanho": 0, "erro": None}
+
+    condicional = ler_cache(pasta).get(url) if usar_cache else None
+    if condicional and not arquivo_completo(destino, condicional.get("tamanho"), sha256_esperado):
+        # cópia local truncada/corrompida (ou apagada): o 304 não vale para ela
+        _remover_do_cache(pasta, url)
+        condicional = None
+
+    if condicional and (condicional.get("etag") or condicional.get("last_modified")):
+        # cópia local conhecida: o servidor decide se mudou (304 ou corpo novo)
+        info = {"tamanho": None, "etag": None, "last_modified": None}
+        if os.path.exists(parcial):
+            os.remove(parcial)
+    else:
+        condicional = None
+        info = consultar_remoto(url)
+        if arquivo_completo(destino, info["tamanho"], sha256_esperado):
+            _atualizar_cache(pasta, url, {**info, "tamanho": os.path.getsize(destino)})
+            resultado["status"] = "existente"
+            resultado["tamanho"] = os.path.getsize(destino)
+            return resultado
+
+    ultimo_erro = None
+    for _ in range(tentativas):
+        try:
+            tamanho = _transferir(url, parcial, info, condicional)
+        except (urllib.error.URLError, OSError) as e:
+            ultimo_erro = e
+            if os.path.exists(parcial):
+                condicional = None  # corpo novo começou a chegar: próxima tentativa retoma
+            continue
+
+        if tamanho is None:
+            _atualizar_cache(pasta, url, {**condicional, **{k: v for k, v in info.items() if v}})
+            resultado["status"] = "nao_modificado"
+            resultado["tamanho"] = os.path.getsize(destino)
+            return resultado
+
+        condicional = None
+        if info["tamanho"] is not None and tamanho != info["tamanho"]:
+            ultimo_erro = RuntimeError(f"tamanho incompleto ({tamanho} de {info['tamanho']} bytes)")
+            continue
+
+        if sha256_esperado and calcular_sha256(parcial) != sha256_esperado.lower():
+            os.remove(parcial)  # conteúdo corrompido: não adianta retomar
+            ultimo_erro = RuntimeError("checksum SHA-256 não confere")
+            continue
+
+        os.replace(parcial, destino)
+        _atualizar_cache(pasta, url, {**info, "tamanho": tamanho})
+        resultado["status"] = "baixado"
+        resultado["tamanho"] = tamanho
+        return resultado
+
+    resultado["erro"] = str(ultimo_erro)
+    return resultado
+
+
+# DOWNLOAD DE VÁRIOS ARQUIVOS
+def descrever_resultado(res):
+    """Linha de relatório de um resultado de baixar_arquivo()."""
+    nome = os.path.basename(res["arquivo"])
+    tamanho_mb = res["tamanho"] / (1024 * 1024)
+    if res["status"] == "baixado":
+        return f"  ✓ {nome} baixado ({tamanho_mb:.2f} MB)"
+    if res["status"] == "nao_modificado":
+        return f"  ✓ {nome} não mudou no servidor (304) - cópia local reaproveitada"
+    if res["status"] == "existente":
+        return f"  ✓ {nome} já está completo ({tamanho_mb:.2f} MB) - download pulado"
+    return f"  ✗ {nome}: erro ao baixar: {res['erro']}"
+
+
+def baixar_varios(urls, pasta, max_simultaneos=MAX_DOWNLOADS_SIMULTANEOS, checksums=None):
+    """
+    Baixa várias URLs em paralelo (no máximo 'max_simultaneos' ao mesmo tempo).
+
+    'checksums' é opcional: {url: sha256}.
+    Os resultados voltam na mesma ordem das URLs.
+    """
+    checksums = checksums or {}
+
+    def tarefa(url):
+        res = baixar_arquivo(url, pasta, sha256_esperado=checksums.get(url))
+        print(descrever_resultado(res))
+        return res
+
+    with ThreadPoolExecutor(max_workers=max(1, max_simultaneos)) as executor:
+        return list(executor.map(tarefa, urls))
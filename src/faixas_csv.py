@@ -0,0 +1,102 @@
+"""
+FAIXAS DE BYTES DE UM CSV - PARA PROCESSAR EM PARALELO
+======================================================
+
+Para dividir um CSV grande entre vários processos sem que um processo
+leia o arquivo inteiro para achar as linhas:
+
+- o arquivo é cortado em faixas de bytes de tamanho parecido
+- cada corte é empurrado até o início da próxima linha ('\n'), então
+  nenhuma linha fica dividida entre duas faixas
+- cada worker abre só a sua faixa (abrir_faixa), que chega ao
+  pd.read_csv com o cabeçalho do arquivo na frente
+
+As faixas cobrem o arquivo inteiro, sem sobreposição e em ordem: juntar os
+resultados na ordem das faixas reproduz a ordem original das linhas.
+
+Limitação: campos entre aspas com quebra de linha dentro não são
+suportados (o CSV consolidado é gravado pelo pandas, sem esse caso).
+"""
+
+import io
+import os
+
+
+TAMANHO_BLOCO = 1024 * 1024  # bytes lidos por vez dentro de uma faixa
+
+
+def dividir_em_faixas(caminho, quantidade):
+    """
+    Divide o CSV (depois do cabeçalho) em até 'quantidade' faixas alinhadas
+    em fim de linha. Retorna a lista de (inicio, fim) em bytes; vazia se o
+    arquivo só tiver o cabeçalho.
+    """
+    tamanho = os.path.getsize(caminho)
+    with open(caminho, "rb") as f:
+        f.readline()
+        inicio_dados = f.tell()
+        if inicio_dados >= tamanho:
+            return []
+
+        quantidade = max(1, quantidade)
+        passo = (tamanho - inicio_dados) / quantidade
+        cortes = [inicio_dados]
+        for i in range(1, quantidade):
+            # a partir do byte anterior ao corte: se o corte já cai num início
+            # de linha, ele é mantido; senão, vai para o início da próxima
+            f.seek(max(inicio_dados, int(inicio_dados + i * passo) - 1))
+            f.readline()
+            cortes.append(min(f.tell(), tamanho))
+        cortes.append(tamanho)
+
+    cortes = sorted(set(cortes))
+    return list(zip(cortes[:-1], cortes[1:]))
+
+
+def ler_cabecalho(caminho):
+    with open(caminho, "rb") as f:
+        return f.readline()
+
+
+def abrir_faixa(caminho, inicio, fim, cabecalho=None):
+    """
+    Stream binário com o cabeçalho do CSV + os bytes [inicio, fim).
+    Usar com 'with' (fecha o arquivo).
+    """
+    if cabecalho is None:
+        cabecalho = ler_cabecalho(caminho)
+    return io.BufferedReader(_LeitorFaixa(caminho, inicio, fim, cabecalho))
+
+
+class _LeitorFaixa(io.RawIOBase):
+    """Stream só-leitura: cabeçalho e depois a faixa de bytes do arquivo."""
+
+    def __init__(self, caminho, inicio, fim, cabecalho):
+        self._arquivo = open(caminho, "rb")
+        self._arquivo.seek(inicio)
+        self._restante = fim - inicio
+        self._saida = cabecalho
+        self._posicao = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        if self._posicao >= len(self._saida):
+            if self._restante <= 0:
+                return 0
+            self._saida = self._arquivo.read(min(TAMANHO_BLOCO, self._restante))
+            self._restante -= len(self._saida)
+            self._posicao = 0
+            if not self._saida:  # arquivo encolheu durante a leitura
+                self._restante = 0
+                return 0
+
+        n = min(len(destino), len(self._saida) - self._posicao)
+        destino[:n] = memoryview(self._saida)[self._posicao:self._posicao + n]
+        self._posicao += n
+        return n
+
+    def close(self):
+        self._arquivo.close()
+        super().close()
@@ -0,0 +1,558 @@
+"""
+FORMATO INTERMEDIÁRIO - TABELAS BINÁRIAS COLUNARES ENTRE AS ETAPAS
+==================================================================
+
+As etapas trocam dados por tabelas em formato binário e tipado, em vez de
+CSV com ';' (que obriga o próximo consumidor a parsear texto e inferir
+tipos de novo). CSV continua disponível como formato de exportação.
+
+Formatos:
+- "parquet": Parquet/Arrow (usado quando o pyarrow está instalado)
+- "numpy":   layout colunar com arquivos .npy (sem dependências extras)
+- "csv":     texto com ';' (compatível com as versões anteriores)
+- "auto":    parquet se houver pyarrow, senão numpy
+
+Os formatos binários são pastas com uma parte por chunk gravado:
+
+    consolidado.parquet/parte-00000.parquet
+    consolidado.npcol/parte-00000/0.npy, 1.npy, 1.nulos.npy, ...
+
+Cada parte guarda seus próprios tipos. No layout NumPy, colunas category
+viram códigos inteiros + categorias (e voltam como category), e texto com
+poucos valores distintos vira um dicionário (códigos + valores únicos); o
+resto do texto fica em arrays unicode de largura fixa. Na leitura, é possível pedir só
+algumas colunas (projeção): as demais nem são lidas do disco.
+
+As exportações compactadas (gravar_csv_zip) escrevem o CSV direto dentro
+do ZIP, sem gravar e reler um CSV temporário.
+"""
+
+import os
+import json
+import shutil
+import zipfile
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+# CONFIGURAÇÃO
+FORMATO_PADRAO = "auto"
+EXTENSOES = {"parquet": ".parquet", "numpy": ".npcol", "csv": ".csv"}
+ARQUIVO_ESQUEMA = "_esquema.json"
+NIVEL_COMPRESSAO_ZIP = 6        # 1 (rápido) a 9 (menor), como no zlib
+LINHAS_POR_BLOCO_CSV = 100000   # linhas formatadas por vez ao gravar CSV/ZIP
+# Layout NumPy: coluna de texto com até essa proporção de valores distintos
+# é gravada como dicionário (códigos inteiros + valores únicos)
+PROPORCAO_MAXIMA_DICIONARIO = 0.5
+
+
+# HELPERS
+def resolver_formato(formato=None):
+    """'auto'/None -> 'parquet' (com pyarrow) ou 'numpy'."""
+    formato = (formato or FORMATO_PADRAO).lower()
+    if formato == "auto":
+        return "parquet" if pa is not None else "numpy"
+    if formato not in EXTENSOES:
+        raise ValueError(f"Formato intermediário desconhecido: {formato}")
+    if formato == "parquet" and pa is None:
+        raise ImportError("Formato 'parquet' requer o pyarrow (pip install pyarrow)")
+    return formato
+
+
+def formato_do_caminho(caminho):
+    """Formato a partir da extensão, ou None se não for uma tabela conhecida."""
+    ext = os.path.splitext(caminho.rstrip("/\\"))[1].lower()
+    for formato, extensao in EXTENSOES.items():
+        if ext == extensao:
+            return formato
+    return None
+
+
+def eh_tabela_binaria(caminho):
+    return formato_do_caminho(caminho) in ("parquet", "numpy")
+
+
+def caminho_tabela(caminho_base, formato=None):
+    """'pasta/arquivo' -> 'pasta/arquivo.parquet' (ou .npcol / .csv)."""
+    return caminho_base + EXTENSOES[resolver_formato(formato)]
+
+
+def localizar_tabela(caminho_base, formato=None, formatos=("parquet", "numpy", "csv")):
+    """
+    Caminho da tabela 'caminho_base' a ser lida (ou None se não existir).
+
+    Prefere o formato configurado ('formato', resolvido como em
+    resolver_formato) e, se ele não existir, segue a ordem fixa de
+    'formatos' (binários antes do CSV de exportação). Não usa a data de
+    modificação: cópias e checkouts não mudam a escolha.
+
+    Os escritores apagam as versões em outros formatos (menos o CSV de
+    exportação); se ainda assim sobrar outra tabela binária, ela é ignorada
+    com um aviso.
+    """
+    try:
+        preferido = resolver_formato(formato)
+    except ImportError:
+        preferido = None  # parquet configurado sem pyarrow: segue a ordem fixa
+    ordem = [preferido] if preferido in formatos else []
+    ordem += [f for f in formatos if f != preferido]
+
+    existentes = [f for f in ordem if os.path.exists(caminho_base + EXTENSOES[f])]
+    if not existentes:
+        return None
+
+    escolhido = caminho_base + EXTENSOES[existentes[0]]
+    sobras = [caminho_base + EXTENSOES[f] for f in existentes[1:] if f != "csv"]
+    if sobras:
+        print(f"⚠️ Lendo {escolhido}; ignorando {', '.join(sobras)} (sobra de outro formato intermediário)")
+    return escolhido
+
+
+def tamanho_bytes(caminho):
+    """Tamanho de um arquivo ou de uma tabela em pasta (soma das partes)."""
+    if os.path.isdir(caminho):
+        return sum(
+            os.path.getsize(os.path.join(raiz, f))
+            for raiz, _, arquivos in os.walk(caminho)
+            for f in arquivos
+        )
+    return os.path.getsize(caminho)
+
+
+def remover_tabela(caminho):
+    if os.path.isdir(caminho):
+        shutil.rmtree(caminho)
+    elif os.path.exists(caminho):
+        os.remove(caminho)
+
+
+def remover_outros_formatos(caminho_base, formato, manter_csv=False):
+    """Apaga versões antigas da mesma tabela em outros formatos (evita ler dados duplicados/velhos)."""
+    for outro, extensao in EXTENSOES.items():
+        if outro == formato or (manter_csv and outro == "csv"):
+            continue
+        remover_tabela(caminho_base + extensao)
+
+
+# LAYOUT NUMPY
+def _tipo_codigos(quantidade):
+    """Menor inteiro com sinal que guarda os códigos 0..quantidade-1 e o -1 (nulo)."""
+    for tipo in (np.int8, np.int16, np.int32):
+        if quantidade <= np.iinfo(tipo).max:
+            return tipo
+    return np.int64
+
+
+def _array_categorias(categorias):
+    """Categorias em array sem pickle: tipo nativo se numérico/data, senão texto."""
+    valores = np.asarray(categorias)
+    if valores.dtype.kind in "biufM":
+        return valores
+    return np.asarray(categorias.astype(str), dtype=str)
+
+
+def _gravar_parte_numpy(df, pasta_parte):
+    os.makedirs(pasta_parte)
+    for i, col in enumerate(df.columns):
+        serie = df[col]
+        tipo = serie.dtype
+        arquivo = os.path.join(pasta_parte, f"{i}.npy")
+
+        if isinstance(tipo, pd.CategoricalDtype):
+            # category: códigos inteiros (-1 = nulo) + categorias; volta como category
+            codigos = serie.cat.codes.to_numpy().astype(_tipo_codigos(len(tipo.categories)))
+            np.save(arquivo, codigos, allow_pickle=False)
+            np.save(os.path.join(pasta_parte, f"{i}.categorias.npy"),
+                    _array_categorias(tipo.categories), allow_pickle=False)
+            if tipo.ordered:
+                np.save(os.path.join(pasta_parte, f"{i}.ordenada.npy"), np.array(True), allow_pickle=False)
+        elif isinstance(tipo, np.dtype) and tipo.kind in "biufM":
+            # tipo numérico nativo (int, float, bool, data)
+            np.save(arquivo, serie.to_numpy(), allow_pickle=False)
+        elif pd.api.types.is_numeric_dtype(tipo):
+            # tipos "nullable" do pandas (Int64, Float64, boolean): NA vira NaN
+            np.save(arquivo, serie.to_numpy(np.float64, na_value=np.nan), allow_pickle=False)
+        else:
+            texto = serie.astype(object).where(serie.notna(), None)
+            codigos, unicos = pd.factorize(texto)
+            if len(unicos) <= PROPORCAO_MAXIMA_DICIONARIO * len(serie):
+                # texto com poucos valores distintos: dicionário (códigos + valores);
+                # volta como texto, não como category
+                np.save(arquivo, codigos.astype(_tipo_codigos(len(unicos))), allow_pickle=False)
+                np.save(os.path.join(pasta_parte, f"{i}.dicionario.npy"),
+                        np.asarray(unicos.astype(str), dtype=str), allow_pickle=False)
+            else:
+                # texto: array unicode de largura fixa + máscara de nulos
+                nulos = texto.isna().to_numpy()
+                valores = texto.where(~nulos, "").astype(str).to_numpy(dtype=str)
+                np.save(arquivo, valores, allow_pickle=False)
+                np.save(os.path.join(pasta_parte, f"{i}.nulos.npy"), nulos, allow_pickle=False)
+
+
+def _ler_coluna_numpy(pasta_parte, i):
+    valores = np.load(os.path.join(pasta_parte, f"{i}.npy"), allow_pickle=False)
+
+    caminho_categorias = os.path.join(pasta_parte, f"{i}.categorias.npy")
+    if os.path.exists(caminho_categorias):
+        categorias = np.load(caminho_categorias, allow_pickle=False)
+        ordenada = os.path.exists(os.path.join(pasta_parte, f"{i}.ordenada.npy"))
+        return pd.Categorical.from_codes(valores, categories=categorias, ordered=ordenada)
+
+    caminho_dicionario = os.path.join(pasta_parte, f"{i}.dicionario.npy")
+    if os.path.exists(caminho_dicionario):
+        dicionario = np.load(caminho_dicionario, allow_pickle=False).astype(object)
+        return np.append(dicionario, None)[valores]  # código -1 -> None
+
+    caminho_nulos = os.path.join(pasta_parte, f"{i}.nulos.npy")
+    if os.path.exists(caminho_nulos):
+        nulos = np.load(caminho_nulos, allow_pickle=False)
+        valores = valores.astype(object)
+        valores[nulos] = None
+    return valores
+
+
+def _projetar(colunas, existentes):
+    """Colunas pedidas que existem na tabela (None = todas); as ausentes são ignoradas."""
+    if colunas is None:
+        return None
+    return [c for c in colunas if c in existentes]
+
+
+def _ler_parte_numpy(pasta_parte, colunas_tabela, colunas=None):
+    colunas = list(colunas_tabela) if colunas is None else _projetar(colunas, colunas_tabela)
+    dados = {nome: _ler_coluna_numpy(pasta_parte, colunas_tabela.index(nome)) for nome in colunas}
+    return pd.DataFrame(dados, columns=colunas)
+
+
+# ESCRITA
+class EscritorTabela:
+    """
+    Grava uma tabela chunk por chunk (cada escrever() vira uma parte).
+
+    Substitui a saída anterior, se existir, inclusive em outros formatos
+    (com manter_csv=True, o CSV de exportação é preservado). Se nenhum chunk
+    for escrito, nada é criado no disco.
+
+        with EscritorTabela("pasta/arquivo", "auto") as escritor:
+            for chunk in chunks:
+                escritor.escrever(chunk)
+        escritor.caminho  # 'pasta/arquivo.parquet'
+    """
+
+    def __init__(self, caminho_base, formato=None, manter_csv=False):
+        self.formato = resolver_formato(formato)
+        self.caminho = caminho_tabela(caminho_base, self.formato)
+        self.linhas = 0
+        self.partes = 0
+        self.colunas = None
+        remover_tabela(self.caminho)
+        remover_outros_formatos(caminho_base, self.formato, manter_csv)
+
+    def escrever(self, df):
+        if self.colunas is None:
+            self.colunas = [str(c) for c in df.columns]
+            if self.formato != "csv":
+                os.makedirs(self.caminho)
+        elif [str(c) for c in df.columns] != self.colunas:
+            raise ValueError(f"Colunas diferentes entre chunks em {self.caminho}")
+
+        if self.formato == "csv":
+            df.to_csv(
+                self.caminho,
+                sep=";",
+                encoding="utf-8",
+                index=False,
+                mode="a",
+                header=self.partes == 0
+            )
+        elif self.formato == "parquet":
+            tabela = pa.Table.from_pandas(df, preserve_index=False)
+            pq.write_table(tabela, os.path.join(self.caminho, f"parte-{self.partes:05d}.parquet"))
+        else:
+            _gravar_parte_numpy(df, os.path.join(self.caminho, f"parte-{self.partes:05d}"))
+
+        self.partes += 1
+        self.linhas += len(df)
+
+    def anexar(self, caminho, linhas):
+        """
+        Acrescenta uma tabela já gravada no mesmo formato (ex: por um worker)
+        sem reparsear: o CSV é copiado em bytes (sem repetir o cabeçalho) e as
+        partes binárias são movidas para cá. A tabela de origem é apagada.
+        """
+        if self.formato == "csv":
+            with open(caminho, "rb") as origem, open(self.caminho, "ab") as destino:
+                cabecalho = origem.readline()
+                if self.partes == 0:
+                    destino.write(cabecalho)
+                    self.colunas = cabecalho.decode("utf-8").rstrip("\r\n").split(";")
+                shutil.copyfileobj(origem, destino)
+            os.remove(caminho)
+            self.partes += 1
+        else:
+            if self.formato == "numpy":
+                colunas = _esquema_numpy(caminho)["colunas"]
+                if self.colunas is not None and colunas != self.colunas:
+                    raise ValueError(f"Colunas diferentes entre partes em {self.caminho}")
+                self.colunas = colunas
+            os.makedirs(self.caminho, exist_ok=True)
+            sufixo = EXTENSOES["parquet"] if self.formato == "parquet" else ""
+            for parte in partes_tabela(caminho):
+                os.replace(parte, os.path.join(self.caminho, f"parte-{self.partes:05d}{sufixo}"))
+                self.partes += 1
+            remover_tabela(caminho)
+
+        self.linhas += linhas
+
+    def fechar(self):
+        if self.formato == "numpy" and self.colunas is not None:
+            esquema = {"colunas": self.colunas, "partes": self.partes, "linhas": self.linhas}
+            with open(os.path.join(self.caminho, ARQUIVO_ESQUEMA), "w", encoding="utf-8") as f:
+                json.dump(esquema, f, ensure_ascii=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+        return False
+
+
+def gravar_tabela(df, caminho_base, formato=None, manter_csv=False, linhas_por_parte=None):
+    """
+    Grava um DataFrame inteiro e retorna o caminho gerado. Com
+    'linhas_por_parte', a tabela binária é dividida em partes desse tamanho
+    (quem lê com iterar_tabela() recebe uma parte por vez).
+    """
+    passo = linhas_por_parte or max(len(df), 1)
+    with EscritorTabela(caminho_base, formato, manter_csv) as escritor:
+        for inicio in range(0, max(len(df), 1), passo):
+            escritor.escrever(df.iloc[inicio:inicio + passo])
+    return escritor.caminho
+
+
+def exportar_tabela(df, caminho_base, formato=None):
+    """
+    Grava '<caminho_base>.csv' (exportação, sempre) e, se o formato for
+    binário, também a tabela binária (a que localizar_tabela() prefere).
+
+    Retorna (caminho_csv, caminho_binario ou None).
+    """
+    formato = resolver_formato(formato)
+    caminho_csv = caminho_base + EXTENSOES["csv"]
+    df.to_csv(caminho_csv, sep=";", index=False, encoding="utf-8")
+
+    if formato == "csv":
+        remover_outros_formatos(caminho_base, "csv")
+        return caminho_csv, None
+
+    return caminho_csv, gravar_tabela(df, caminho_base, formato, manter_csv=True)
+
+
+class ExportadorTabela:
+    """
+    Versão em chunks de exportar_tabela(): cada escrever() acrescenta ao
+    '<caminho_base>.csv' e, se o formato for binário, grava uma parte da
+    tabela binária.
+
+        with ExportadorTabela("pasta/arquivo", "auto") as exportador:
+            for chunk in chunks:
+                exportador.escrever(chunk)
+        exportador.caminhos  # ['pasta/arquivo.csv', 'pasta/arquivo.npcol']
+
+    Chunks vazios não viram partes; se todos forem vazios, o CSV sai só com
+    o cabeçalho (e a tabela binária com uma parte vazia), como em exportar_tabela().
+    """
+
+    def __init__(self, caminho_base, formato=None):
+        self.formato = resolver_formato(formato)
+        # o escritor CSV apaga as versões antigas em todos os formatos;
+        # o binário (se houver) é criado depois, preservando o CSV
+        self.csv = EscritorTabela(caminho_base, "csv")
+        self.binario = None
+        if self.formato != "csv":
+            self.binario = EscritorTabela(caminho_base, self.formato, manter_csv=True)
+        self.linhas = 0
+        self._vazio = None
+        self._vazia = None  # exportação vazia recebida em anexar()
+
+    def escrever(self, df):
+        if self._vazio is None:
+            self._vazio = df.iloc[:0]
+        if not len(df):
+            return
+        self.csv.escrever(df)
+        if self.binario is not None:
+            self.binario.escrever(df)
+        self.linhas += len(df)
+
+    def anexar(self, caminho_base, linhas):
+        """
+        Acrescenta o que outro ExportadorTabela (no mesmo formato) gravou em
+        'caminho_base', sem reparsear (ver EscritorTabela.anexar). Uma
+        exportação vazia só é usada se nenhuma outra tiver linhas.
+        """
+        if not linhas:
+            if self._vazia is None:
+                self._vazia = caminho_base
+            return
+        self.csv.anexar(caminho_base + EXTENSOES["csv"], linhas)
+        if self.binario is not None:
+            self.binario.anexar(caminho_tabela(caminho_base, self.formato), linhas)
+        self.linhas += linhas
+
+    @property
+    def caminhos(self):
+        escritores = [self.csv] + ([self.binario] if self.binario is not None else [])
+        return [e.caminho for e in escritores if e.partes]
+
+    def fechar(self):
+        if self.linhas == 0 and not self.csv.partes:
+            if self._vazio is not None:
+                self.csv.escrever(self._vazio)
+                if self.binario is not None:
+                    self.binario.escrever(self._vazio)
+            elif self._vazia is not None:
+                self.csv.anexar(self._vazia + EXTENSOES["csv"], 0)
+                if self.binario is not None:
+                    self.binario.anexar(caminho_tabela(self._vazia, self.formato), 0)
+        self.csv.fechar()
+        if self.binario is not None:
+            self.binario.fechar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+        return False
+
+
+def gravar_csv_zip(
+    df,
+    caminho_zip,
+    nome_membro,
+    caminho_csv=None,
+    nivel_compressao=NIVEL_COMPRESSAO_ZIP,
+    linhas_por_bloco=LINHAS_POR_BLOCO_CSV,
+):
+    """
+    Grava o DataFrame em CSV (';', UTF-8) direto dentro de um ZIP, em blocos
+    de linhas: nada é relido do disco para compactar.
+
+    Com 'caminho_csv', os mesmos bytes vão também para um CSV simples (cópia
+    opcional, na mesma passada). Retorna a lista de arquivos gravados.
+    """
+    gravados = [caminho_zip]
+    with zipfile.ZipFile(
+        caminho_zip, "w", zipfile.ZIP_DEFLATED, compresslevel=nivel_compressao
+    ) as zf, zf.open(nome_membro, "w", force_zip64=True) as membro:
+        csv_simples = open(caminho_csv, "wb") if caminho_csv else None
+        try:
+            # range com pelo menos 1 bloco: DataFrame vazio ainda grava o cabeçalho
+            for inicio in range(0, max(len(df), 1), linhas_por_bloco):
+                bloco = df.iloc[inicio:inicio + linhas_por_bloco]
+                dados = bloco.to_csv(sep=";", index=False, header=inicio == 0).encode("utf-8")
+                membro.write(dados)
+                if csv_simples:
+                    csv_simples.write(dados)
+        finally:
+            if csv_simples:
+                csv_simples.close()
+
+    if caminho_csv:
+        gravados.append(caminho_csv)
+    return gravados
+
+
+# LEITURA
+def _partes(caminho, sufixo):
+    return sorted(
+        os.path.join(caminho, p) for p in os.listdir(caminho)
+        if p.startswith("parte-") and p.endswith(sufixo)
+    )
+
+
+def _esquema_numpy(caminho):
+    with open(os.path.join(caminho, ARQUIVO_ESQUEMA), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def partes_tabela(caminho):
+    """Partes de uma tabela binária, em ordem (cada uma é lida com ler_parte())."""
+    return _partes(caminho, ".parquet" if formato_do_caminho(caminho) == "parquet" else "")
+
+
+def ler_parte(parte, colunas=None):
+    """Lê uma única parte de uma tabela binária (ex: em um worker)."""
+    if parte.endswith(".parquet"):
+        if pq is None:
+            raise ImportError("Leitura de Parquet requer o pyarrow (pip install pyarrow)")
+        return pq.read_table(parte, columns=_projetar(colunas, pq.read_schema(parte).names)).to_pandas()
+    colunas_tabela = _esquema_numpy(os.path.dirname(parte))["colunas"]
+    return _ler_parte_numpy(parte, colunas_tabela, colunas)
+
+
+def colunas_tabela(caminho):
+    """Nomes das colunas, sem ler os dados."""
+    formato = formato_do_caminho(caminho)
+    if formato == "numpy":
+        return list(_esquema_numpy(caminho)["colunas"])
+    if formato == "parquet":
+        if pq is None:
+            raise ImportError("Leitura de Parquet requer o pyarrow (pip install pyarrow)")
+        partes = partes_tabela(caminho)
+        return list(pq.read_schema(partes[0]).names) if partes else []
+    return list(pd.read_csv(caminho, sep=";", encoding="utf-8", nrows=0).columns)
+
+
+def iterar_tabela(caminho, colunas=None, chunksize=50000, dtype=None):
+    """
+    Itera pelos chunks de uma tabela (uma parte por vez nos formatos
+    binários). 'colunas' limita a leitura às colunas pedidas (as que não
+    existirem na tabela são ignoradas, como no usecols com função dos CSVs
+    brutos); 'dtype' vale só para CSV (os formatos binários já guardam os tipos).
+    """
+    formato = formato_do_caminho(caminho)
+
+    if formato == "parquet":
+        if pq is None:
+            raise ImportError("Leitura de Parquet requer o pyarrow (pip install pyarrow)")
+        colunas = _projetar(colunas, colunas_tabela(caminho))
+        for parte in _partes(caminho, ".parquet"):
+            yield pq.read_table(parte, columns=colunas).to_pandas()
+
+    elif formato == "numpy":
+        colunas_tabela = _esquema_numpy(caminho)["colunas"]
+        for parte in _partes(caminho, ""):
+            yield _ler_parte_numpy(parte, colunas_tabela, colunas)
+
+    else:
+        yield from pd.read_csv(
+            caminho, sep=";", encoding="utf-8", usecols=_usecols(colunas), dtype=dtype, chunksize=chunksize
+        )
+
+
+def _usecols(colunas):
+    """usecols do pd.read_csv que ignora as colunas pedidas que não existirem."""
+    if colunas is None:
+        return None
+    pedidas = set(colunas)
+    return lambda c: c in pedidas
+
+
+def ler_tabela(caminho, colunas=None):
+    """Lê a tabela inteira (com projeção opcional de colunas)."""
+    if formato_do_caminho(caminho) == "csv" or not os.path.isdir(caminho):
+        return pd.read_csv(caminho, sep=";", encoding="utf-8", usecols=_usecols(colunas))
+
+    chunks = list(iterar_tabela(caminho, colunas))
+    if not chunks:
+        return pd.DataFrame(columns=colunas)
+    return pd.concat(chunks, ignore_index=True)
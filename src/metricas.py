@@ -0,0 +1,240 @@
+"""
+MÉTRICAS - TEMPO, VOLUME E MEMÓRIA POR ETAPA
+============================================
+
+Registra, para cada etapa medida:
+- tempo de parede e de CPU (inclui os processos filhos / workers)
+- linhas de entrada e de saída, linhas por segundo
+- chunks processados
+- bytes lidos e gravados (tamanho dos arquivos de entrada/saída)
+- pico de memória (RSS) da etapa e dos workers
+
+Uso:
+
+    with execucao("teste1_pipeline"):          # grava metricas/<nome>_<data>.json
+        with medir("etapa3_filtrar"):
+            etapa3_filtrar()
+
+Dentro da etapa, o código informa os volumes na etapa ativa:
+
+    etapa_atual().somar(linhas_entrada=len(chunk), linhas_saida=len(filtrado), chunks=1)
+
+Fora de um medir(), etapa_atual() devolve uma medição descartável: as
+funções continuam funcionando normalmente quando chamadas soltas.
+
+Log por chunk (opcional): com log_por_chunk=True, cada registrar_chunk()
+acrescenta uma linha JSON em metricas/<nome>_<data>_chunks.jsonl. O caminho
+vai numa variável de ambiente, então processos filhos (ProcessPoolExecutor)
+também escrevem no mesmo arquivo.
+"""
+
+import os
+import sys
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# CONFIGURAÇÃO
+PASTA_METRICAS = "metricas"
+VARIAVEL_LOG_CHUNKS = "PIPELINE_LOG_CHUNKS"  # caminho do .jsonl (herdado pelos workers)
+
+_execucao_atual = None
+_etapas_ativas = []
+
+
+# MEMÓRIA
+def _ler_status_kb(campo):
+    """Campo de /proc/self/status em KB (Linux), ou None."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for linha in f:
+                if linha.startswith(campo + ":"):
+                    return int(linha.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _zerar_pico_rss():
+    """
+    Zera o pico de RSS do processo (Linux >= 4.0: escrever '5' em
+    /proc/self/clear_refs). Retorna False se não for possível; nesse caso o
+    pico medido é o do processo desde o início, não só o da etapa.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _pico_rss_mb():
+    kb = _ler_status_kb("VmHWM")
+    if kb is not None:
+        return kb / 1024
+    if resource is None:
+        return None
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024  # macOS: bytes; Linux: KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor
+
+
+def _pico_rss_filhos_mb():
+    """Maior pico entre os processos filhos já encerrados (acumulado na execução)."""
+    if resource is None:
+        return None
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor
+
+
+def _tempo_cpu():
+    """CPU deste processo + dos filhos já encerrados (workers)."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+# MEDIÇÃO DE UMA ETAPA
+class MedicaoEtapa:
+    """Contadores de uma etapa. somar() pode ser chamado quantas vezes quiser."""
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.linhas_entrada = 0
+        self.linhas_saida = 0
+        self.chunks = 0
+        self.bytes_lidos = 0
+        self.bytes_escritos = 0
+        self.resultado = None
+
+    def somar(self, linhas_entrada=0, linhas_saida=0, chunks=0, bytes_lidos=0, bytes_escritos=0):
+        self.linhas_entrada += linhas_entrada
+        self.linhas_saida += linhas_saida
+        self.chunks += chunks
+        self.bytes_lidos += bytes_lidos
+        self.bytes_escritos += bytes_escritos
+
+
+@contextmanager
+def medir(nome):
+    """Mede um bloco como uma etapa e, se houver execucao() ativa, registra."""
+    medicao = MedicaoEtapa(nome)
+    pico_zerado = _zerar_pico_rss()
+    pico_filhos_antes = _pico_rss_filhos_mb()
+    inicio, inicio_cpu = time.perf_counter(), _tempo_cpu()
+
+    _etapas_ativas.append(medicao)
+    try:
+        yield medicao
+    finally:
+        _etapas_ativas.pop()
+        segundos = time.perf_counter() - inicio
+        pico = _pico_rss_mb()
+        pico_filhos = _pico_rss_filhos_mb()
+
+        medicao.resultado = {
+            "etapa": nome,
+            "segundos": round(segundos, 4),
+            "cpu_segundos": round(_tempo_cpu() - inicio_cpu, 4),
+            "linhas_entrada": medicao.linhas_entrada,
+            "linhas_saida": medicao.linhas_saida,
+            "linhas_por_segundo": round(medicao.linhas_entrada / segundos, 1) if segundos > 0 else None,
+            "chunks": medicao.chunks,
+            "bytes_lidos": medicao.bytes_lidos,
+            "bytes_escritos": medicao.bytes_escritos,
+            "pico_rss_mb": round(pico, 1) if pico is not None else None,
+            "pico_rss_desde_inicio": not pico_zerado,
+            # só aparece se algum worker desta etapa passou do maior pico anterior
+            "pico_rss_workers_mb": (
+                round(pico_filhos, 1)
+                if pico_filhos is not None and pico_filhos > (pico_filhos_antes or 0) else None
+            ),
+        }
+        if _execucao_atual is not None:
+            _execucao_atual["etapas"].append(medicao.resultado)
+
+
+def medir_chamada(nome, funcao, *args, **kwargs):
+    """Atalho: with medir(nome): return funcao(*args, **kwargs)."""
+    with medir(nome):
+        return funcao(*args, **kwargs)
+
+
+def etapa_atual():
+    """Etapa sendo medida agora (ou uma medição descartável)."""
+    return _etapas_ativas[-1] if _etapas_ativas else MedicaoEtapa(None)
+
+
+# EXECUÇÃO (UM ARQUIVO DE MÉTRICAS POR RODADA)
+@contextmanager
+def execucao(nome, pasta=PASTA_METRICAS, log_por_chunk=False):
+    """
+    Agrupa as etapas medidas numa rodada e grava '<pasta>/<nome>_<data>.json'
+    ao final (mesmo se a rodada parar no meio ou der erro).
+    """
+    global _execucao_atual
+
+    os.makedirs(pasta, exist_ok=True)
+    carimbo = datetime.now().strftime("%Y%m%d-%H%M%S")
+    caminho = os.path.join(pasta, f"{nome}_{carimbo}.json")
+
+    rodada = {
+        "execucao": nome,
+        "inicio": datetime.now().isoformat(timespec="seconds"),
+        "pid": os.getpid(),
+        "etapas": [],
+    }
+
+    anterior_log = os.environ.get(VARIAVEL_LOG_CHUNKS)
+    if log_por_chunk:
+        rodada["log_chunks"] = os.path.join(pasta, f"{nome}_{carimbo}_chunks.jsonl")
+        os.environ[VARIAVEL_LOG_CHUNKS] = os.path.abspath(rodada["log_chunks"])
+
+    anterior, _execucao_atual = _execucao_atual, rodada
+    inicio = time.perf_counter()
+    try:
+        yield rodada
+    finally:
+        _execucao_atual = anterior
+        if log_por_chunk:
+            if anterior_log is None:
+                os.environ.pop(VARIAVEL_LOG_CHUNKS, None)
+            else:
+                os.environ[VARIAVEL_LOG_CHUNKS] = anterior_log
+
+        rodada["fim"] = datetime.now().isoformat(timespec="seconds")
+        rodada["segundos"] = round(time.perf_counter() - inicio, 4)
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(rodada, f, indent=2, ensure_ascii=False)
+        print(f"📈 Métricas: {caminho}")
+
+
+# LOG POR CHUNK
+def registrar_chunk(etapa, arquivo, indice, linhas_entrada, linhas_saida=None, **extra):
+    """
+    Acrescenta uma linha JSON ao log de chunks, se estiver ligado.
+    Funciona também dentro dos workers (o caminho vem do ambiente).
+    """
+    caminho = os.environ.get(VARIAVEL_LOG_CHUNKS)
+    if not caminho:
+        return
+
+    linha = {
+        "ts": round(time.time(), 3),
+        "pid": os.getpid(),
+        "etapa": etapa,
+        "arquivo": arquivo,
+        "chunk": indice,
+        "linhas_entrada": linhas_entrada,
+        "linhas_saida": linhas_saida,
+        **extra,
+    }
+    # uma linha curta por write em modo append: não se mistura entre processos
+    with open(caminho, "a", encoding="utf-8") as f:
+        f.write(json.dumps(linha, ensure_ascii=False) + "\n")
@@ -0,0 +1,52 @@
+"""
+NÚMEROS NO FORMATO BRASILEIRO (1.234.567,89)
+============================================
+
+Os valores dos arquivos da ANS usam vírgula decimal e ponto de milhar.
+
+O caminho principal converte na própria leitura do CSV: as colunas de
+valor são lidas pelo parser em C do pandas com decimal="," e
+thousands="." (ver OPCOES_LEITURA_BR) e já chegam como float64. As demais
+colunas são lidas como texto, para que códigos (reg_ans, conta contábil)
+não sejam afetados pelo separador de milhar.
+
+converter_valores() é o complemento: não faz nada se a coluna já for
+numérica e, se vier texto (ex: chunk com algum valor malformado),
+converte de forma vetorizada e CONTA os valores que não puderam ser
+convertidos, em vez de descartá-los em silêncio.
+"""
+
+import pandas as pd
+
+
+# Opções do pd.read_csv para as colunas de valor em pt-BR
+OPCOES_LEITURA_BR = {"decimal": ",", "thousands": "."}
+
+
+def converter_valores(serie, decimal=","):
+    """
+    Converte uma coluna de valores para float64.
+
+    - decimal=",": texto no formato pt-BR ('1.234,56')
+    - decimal=".": texto no formato canônico ('1234.56')
+
+    Vazios/nulos viram NaN e não contam como malformados.
+    Retorna (serie_float64, quantidade_de_malformados).
+    """
+    if pd.api.types.is_numeric_dtype(serie.dtype) and not pd.api.types.is_bool_dtype(serie.dtype):
+        return serie.astype("float64"), 0
+
+    texto = serie.astype("string").str.strip()
+    vazio = texto.isna() | texto.eq("")
+
+    if decimal == ",":
+        texto = (
+            texto
+            .str.replace(".", "", regex=False)
+            .str.replace(",", ".", regex=False)
+        )
+
+    valores = pd.to_numeric(texto, errors="coerce").astype("float64")
+    malformados = int((valores.isna() & ~vazio).sum())
+
+    return valores, malformados
@@ -0,0 +1,204 @@
+"""
+PARTIÇÕES DO CONSOLIDADO - UMA POR ANO/TRIMESTRE, COM MANIFESTO
+===============================================================
+
+A Etapa 5 soma as despesas de cada trimestre por operadora. Em vez de
+refazer todo o histórico a cada execução, cada trimestre vira uma
+partição gravada em disco:
+
+    dados_consolidados/particoes/2025_1T.parquet   (ou .npcol)
+    dados_consolidados/particoes/_manifesto.json
+
+O manifesto guarda, por partição, o SHA-256 de cada arquivo de origem
+(de 'dados_despesas_sinistros/') e uma assinatura da configuração da
+consolidação. Junto do hash ficam o tamanho e o mtime do arquivo: se
+nenhum dos dois mudou, o hash do manifesto é reaproveitado sem reler o
+arquivo. Uma partição só é recalculada quando:
+
+- algum arquivo de origem mudou, entrou ou saiu
+- a assinatura mudou (outra versão/esquema/formato)
+- a partição sumiu do disco
+
+Partições cujos arquivos de origem não existem mais são apagadas.
+O CSV/ZIP final é montado juntando as partições (em cache + recalculadas).
+
+As partições são um cache interno: ficam sempre num formato binário
+tipado (com FORMATO_INTERMEDIARIO = "csv", usam o layout NumPy), para
+que reg_ans e trimestre voltem como texto, sem inferência de tipos.
+"""
+
+import os
+import json
+import hashlib
+import pandas as pd
+
+from formato_intermediario import (
+    gravar_tabela,
+    ler_tabela,
+    remover_tabela,
+    resolver_formato,
+)
+
+
+# CONFIGURAÇÃO
+ARQUIVO_MANIFESTO = "_manifesto.json"
+TAMANHO_LEITURA_HASH = 1024 * 1024
+
+
+def sha256_caminho(caminho):
+    """SHA-256 de um arquivo ou de uma tabela em pasta (partes em ordem)."""
+    h = hashlib.sha256()
+    if os.path.isdir(caminho):
+        arquivos = sorted(
+            os.path.relpath(os.path.join(raiz, f), caminho)
+            for raiz, _, nomes in os.walk(caminho)
+            for f in nomes
+        )
+    else:
+        arquivos = [None]
+
+    for relativo in arquivos:
+        completo = caminho if relativo is None else os.path.join(caminho, relativo)
+        if relativo is not None:
+            h.update(relativo.replace(os.sep, "/").encode("utf-8") + b"\0")
+        with open(completo, "rb") as f:
+            for bloco in iter(lambda: f.read(TAMANHO_LEITURA_HASH), b""):
+                h.update(bloco)
+    return h.hexdigest()
+
+
+def estado_caminho(caminho):
+    """[tamanho, mtime_ns] de um arquivo; numa tabela em pasta, soma dos tamanhos e maior mtime."""
+    if not os.path.isdir(caminho):
+        info = os.stat(caminho)
+        return [info.st_size, info.st_mtime_ns]
+
+    tamanho, mtime = 0, 0
+    for raiz, _, nomes in os.walk(caminho):
+        mtime = max(mtime, os.stat(raiz).st_mtime_ns)
+        for nome in nomes:
+            info = os.stat(os.path.join(raiz, nome))
+            tamanho += info.st_size
+            mtime = max(mtime, info.st_mtime_ns)
+    return [tamanho, mtime]
+
+
+def assinatura(**configuracao):
+    """Hash curto de uma configuração (dict serializável em JSON)."""
+    texto = json.dumps(configuracao, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:16]
+
+
+class ParticoesConsolidado:
+    """
+    Partições do consolidado por (ano, trimestre) + manifesto.
+
+        particoes = ParticoesConsolidado("dados_consolidados/particoes", assinatura_atual)
+        fontes = particoes.fontes((2025, "1T"), pasta_origem, arquivos)
+        df = particoes.ler((2025, "1T"), fontes)   # None = precisa recalcular
+        if df is None:
+            df = ...
+            particoes.gravar((2025, "1T"), df, fontes)
+        particoes.manter_apenas(periodos_atuais)
+        particoes.salvar_manifesto()
+
+    'fontes' é {nome do arquivo de origem: sha256}.
+    """
+
+    def __init__(self, pasta, assinatura_atual, formato=None):
+        self.pasta = pasta
+        self.assinatura = assinatura_atual
+        formato = resolver_formato(formato)
+        self.formato = "numpy" if formato == "csv" else formato
+        self.caminho_manifesto = os.path.join(pasta, ARQUIVO_MANIFESTO)
+        self.particoes = self._ler_manifesto()
+        self._estados = {}  # chave -> {arquivo: [tamanho, mtime_ns]} da execução atual
+
+    def _ler_manifesto(self):
+        try:
+            with open(self.caminho_manifesto, "r", encoding="utf-8") as f:
+                manifesto = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifesto.get("assinatura") != self.assinatura:
+            return {}  # configuração mudou: tudo é recalculado
+        return manifesto.get("particoes", {})
+
+    @staticmethod
+    def chave(periodo):
+        ano, trimestre = periodo
+        return f"{ano}_{trimestre}"
+
+    def fontes(self, periodo, pasta, arquivos):
+        """
+        {arquivo: sha256} dos arquivos de origem do período. O hash só é
+        recalculado se o tamanho ou o mtime do arquivo mudou desde o manifesto.
+        """
+        chave = self.chave(periodo)
+        entrada = self.particoes.get(chave, {})
+        hashes = entrada.get("fontes", {})
+        estados_anteriores = entrada.get("estados", {})
+
+        fontes, estados = {}, {}
+        for arquivo in arquivos:
+            caminho = os.path.join(pasta, arquivo)
+            estados[arquivo] = estado_caminho(caminho)
+            if arquivo in hashes and estados_anteriores.get(arquivo) == estados[arquivo]:
+                fontes[arquivo] = hashes[arquivo]
+            else:
+                fontes[arquivo] = sha256_caminho(caminho)
+        self._estados[chave] = estados
+        return fontes
+
+    def ler(self, periodo, fontes):
+        """DataFrame da partição, ou None se ela não existe ou está desatualizada."""
+        chave = self.chave(periodo)
+        entrada = self.particoes.get(chave)
+        if not entrada or entrada.get("fontes") != fontes:
+            return None
+        if chave in self._estados:
+            entrada["estados"] = self._estados[chave]  # mesmo conteúdo, mtime novo
+        if entrada.get("arquivo") is None:
+            return pd.DataFrame()  # trimestre sem nenhum valor válido
+
+        caminho = os.path.join(self.pasta, entrada["arquivo"])
+        if not os.path.exists(caminho):
+            return None
+        try:
+            return ler_tabela(caminho)
+        except Exception:
+            return None
+
+    def gravar(self, periodo, df, fontes):
+        chave = self.chave(periodo)
+        self.remover(chave)
+
+        arquivo = None
+        if len(df):
+            os.makedirs(self.pasta, exist_ok=True)
+            arquivo = os.path.basename(gravar_tabela(df, os.path.join(self.pasta, chave), self.formato))
+
+        self.particoes[chave] = {
+            "fontes": fontes, "estados": self._estados.get(chave, {}), "arquivo": arquivo, "linhas": len(df)
+        }
+
+    def remover(self, chave):
+        entrada = self.particoes.pop(chave, None)
+        if entrada and entrada.get("arquivo"):
+            remover_tabela(os.path.join(self.pasta, entrada["arquivo"]))
+
+    def manter_apenas(self, periodos):
+        """Apaga as partições cujos arquivos de origem não existem mais."""
+        atuais = {self.chave(p) for p in periodos}
+        removidas = [chave for chave in self.particoes if chave not in atuais]
+        for chave in removidas:
+            self.remover(chave)
+        return removidas
+
+    def salvar_manifesto(self):
+        os.makedirs(self.pasta, exist_ok=True)
+        manifesto = {"assinatura": self.assinatura, "particoes": self.particoes}
+        temporario = self.caminho_manifesto + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(manifesto, f, indent=2, ensure_ascii=False, sort_keys=True)
+        os.replace(temporario, self.caminho_manifesto)
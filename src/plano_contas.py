@@ -0,0 +1,124 @@
+"""
+PLANO DE CONTAS - ÍNDICE DE CONTAS ASSISTENCIAIS
+================================================
+
+O filtro do Teste 1 mantém as contas da classe 3 (despesas) cuja descrição
+tem alguma das PALAVRAS_CHAVE. A decisão depende só do par
+(conta contábil, descrição), e um arquivo de milhões de linhas tem poucas
+centenas de pares distintos.
+
+Em vez de aplicar startswith + regex em cada linha:
+
+- cada chunk é traduzido para códigos inteiros (pd.factorize), um por par
+- a regra roda uma vez por par novo e a decisão fica guardada no índice
+- a máscara do chunk é um lookup vetorizado: decisoes[codigos]
+
+O índice pode ser exportado em CSV (conta, descrição, manter, motivo,
+linhas) para auditar quais contas entram como assistenciais.
+"""
+
+import re
+import numpy as np
+import pandas as pd
+
+
+class IndiceContas:
+    """
+    Decisão manter/descartar por (conta, descrição), calculada uma vez por par.
+
+        indice = IndiceContas(PALAVRAS_CHAVE)
+        for chunk in chunks:
+            filtrado = chunk[indice.mascara(chunk["cd_conta_contabil"], chunk["descricao"])]
+        indice.exportar("_INDICE_CONTAS.csv")
+
+    descricao None = arquivo sem coluna descritiva (vale só a classe da conta);
+    descrição vazia/nula entra como "" (não tem palavra-chave).
+    """
+
+    def __init__(self, palavras_chave, prefixo="3"):
+        self.prefixo = prefixo
+        self._padrao = re.compile("|".join(re.escape(p) for p in palavras_chave))
+        self.decisoes = {}  # (conta, descricao) -> (manter, motivo)
+        self.linhas = {}    # (conta, descricao) -> linhas vistas
+
+    def __len__(self):
+        return len(self.decisoes)
+
+    def _regra(self, conta, descricao):
+        """(manter, motivo) de um par, pela regra original do filtro."""
+        if conta is None or not conta.startswith(self.prefixo):
+            return False, f"fora da classe {self.prefixo}"
+        if descricao is None:
+            return True, f"classe {self.prefixo} (sem coluna de descrição)"
+
+        achou = self._padrao.search(descricao.lower())
+        if achou:
+            return True, f"palavra-chave: {achou.group(0)}"
+        return False, "sem palavra-chave"
+
+    def decidir(self, conta, descricao=None, linhas=0):
+        chave = (conta, descricao)
+        if chave not in self.decisoes:
+            self.decisoes[chave] = self._regra(conta, descricao)
+            self.linhas[chave] = 0
+        self.linhas[chave] += int(linhas)
+        return self.decisoes[chave][0]
+
+    def mascara(self, contas, descricoes=None):
+        """Máscara booleana (NumPy) das linhas a manter."""
+        cod_contas, contas_unicas = pd.factorize(contas)
+        contas_unicas = np.asarray(contas_unicas, dtype=object)
+
+        if descricoes is None:
+            base, descricoes_unicas = 1, None
+            pares = cod_contas.astype(np.int64) + 1
+        else:
+            cod_desc, descricoes_unicas = pd.factorize(descricoes)
+            descricoes_unicas = np.asarray(descricoes_unicas, dtype=object)
+            # par -> um inteiro só (o +1 reserva o 0 para nulo, código -1)
+            base = len(descricoes_unicas) + 1
+            pares = (cod_contas.astype(np.int64) + 1) * base + (cod_desc + 1)
+
+        codigos, pares_unicos = pd.factorize(pares)
+        contagem = np.bincount(codigos, minlength=len(pares_unicos))
+
+        manter = np.zeros(len(pares_unicos), dtype=bool)
+        for k, par in enumerate(pares_unicos):
+            i_conta, i_desc = divmod(int(par), base)
+            conta = str(contas_unicas[i_conta - 1]) if i_conta else None
+            if descricoes_unicas is None:
+                descricao = None
+            else:
+                descricao = str(descricoes_unicas[i_desc - 1]) if i_desc else ""
+            manter[k] = self.decidir(conta, descricao, contagem[k])
+
+        return manter[codigos]
+
+    def juntar(self, outro):
+        """Acrescenta os pares (e as linhas) de outro índice, ex: de um worker."""
+        for chave, decisao in outro.decisoes.items():
+            self.decisoes.setdefault(chave, decisao)
+            self.linhas[chave] = self.linhas.get(chave, 0) + outro.linhas.get(chave, 0)
+
+    def contas_mantidas(self):
+        """Contas com pelo menos um par mantido."""
+        return sorted({conta for (conta, _), (manter, _) in self.decisoes.items() if manter})
+
+    def para_dataframe(self):
+        linhas = [
+            {
+                "cd_conta_contabil": conta,
+                "descricao": descricao,
+                "manter": manter,
+                "motivo": motivo,
+                "linhas": self.linhas.get((conta, descricao), 0),
+            }
+            for (conta, descricao), (manter, motivo) in self.decisoes.items()
+        ]
+        colunas = ["cd_conta_contabil", "descricao", "manter", "motivo", "linhas"]
+        df = pd.DataFrame(linhas, columns=colunas)
+        return df.sort_values(["cd_conta_contabil", "descricao"], na_position="first", ignore_index=True)
+
+    def exportar(self, caminho):
+        """Grava o índice em CSV (';', UTF-8) para auditoria."""
+        self.para_dataframe().to_csv(caminho, sep=";", encoding="utf-8", index=False)
@@ -0,0 +1,243 @@
+"""
+PRÉ-FILTRO DE LINHAS EM BYTES (ANTES DO PANDAS)
+===============================================
+
+A maior parte das linhas dos arquivos da ANS não é da classe 3 (despesas),
+mas o pd.read_csv tokeniza e tipa todas elas antes do filtro descartá-las.
+
+O pré-filtro fica entre o arquivo (ou membro de ZIP) e o pd.read_csv:
+
+- lê o arquivo em blocos de bytes, cortados sempre num fim de linha
+- o cabeçalho passa inteiro; nas demais linhas, o campo da conta é achado
+  pela posição no cabeçalho (k-ésimo separador da linha, com NumPy sobre
+  o bloco inteiro, sem loop por linha) e as linhas cujo campo não começa
+  com o prefixo (ex: "3") são removidas
+- o pandas só parseia as linhas candidatas
+
+O ganho depende da proporção de linhas descartadas: se o primeiro bloco
+mostra que a maioria das linhas seria mantida (PROPORCAO_MAXIMA), o resto
+do arquivo passa direto, sem pré-filtro.
+
+É só um atalho: o filtro em pandas (IndiceContas) continua rodando depois,
+como garantia. Na dúvida a linha passa — linhas com menos campos que o
+esperado vão para o pandas como antes. Separadores dentro de aspas são
+reconhecidos (contagem de aspas desde o início da linha).
+
+Limitação: campos entre aspas com quebra de linha dentro não são
+suportados (não ocorrem nos arquivos da ANS); nesse caso, desligue o
+pré-filtro.
+"""
+
+import io
+import numpy as np
+
+
+TAMANHO_BLOCO = 2 * 1024 * 1024  # bytes lidos por vez
+
+# Se o 1º bloco mantiver mais que isso dos bytes (≈ linhas), o resto do
+# arquivo passa direto: o pré-filtro custaria mais do que economiza no pandas
+PROPORCAO_MAXIMA = 0.4
+
+ASPAS = ord('"')
+NOVA_LINHA = ord("\n")
+
+
+def encoding_compativel(encoding, texto):
+    """
+    True se os caracteres de 'texto' (separador, prefixo), as aspas e o
+    '\\n' são um byte só (ASCII) no encoding, ex: UTF-8 e latin-1;
+    False para UTF-16 etc.
+    """
+    amostra = f'\n"{texto}'
+    try:
+        return amostra.encode(encoding).endswith(amostra.encode("ascii"))
+    except (LookupError, UnicodeError):
+        return False
+
+
+def _separadores_fora_de_aspas(a, seps, inicios, linha_sep):
+    """
+    Máscara dos separadores que delimitam campos (fora de aspas), ou None
+    quando todos delimitam (caso comum, verificado sem contar por linha).
+    """
+    aspas = np.flatnonzero(a == ASPAS)
+    if len(aspas) == 0:
+        return None
+
+    # layout da ANS: todo campo entre aspas, sem aspas internas. Então cada
+    # separador fica entre '"' e '"', e há 2 aspas por campo. Um separador
+    # dentro de um campo exigiria aspas escapadas ("") e quebraria a conta.
+    if (
+        len(aspas) == 2 * (len(seps) + len(inicios))
+        and (a[seps - 1] == ASPAS).all()
+        and (a[seps + 1] == ASPAS).all()
+    ):
+        return None
+
+    # caso geral: fora de aspas = número par de aspas desde o início da linha
+    antes = np.searchsorted(aspas, seps) - np.searchsorted(aspas, inicios)[linha_sep]
+    return antes % 2 == 0
+
+
+def filtrar_bloco(dados, indice_campo, separador, prefixo):
+    """
+    Remove de 'dados' (linhas completas, sem o cabeçalho) as linhas cujo
+    campo 'indice_campo' não começa com 'prefixo' (com ou sem aspas).
+
+    separador e prefixo em bytes (ex: b";", b"3").
+    Retorna (bytes_filtrados, linhas_descartadas).
+    """
+    if not dados:
+        return dados, 0
+
+    tamanho = len(dados)
+    # bytes nulos no fim: olhar 'depois' do último campo nunca sai do array
+    a = np.frombuffer(dados + bytes(len(prefixo) + 2), dtype=np.uint8)
+    corpo = a[:tamanho]
+
+    fins = np.flatnonzero(corpo == NOVA_LINHA)
+    if dados[-1] != NOVA_LINHA:
+        fins = np.append(fins, tamanho)  # última linha sem '\n'
+    inicios = np.empty_like(fins)
+    inicios[0] = 0
+    inicios[1:] = fins[:-1] + 1
+    linhas = np.arange(len(fins))
+
+    if indice_campo == 0:
+        campo = inicios
+        achou = fins > inicios  # linha em branco não tem campo: passa
+    else:
+        seps = np.flatnonzero(corpo == separador[0])
+        linha_sep = np.searchsorted(fins, seps)
+
+        fora = _separadores_fora_de_aspas(a, seps, inicios, linha_sep)
+        if fora is not None:
+            seps, linha_sep = seps[fora], linha_sep[fora]
+        if len(seps) == 0:
+            return dados, 0
+
+        # k-ésimo separador de cada linha (se a linha tiver k separadores)
+        k = np.searchsorted(linha_sep, linhas) + indice_campo - 1
+        achou = k < len(seps)
+        k = np.minimum(k, len(seps) - 1)
+        achou &= linha_sep[k] == linhas
+        campo = seps[k] + 1
+
+    campo = campo + (a[campo] == ASPAS)
+    comeca = np.ones(len(fins), dtype=bool)
+    for i, byte in enumerate(prefixo):
+        comeca &= a[campo + i] == byte
+
+    manter = ~achou | comeca
+    descartadas = int(len(manter) - np.count_nonzero(manter))
+    if not descartadas:
+        return dados, 0
+
+    comprimentos = np.minimum(fins + 1, tamanho) - inicios
+    return corpo[np.repeat(manter, comprimentos)].tobytes(), descartadas
+
+
+class Prefiltro:
+    """
+    Configuração + contadores do pré-filtro de um arquivo.
+
+        prefiltro = Prefiltro("cd_conta_contabil", "3")
+        with open(caminho, "rb") as f:
+            f = prefiltro.envolver(f, colunas_normalizadas, encoding, ";")
+            pd.read_csv(f, ...)
+        prefiltro.linhas_descartadas
+
+    envolver() devolve o próprio arquivo (sem filtro) quando a coluna não
+    está no cabeçalho ou o encoding não é compatível com a busca em bytes.
+    'ativo' fica False se o pré-filtro não foi usado ou foi desligado no
+    1º bloco (proporcao_maxima).
+    """
+
+    def __init__(self, coluna, prefixo, tamanho_bloco=TAMANHO_BLOCO, proporcao_maxima=PROPORCAO_MAXIMA):
+        self.coluna = coluna
+        self.prefixo = prefixo
+        self.tamanho_bloco = tamanho_bloco
+        self.proporcao_maxima = proporcao_maxima
+        self.linhas_descartadas = 0
+        self.bytes_descartados = 0
+        self.ativo = False
+
+    def envolver(self, bruto, colunas, encoding, separador):
+        """colunas: nomes (normalizados) do cabeçalho, na ordem do arquivo."""
+        colunas = list(colunas)
+        if (
+            self.coluna not in colunas
+            or len(separador) != 1
+            or not encoding_compativel(encoding, separador + self.prefixo)
+        ):
+            return bruto
+
+        self.ativo = True
+        leitor = _LeitorFiltrado(
+            bruto,
+            colunas.index(self.coluna),
+            separador.encode("ascii"),
+            self.prefixo.encode("ascii"),
+            self,
+        )
+        return io.BufferedReader(leitor)
+
+
+class _LeitorFiltrado(io.RawIOBase):
+    """Stream binário só-leitura com as linhas descartadas já removidas."""
+
+    def __init__(self, bruto, indice_campo, separador, prefixo, prefiltro):
+        self._bruto = bruto
+        self._indice_campo = indice_campo
+        self._separador = separador
+        self._prefixo = prefixo
+        self._prefiltro = prefiltro
+        self._resto = b""      # linha incompleta no fim do último bloco
+        self._saida = b""
+        self._posicao = 0
+        self._cabecalho = True
+        self._fim = False
+
+    def readable(self):
+        return True
+
+    def _encher(self):
+        bloco = self._bruto.read(self._prefiltro.tamanho_bloco)
+        if bloco:
+            dados = self._resto + bloco
+            corte = dados.rfind(b"\n") + 1
+            if corte == 0:  # linha maior que o bloco: continua lendo
+                self._resto = dados
+                return
+            dados, self._resto = dados[:corte], dados[corte:]
+        else:
+            self._fim = True
+            dados, self._resto = self._resto, b""
+
+        cabecalho = b""
+        primeiro = self._cabecalho
+        if primeiro:
+            fim = dados.find(b"\n") + 1 or len(dados)
+            cabecalho, dados = dados[:fim], dados[fim:]
+            self._cabecalho = False
+
+        if self._prefiltro.ativo:
+            filtrado, descartadas = filtrar_bloco(dados, self._indice_campo, self._separador, self._prefixo)
+            self._prefiltro.linhas_descartadas += descartadas
+            self._prefiltro.bytes_descartados += len(dados) - len(filtrado)
+
+            if primeiro and len(filtrado) > self._prefiltro.proporcao_maxima * len(dados):
+                self._prefiltro.ativo = False  # poucas linhas descartadas: não compensa
+            dados = filtrado
+
+        self._saida = cabecalho + dados
+        self._posicao = 0
+
+    def readinto(self, destino):
+        while self._posicao >= len(self._saida) and not self._fim:
+            self._encher()
+
+        n = min(len(destino), len(self._saida) - self._posicao)
+        destino[:n] = memoryview(self._saida)[self._posicao:self._posicao + n]
+        self._posicao += n
+        return n
@@ -0,0 +1,159 @@
+"""
+REGRAS DE VALIDAÇÃO - DECLARATIVAS E VETORIZADAS
+================================================
+
+Cada regra é declarada como (nome, coluna, teste, motivo), onde o teste
+vira uma máscara booleana para a coluna inteira, sem .apply por linha:
+
+    REGRAS = [
+        Regra("ano", "ano", intervalo(2000, 2100, inteiro=True), "ano fora de 2000-2100"),
+        Regra("trimestre", "trimestre", conjunto({"1T", "2T", "3T", "4T"}), "trimestre inválido"),
+    ]
+
+Testes disponíveis:
+- intervalo(minimo, maximo): faixa numérica (texto é convertido; o que não
+  for número falha)
+- conjunto(valores): pertence ao conjunto (após strip/upper)
+- nao_vazio(): não nulo e não vazio após strip
+- padrao(regex): texto casa inteiro com a expressão
+
+Testes de texto rodam uma vez por valor distinto (pd.factorize): colunas
+como trimestre e reg_ans têm poucos valores, repetidos em muitas linhas.
+
+O resultado é uma máscara de bits por linha (bit i = regra i falhou):
+0 = linha válida. A partir dela saem, sem reler os dados, as contagens
+por regra e o texto dos motivos de cada linha inválida.
+"""
+
+import re
+import numpy as np
+import pandas as pd
+
+
+SEPARADOR_MOTIVOS = " | "
+
+
+# TESTES (série -> máscara NumPy, True = passa)
+def _por_valor_distinto(teste_valores):
+    """Aplica 'teste_valores' (Series de valores únicos -> bool) só aos valores distintos."""
+    def teste(serie):
+        codigos, unicos = pd.factorize(serie)  # nulo = código -1
+        if len(unicos) == 0:
+            return np.zeros(len(serie), dtype=bool)
+        passa = np.append(np.asarray(teste_valores(pd.Series(unicos)), dtype=bool), False)
+        return passa[codigos]
+    return teste
+
+
+def intervalo(minimo=None, maximo=None, inclusivo=True, inteiro=False):
+    """
+    minimo <= valor <= maximo (limites None = sem limite).
+    inclusivo=False usa < e >. inteiro=True compara a parte inteira
+    (como int(valor)). Nulos e textos não numéricos falham.
+    """
+    def numeros(unicos):
+        return pd.to_numeric(unicos.astype("string").str.strip(), errors="coerce").to_numpy(
+            dtype=np.float64, na_value=np.nan
+        )
+
+    def teste(serie):
+        if pd.api.types.is_numeric_dtype(serie.dtype) and not pd.api.types.is_bool_dtype(serie.dtype):
+            valores = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            # texto: converte uma vez por valor distinto (nulo = código -1 -> NaN)
+            codigos, unicos = pd.factorize(serie)
+            valores = np.append(numeros(pd.Series(unicos, dtype=object)), np.nan)[codigos]
+        if inteiro:
+            valores = np.trunc(valores)
+
+        with np.errstate(invalid="ignore"):
+            passa = ~np.isnan(valores)
+            if minimo is not None:
+                passa &= (valores >= minimo) if inclusivo else (valores > minimo)
+            if maximo is not None:
+                passa &= (valores <= maximo) if inclusivo else (valores < maximo)
+        return passa
+    return teste
+
+
+def conjunto(valores, normalizar=True):
+    """Valor pertence a 'valores' (com normalizar, compara após strip/upper)."""
+    permitidos = {str(v) for v in valores}
+
+    def teste_valores(unicos):
+        texto = unicos.astype(str)
+        if normalizar:
+            texto = texto.str.strip().str.upper()
+        return texto.isin(permitidos)
+    return _por_valor_distinto(teste_valores)
+
+
+def nao_vazio():
+    """Não nulo e não vazio após strip."""
+    return _por_valor_distinto(lambda unicos: unicos.astype(str).str.strip().ne(""))
+
+
+def padrao(regex):
+    """Texto (após strip) casa inteiro com a expressão regular."""
+    compilado = re.compile(regex)
+    return _por_valor_distinto(lambda unicos: unicos.astype(str).str.strip().str.fullmatch(compilado))
+
+
+# MOTOR
+class Regra:
+    def __init__(self, nome, coluna, teste, motivo=None):
+        self.nome = nome
+        self.coluna = coluna
+        self.teste = teste
+        self.motivo = motivo or f"{nome} inválido"
+
+    def mascara(self, df):
+        """Máscara NumPy: True = a linha passa na regra."""
+        return np.asarray(self.teste(df[self.coluna]), dtype=bool)
+
+
+class ValidadorRegras:
+    """
+    Aplica uma lista de regras e devolve a máscara de bits das falhas.
+
+        validador = ValidadorRegras(REGRAS)
+        falhas = validador.avaliar(df)              # 0 = válida
+        validador.contar(falhas)                    # {"ano": 3, "valor": 10, ...}
+        validador.motivos(falhas[falhas != 0])      # "ano fora de ... | valor ..."
+    """
+
+    def __init__(self, regras):
+        self.regras = list(regras)
+        if len(self.regras) > 64:
+            raise ValueError("No máximo 64 regras (máscara de bits em uint64)")
+        bits = max(8, 1 << (len(self.regras) - 1).bit_length())
+        self.tipo = np.dtype(f"uint{bits}")
+
+    def colunas_faltantes(self, colunas):
+        """Colunas usadas pelas regras que não estão em 'colunas' (ou em um DataFrame)."""
+        return sorted({r.coluna for r in self.regras} - set(colunas))
+
+    def avaliar(self, df):
+        falhas = np.zeros(len(df), dtype=self.tipo)
+        for i, regra in enumerate(self.regras):
+            falhas |= (~regra.mascara(df)).astype(self.tipo) << self.tipo.type(i)
+        return falhas
+
+    def contar(self, falhas):
+        """Linhas que falharam em cada regra (uma linha pode falhar em várias)."""
+        return {
+            regra.nome: int(np.count_nonzero(falhas & self.tipo.type(1 << i)))
+            for i, regra in enumerate(self.regras)
+        }
+
+    def descrever(self, bits):
+        """Texto dos motivos de uma máscara de bits."""
+        return SEPARADOR_MOTIVOS.join(
+            regra.motivo for i, regra in enumerate(self.regras) if int(bits) >> i & 1
+        )
+
+    def motivos(self, falhas):
+        """Array de textos, um por linha (calculado uma vez por combinação de falhas)."""
+        combinacoes, codigos = np.unique(falhas, return_inverse=True)
+        textos = np.array([self.descrever(bits) for bits in combinacoes], dtype=object)
+        return textos[codigos.reshape(-1)]
@@ -5,7 +5,7 @@ PIPELINE SIMPLES - DEMONSTRAÇÕES CONTÁBEIS ANS
 Pipeline completo em código simples e direto para iniciantes.
 
 PASSO A PASSO:
-1. Baixa ZIPs usando wget (você cola os links)
+1. Baixa ZIPs em paralelo, retomando downloads interrompidos (você cola os links)
 2. Descompacta os ZIPs
 3. Filtra arquivos de despesas/sinistros
 4. Normaliza os arquivos
@@ -14,12 +14,41 @@ Autor: Roberta Moreira dos Santos
 Data: 2026
 """
 
+import argparse
+import asyncio
+import codecs
+import io
+import json
 import os
-import wget
 import zipfile
 import pandas as pd
 import chardet
 import re
+import shutil
+import tempfile
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from itertools import repeat
+
+from downloads import baixar_arquivo, baixar_varios, descrever_resultado
+from acumulador import AcumuladorPorChave
+from plano_contas import IndiceContas
+from prefiltro import Prefiltro
+from particoes import ParticoesConsolidado, assinatura
+from numeros_br import OPCOES_LEITURA_BR, converter_valores
+from metricas import etapa_atual, execucao, medir_chamada, registrar_chunk
+from formato_intermediario import (
+    EscritorTabela,
+    eh_tabela_binaria,
+    gravar_csv_zip,
+    gravar_tabela,
+    iterar_tabela,
+    remover_outros_formatos,
+    resolver_formato,
+    tamanho_bytes,
+)
 
 
 # CONFIGURAÇÕES - AJUSTE AQUI
@@ -29,6 +58,13 @@ LINK1 = "https://dadosabertos.ans.gov.br/FTP/PDA/demonstracoes_contabeis/2025/1T
 LINK2 = "https://dadosabertos.ans.gov.br/FTP/PDA/demonstracoes_contabeis/2025/2T2025.zip"
 LINK3 = "https://dadosabertos.ans.gov.br/FTP/PDA/demonstracoes_contabeis/2025/3T2025.zip"
 
+# Downloads simultâneos (limite para não sobrecarregar o servidor da ANS)
+MAX_DOWNLOADS_SIMULTANEOS = 3
+
+# Opcional: checksum SHA-256 esperado por link, ex: {LINK1: "ab12..."}
+# Sem checksum, o arquivo existente é conferido pelo tamanho (Content-Length)
+CHECKSUMS_SHA256 = {}
+
 # Palavras-chave para filtrar despesas/sinistros
 PALAVRAS_CHAVE = [
     "despesa", "despesas",
@@ -39,14 +75,116 @@ PALAVRAS_CHAVE = [
     "utilizacao", "utilização"
 ]
 
+# Colunas de valor (formato pt-BR: 1.234,56), convertidas para número na leitura
+COLUNAS_VALORES = ("vl_saldo_inicial", "vl_saldo_final")
+
+# Possíveis nomes (normalizados) da coluna descritiva da conta
+COLUNAS_DESCRICAO = (
+    "descricao", "ds_descricao", "descricao_conta", "ds_conta",
+    "nome_conta", "conta", "ds_linha", "descricao_linha"
+)
+
+# Índice (conta, descrição) -> manter/descartar usado pelo filtro, gravado
+# para auditoria (ver plano_contas.py). Fica fora de 'dados_despesas_sinistros/'
+# para não ser lido como dado pela Etapa 4.
+ARQUIVO_INDICE_CONTAS = "_INDICE_CONTAS.csv"
+PASTA_INDICE_CONTAS = "dados_consolidados"
+
+# Esquema de leitura por etapa: {coluna normalizada: tipo}. Só as colunas do
+# esquema são lidas (usecols, comparando pelo nome normalizado, então variações
+# de cabeçalho como 'REG_ANS' / 'Reg ANS' funcionam) e já com tipos compactos.
+# VALOR_BR = número pt-BR convertido para float64 na leitura (ver numeros_br.py).
+VALOR_BR = "valor_br"
+ESQUEMA_FILTRO = {
+    "reg_ans": "category",
+    "cd_conta_contabil": "category",
+    **{c: "category" for c in COLUNAS_DESCRICAO},
+    "vl_saldo_final": VALOR_BR,
+}
+ESQUEMA_CONSOLIDACAO = {"reg_ans": "category", "vl_saldo_final": "float64"}
+
+# False = lê todas as colunas dos arquivos brutos (texto), como antes;
+# as saídas filtradas/normalizadas voltam a ter todas as colunas.
+PROJETAR_COLUNAS = True
+
+# Pré-filtro em bytes (CSV/TXT): só as linhas com conta começando com
+# CLASSE_DESPESAS chegam ao pd.read_csv (ver prefiltro.py). O filtro em
+# pandas continua rodando depois, como garantia.
+PREFILTRO_BYTES = True
+CLASSE_DESPESAS = "3"
+
 # TRADE-OFF TÉCNICO
 CHUNK_SIZE = 50000  # Linhas por chunk
 
-
-# ETAPA 1: BAIXAR ARQUIVOS COM WGET
+# Orçamento de memória para os chunks (bytes; None = sempre CHUNK_SIZE linhas).
+# Também pode ser passado na linha de comando: --max-memory 512MB.
+# Com orçamento, o tamanho de cada chunk é calculado a partir dos bytes por
+# linha medidos nos chunks anteriores (arquivos largos -> chunks menores).
+# Com vários processos, o orçamento é dividido entre eles.
+MEMORIA_MAXIMA = None
+LINHAS_AMOSTRA_MEMORIA = 1000   # 1º chunk (amostra para medir bytes/linha)
+FATOR_MEMORIA_CHUNK = 4         # chunk + cópias filtradas + buffers do parser
+CHUNK_MINIMO = 100
+FATOR_CHUNK_MAXIMO = 10         # teto do chunk = FATOR_CHUNK_MAXIMO * CHUNK_SIZE (valor atual)
+CHUNK_PEQUENO_AVISO = 5000      # avisa quando o orçamento força chunks menores que isso
+
+# Lê os CSVs direto de dentro dos ZIPs (sem extrair para 'dados_extraidos/').
+# Economiza escrita/leitura em disco e espaço temporário; a Etapa 2 é pulada.
+LER_DIRETO_DO_ZIP = False
+
+EXTENSOES_DADOS = (".csv", ".txt", ".xlsx", ".xls")
+
+# Manifesto com encoding/separador já detectados (por caminho, tamanho e mtime)
+ARQUIVO_CACHE_DIALETOS = "_cache_dialetos.json"
+
+# Processos usados na Etapa 3 (1 = sequencial). Cada arquivo é filtrado
+# de forma independente, então dá para usar um processo por arquivo.
+WORKERS_FILTRO = 1
+
+# Formato das tabelas trocadas entre as etapas (ver formato_intermediario.py):
+# "auto" (Parquet com pyarrow, senão NumPy colunar), "parquet", "numpy" ou "csv".
+# O consolidado final é sempre exportado também em ZIP (com o CSV dentro).
+FORMATO_INTERMEDIARIO = "auto"
+
+# Exportação do consolidado: o CSV é gravado direto dentro do ZIP, em blocos.
+# A cópia em CSV simples ao lado do ZIP é opcional (com FORMATO_INTERMEDIARIO
+# = "csv" ela é sempre gravada, pois é a entrada do Teste 2.1).
+NIVEL_COMPRESSAO_ZIP = 6   # 1 (mais rápido) a 9 (menor arquivo)
+GRAVAR_CSV_CONSOLIDADO = True
+
+# Consolidação incremental (Etapa 5): uma partição por ano/trimestre em
+# PASTA_PARTICOES, recalculada só quando os arquivos de origem mudam
+# (SHA-256 no manifesto). Mude VERSAO_PARTICOES para forçar o recálculo.
+CONSOLIDACAO_INCREMENTAL = True
+PASTA_PARTICOES = os.path.join("dados_consolidados", "particoes")
+VERSAO_PARTICOES = 1
+
+# Modo fundido: lê cada arquivo bruto UMA vez (filtro -> normalização -> soma)
+# em vez de três leituras (Etapas 3, 4 e 5). As pastas intermediárias viram
+# saídas opcionais.
+MODO_FUNDIDO = False
+GRAVAR_FILTRADOS = False     # 'dados_despesas_sinistros/' no modo fundido
+GRAVAR_NORMALIZADOS = False  # 'dados_normalizados/' no modo fundido
+
+# Modo em fluxo: download e processamento sobrepostos. Cada ZIP, assim que
+# termina de baixar, entra numa fila limitada e já é processado (como no
+# modo fundido, lendo direto do ZIP) enquanto os outros ainda baixam.
+# FILA_EM_FLUXO = ZIPs baixados esperando processamento (backpressure).
+MODO_EM_FLUXO = False
+FILA_EM_FLUXO = 2
+
+# Métricas por etapa (tempo, linhas, bytes, memória) vão para 'metricas/'.
+# Com True, também grava uma linha JSON por chunk processado.
+LOG_METRICAS_POR_CHUNK = False
+
+
+# ETAPA 1: BAIXAR ARQUIVOS
 def etapa1_baixar_arquivos():
     """
-    Baixa arquivos ZIP usando wget
+    Baixa os arquivos ZIP em paralelo (até MAX_DOWNLOADS_SIMULTANEOS por vez).
+
+    - retoma downloads interrompidos (HTTP Range)
+    - pula arquivos que já estão completos em 'dados_ans/'
     """
     print("=" * 70)
     print("ETAPA 1: BAIXANDO ARQUIVOS")
@@ -63,8 +201,33 @@ def etapa1_baixar_arquivos():
     
     # Lista de links
     links = [LINK1, LINK2, LINK3]
+    if not verificar_links(links):
+        return False
     
-    # Verificar se links foram preenchidos
+    print(f"Baixando {len(links)} arquivo(s) - até {MAX_DOWNLOADS_SIMULTANEOS} ao mesmo tempo")
+    for link in links:
+        print(f"URL: {link}")
+    print()
+
+    resultados = baixar_varios(
+        links,
+        pasta,
+        max_simultaneos=MAX_DOWNLOADS_SIMULTANEOS,
+        checksums=CHECKSUMS_SHA256
+    )
+
+    sucessos = sum(1 for r in resultados if r["status"] != "erro")
+    etapa_atual().somar(bytes_escritos=sum(r["tamanho"] for r in resultados if r["status"] == "baixado"))
+
+    print()
+    print(f"Resumo: {sucessos}/{len(links)} arquivo(s) disponível(is)")
+    print()
+    
+    return sucessos > 0
+
+
+def verificar_links(links):
+    """Confere se os links foram preenchidos; se não, explica como fazer."""
     links_vazios = []
     for i, link in enumerate(links, 1):
         if not link.startswith("http"):
@@ -81,34 +244,7 @@ def etapa1_baixar_arquivos():
         print("4. Cole nas variáveis LINK1, LINK2, LINK3 no topo do código")
         print()
         return False
-    
-    # Baixar cada arquivo
-    sucessos = 0
-    
-    for i, link in enumerate(links, 1):
-        if link.strip() == "":
-            continue
-        
-        print(f"[{i}/3] Baixando...")
-        print(f"URL: {link}")
-        
-        try:
-            arquivo_baixado = wget.download(link, out=pasta)
-            print()  # Pular linha após barra de progresso do wget
-            
-            tamanho_mb = os.path.getsize(arquivo_baixado) / (1024 * 1024)
-            print(f"✓ Download concluído! ({tamanho_mb:.2f} MB)")
-            sucessos += 1
-            
-        except Exception as e:
-            print(f"✗ Erro ao baixar: {e}")
-        
-        print()
-    
-    print(f"Resumo: {sucessos}/3 arquivo(s) baixado(s)")
-    print()
-    
-    return sucessos > 0
+    return True
 
 
 # ETAPA 2: DESCOMPACTAR ZIPS
@@ -158,6 +294,10 @@ def etapa2_descompactar():
         try:
             with zipfile.ZipFile(caminho_zip, 'r') as zip_ref:
                 zip_ref.extractall(pasta_destino)
+                etapa_atual().somar(
+                    bytes_lidos=os.path.getsize(caminho_zip),
+                    bytes_escritos=sum(info.file_size for info in zip_ref.infolist())
+                )
             
             print(f"  ✓ Descompactado com sucesso!")
             sucessos += 1
@@ -173,151 +313,684 @@ def etapa2_descompactar():
     return sucessos > 0
 
 
+# FONTES DE DADOS: ARQUIVO EM DISCO OU MEMBRO DE ZIP
+# Uma "fonte" é um caminho (str) ou uma tupla (caminho_zip, nome_do_membro).
+def listar_fontes_extraidas(pasta_origem="dados_extraidos"):
+    fontes = []
+    for raiz, _, files in os.walk(pasta_origem):
+        for f in files:
+            if f.endswith(EXTENSOES_DADOS):
+                fontes.append(os.path.join(raiz, f))
+    return fontes
+
+
+def listar_fontes_zip(pasta_zips="dados_ans"):
+    """Lista os arquivos de dados dentro de cada ZIP, sem extrair."""
+    fontes = []
+    if not os.path.exists(pasta_zips):
+        return fontes
+
+    for arquivo_zip in sorted(os.listdir(pasta_zips)):
+        if not arquivo_zip.endswith(".zip"):
+            continue
+        fontes.extend(fontes_do_zip(os.path.join(pasta_zips, arquivo_zip)))
+    return fontes
+
+
+def fontes_do_zip(caminho_zip):
+    """Arquivos de dados dentro de UM ZIP, como tuplas (caminho_zip, membro)."""
+    try:
+        with zipfile.ZipFile(caminho_zip) as zf:
+            return [
+                (caminho_zip, membro) for membro in zf.namelist()
+                if not membro.endswith("/") and membro.endswith(EXTENSOES_DADOS)
+            ]
+    except zipfile.BadZipFile as e:
+        print(f"  ✗ ZIP inválido: {os.path.basename(caminho_zip)} ({e})")
+        return []
+
+
+def nome_fonte(fonte):
+    if isinstance(fonte, tuple):
+        return os.path.basename(fonte[1])
+    return os.path.basename(fonte)
+
+
+def tamanho_fonte(fonte):
+    """Bytes lidos do disco para a fonte (membro de ZIP: tamanho compactado)."""
+    if isinstance(fonte, tuple):
+        caminho_zip, membro = fonte
+        with zipfile.ZipFile(caminho_zip) as zf:
+            return zf.getinfo(membro).compress_size
+    return tamanho_bytes(fonte)
+
+
+@contextmanager
+def abrir_fonte(fonte):
+    """Abre a fonte em modo binário (membro de ZIP é lido como stream)."""
+    if isinstance(fonte, tuple):
+        caminho_zip, membro = fonte
+        with zipfile.ZipFile(caminho_zip) as zf, zf.open(membro) as f:
+            yield f
+    else:
+        with open(fonte, "rb") as f:
+            yield f
+
+
 # ETAPA 3: FILTRAR LINHAS DE DESPESAS / SINISTROS (CORRETA)
-def etapa3_filtrar():
+def esquema_bruto():
+    """Esquema de leitura dos arquivos brutos da ANS (None = todas as colunas)."""
+    return ESQUEMA_FILTRO if PROJETAR_COLUNAS else None
+
+
+def criar_prefiltro(prefiltrar):
+    """Prefiltro das contas da CLASSE_DESPESAS (None se desligado)."""
+    return Prefiltro("cd_conta_contabil", CLASSE_DESPESAS) if prefiltrar else None
+
+
+def filtrar_arquivo(caminho, pasta_destino="dados_despesas_sinistros", formato=None, memoria_maxima=None,
+                    prefiltrar=False):
+    """
+    Filtra as despesas de UM arquivo (caminho ou membro de ZIP) para
+    '<nome>_despesas' na pasta de destino, no formato intermediário
+    (padrão: FORMATO_INTERMEDIARIO).
+
+    Não imprime nada: pode rodar em outro processo (ProcessPoolExecutor).
+    Retorna um dict com nome, nome_saida, linhas, malformados (valores que
+    não puderam ser convertidos para número) e erro (None se deu certo),
+    além dos contadores para as métricas: linhas_lidas, chunks,
+    bytes_lidos e bytes_escritos. 'contas' é o IndiceContas do arquivo.
+
+    memoria_maxima: orçamento (bytes) deste processo para os chunks;
+    aviso_memoria no resultado indica chunks forçados a ficar pequenos.
+
+    prefiltrar: descarta em bytes as linhas fora da CLASSE_DESPESAS antes
+    do parser (PREFILTRO_BYTES); elas continuam contadas em linhas_lidas.
+    """
+    nome = nome_fonte(caminho)
+    nome_base = os.path.splitext(nome)[0] + "_despesas"
+    resultado = {
+        "nome": nome, "nome_saida": None, "linhas": 0, "malformados": 0, "erro": None,
+        "linhas_lidas": 0, "chunks": 0, "bytes_lidos": 0, "bytes_escritos": 0,
+        "aviso_memoria": None, "contas": None
+    }
+    tamanho = TamanhoChunk(memoria_maxima=memoria_maxima)
+    indice = IndiceContas(PALAVRAS_CHAVE, CLASSE_DESPESAS)
+    prefiltro = criar_prefiltro(prefiltrar)
+
+    try:
+        resultado["bytes_lidos"] = tamanho_fonte(caminho)
+
+        # substitui a saída anterior, se existir (pra não duplicar ao rerodar)
+        with EscritorTabela(os.path.join(pasta_destino, nome_base), formato or FORMATO_INTERMEDIARIO) as escritor:
+            # ✅ incremental de verdade
+            chunks = iterar_chunks_arquivo(
+                caminho, bruto=True, tamanho=tamanho, esquema=esquema_bruto(), prefiltro=prefiltro
+            )
+            for i, chunk in enumerate(chunks):
+                filtrado = filtrar_despesas_assistenciais(chunk, indice)
+
+                resultado["linhas_lidas"] += len(chunk)
+                resultado["chunks"] += 1
+                registrar_chunk("etapa3_filtrar", nome, i, len(chunk), len(filtrado))
+
+                if filtrado.empty:
+                    continue
+
+                resultado["malformados"] += converter_colunas_valores(filtrado)
+                escritor.escrever(filtrado)
+
+    except Exception as e:
+        resultado["erro"] = str(e)
+        return resultado
+
+    resultado["aviso_memoria"] = tamanho.aviso
+    resultado["contas"] = indice
+    if prefiltro is not None:
+        resultado["linhas_lidas"] += prefiltro.linhas_descartadas
+    resultado["nome_saida"] = os.path.basename(escritor.caminho)
+    resultado["linhas"] = escritor.linhas
+    if escritor.linhas:
+        resultado["bytes_escritos"] = tamanho_bytes(escritor.caminho)
+    return resultado
+
+
+def somar_metricas_arquivo(res, com_saida=True):
+    """
+    Soma na etapa ativa os contadores devolvidos pelo worker de um arquivo.
+    com_saida=False: as linhas de saída são contadas em outro lugar
+    (no modo fundido, a saída é o consolidado).
+    """
+    etapa_atual().somar(
+        linhas_entrada=res["linhas_lidas"],
+        linhas_saida=res["linhas"] if com_saida else 0,
+        chunks=res["chunks"],
+        bytes_lidos=res["bytes_lidos"],
+        bytes_escritos=res["bytes_escritos"],
+    )
+
+
+def memoria_por_processo(workers):
+    """Orçamento de memória de cada processo (MEMORIA_MAXIMA dividida entre eles)."""
+    if not MEMORIA_MAXIMA:
+        return None
+    por_processo = MEMORIA_MAXIMA // max(1, workers)
+    print(f"Orçamento de memória: {formatar_bytes(MEMORIA_MAXIMA)}"
+          f" ({formatar_bytes(por_processo)} por processo)\n")
+    return por_processo
+
+
+def etapa3_filtrar(ler_de_zip=None, workers=None):
+    """
+    Filtra as despesas de cada arquivo de dados.
+
+    - ler_de_zip=True (padrão: LER_DIRETO_DO_ZIP): lê cada arquivo direto
+      do ZIP em 'dados_ans/', sem passar por 'dados_extraidos/'
+    - workers > 1 (padrão: WORKERS_FILTRO): filtra vários arquivos ao mesmo
+      tempo em processos separados. O relatório sai sempre na mesma ordem.
+    """
+    if ler_de_zip is None:
+        ler_de_zip = LER_DIRETO_DO_ZIP
+    if workers is None:
+        workers = WORKERS_FILTRO
+
     print("=" * 70)
     print("ETAPA 3: FILTRANDO DESPESAS (CONTA CONTÁBIL) - INCREMENTAL")
     print("=" * 70)
     print()
 
-    pasta_origem = "dados_extraidos"
     pasta_destino = "dados_despesas_sinistros"
     os.makedirs(pasta_destino, exist_ok=True)
 
-    arquivos = []
-    for raiz, _, files in os.walk(pasta_origem):
-        for f in files:
-            if f.endswith((".csv", ".txt", ".xlsx", ".xls")):
-                arquivos.append(os.path.join(raiz, f))
+    if ler_de_zip:
+        print("Modo: leitura direta dos ZIPs (sem extração)\n")
+        arquivos = listar_fontes_zip()
+    else:
+        arquivos = sorted(listar_fontes_extraidas())
 
     if not arquivos:
         print("✗ Nenhum arquivo encontrado.")
         return False
 
-    total_despesas = 0
-
-    for caminho in arquivos:
-        nome = os.path.basename(caminho)
-        ext = os.path.splitext(caminho)[1].lower()
-        print(f"Processando: {nome}")
-
-        nome_saida = nome
-        if nome_saida.lower().endswith(".csv"):
-            nome_saida = nome_saida.replace(".csv", "_despesas.csv")
-        elif nome_saida.lower().endswith(".txt"):
-            nome_saida = nome_saida.replace(".txt", "_despesas.csv")
-        else:
-            nome_saida = os.path.splitext(nome_saida)[0] + "_despesas.csv"
-
-        caminho_saida = os.path.join(pasta_destino, nome_saida)
-
-        # remove saída anterior se existir (pra não duplicar ao rerodar)
-        if os.path.exists(caminho_saida):
-            os.remove(caminho_saida)
-
-        escreveu_header = False
-        linhas_arquivo = 0
-
-        try:
-            if ext in [".csv", ".txt"]:
-                # ✅ incremental de verdade
-                for chunk in iterar_chunks_texto(caminho):
-                    filtrado = filtrar_despesas_assistenciais(chunk)
-
-                    if filtrado.empty:
-                        continue
-
-                    filtrado.to_csv(
-                        caminho_saida,
-                        sep=";",
-                        encoding="utf-8",
-                        index=False,
-                        mode="a",
-                        header=not escreveu_header
-                    )
-                    escreveu_header = True
-                    linhas_arquivo += len(filtrado)
+    if workers > 1 and len(arquivos) > 1:
+        workers = min(workers, len(arquivos))
+        print(f"Modo: {workers} processos em paralelo\n")
+        memoria = memoria_por_processo(workers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # map devolve na ordem de 'arquivos' -> relatório determinístico
+            resultados = list(executor.map(
+                filtrar_arquivo, arquivos, repeat(pasta_destino),
+                repeat(FORMATO_INTERMEDIARIO), repeat(memoria), repeat(PREFILTRO_BYTES)
+            ))
+    else:
+        memoria = memoria_por_processo(1)
+        resultados = (
+            filtrar_arquivo(caminho, pasta_destino, FORMATO_INTERMEDIARIO, memoria, PREFILTRO_BYTES)
+            for caminho in arquivos
+        )
 
-            else:
-                # Excel (não incremental)
-                df = pd.read_excel(caminho)
-                df_filtrado = filtrar_despesas_assistenciais(df)
-
-                if df_filtrado.empty:
-                    print("  ✗ Nenhuma despesa encontrada")
-                    continue
-
-                df_filtrado.to_csv(caminho_saida, sep=";", encoding="utf-8", index=False)
-                linhas_arquivo = len(df_filtrado)
+    total_despesas = 0
+    processados = []
 
+    for res in resultados:
+        processados.append(res)
+        print(f"Processando: {res['nome']}")
+        somar_metricas_arquivo(res)
 
-        except Exception as e:
-            print(f"  ✗ Erro ao processar: {e}")
+        if res["erro"]:
+            print(f"  ✗ Erro ao processar: {res['erro']}")
             continue
 
-        if linhas_arquivo == 0:
+        if res["linhas"] == 0:
             print("  ✗ Nenhuma despesa encontrada")
             continue
 
-        total_despesas += linhas_arquivo
-        print(f"  ✓ {linhas_arquivo} linhas de despesa (salvo em {nome_saida})")
+        total_despesas += res["linhas"]
+        print(f"  ✓ {res['linhas']} linhas de despesa (salvo em {res['nome_saida']})")
+        if res["malformados"]:
+            print(f"  ⚠ {res['malformados']} valor(es) malformado(s) (gravados como vazio)")
+        if res["aviso_memoria"]:
+            print(f"  ⚠ {res['aviso_memoria']}")
 
     print()
     print(f"Total de linhas de despesas: {total_despesas:,}")
     print()
+    gravar_indice_contas(processados)
+    # índice de execuções anteriores, gravado junto dos arquivos filtrados
+    indice_antigo = os.path.join(pasta_destino, ARQUIVO_INDICE_CONTAS)
+    if os.path.exists(indice_antigo):
+        os.remove(indice_antigo)
 
     return total_despesas > 0
 
 
 # ETAPA 4: NORMALIZAR ARQUIVOS
+def _encoding_da_amostra(amostra):
+    """
+    Caminho rápido: tenta UTF-8 estrito (decodificação em C) e só cai no
+    chardet (Python puro, lento) quando a amostra não é UTF-8 válido.
+    """
+    try:
+        # final=False: tolera um caractere multibyte cortado no fim da amostra
+        codecs.getincrementaldecoder("utf-8")("strict").decode(amostra, final=False)
+        return "utf-8-sig" if amostra.startswith(codecs.BOM_UTF8) else "utf-8"
+    except UnicodeDecodeError:
+        return chardet.detect(amostra)["encoding"] or "utf-8"
+
+
+def _separador_da_linha(primeira_linha):
+    separadores = [';', ',', '|', '\t']
+
+    contagens = {}
+    for sep in separadores:
+        contagens[sep] = primeira_linha.count(sep)
+
+    separador = max(contagens, key=contagens.get)
+
+    if contagens[separador] == 0:
+        return ';'
+
+    return separador
+
+
 def detectar_encoding(caminho_arquivo):
-    """Detecta encoding do arquivo"""
+    """Detecta encoding do arquivo (caminho ou membro de ZIP)"""
     try:
-        with open(caminho_arquivo, 'rb') as f:
-            resultado = chardet.detect(f.read(100000))
-        return resultado['encoding']
+        with abrir_fonte(caminho_arquivo) as f:
+            return _encoding_da_amostra(f.read(100000))
     except:
         return 'utf-8'
 
 
 def detectar_separador(caminho_arquivo, encoding):
     """Detecta separador CSV"""
-    separadores = [';', ',', '|', '\t']
-    
     try:
-        with open(caminho_arquivo, 'r', encoding=encoding) as f:
-            primeira_linha = f.readline()
-        
-        contagens = {}
-        for sep in separadores:
-            contagens[sep] = primeira_linha.count(sep)
-        
-        separador = max(contagens, key=contagens.get)
-        
-        if contagens[separador] == 0:
-            return ';'
-        
-        return separador
+        with abrir_fonte(caminho_arquivo) as f:
+            primeira_linha = io.TextIOWrapper(f, encoding=encoding).readline()
+        return _separador_da_linha(primeira_linha)
     except:
         return ';'
 
-def iterar_chunks_texto(caminho_arquivo, chunksize=CHUNK_SIZE):
+
+# CACHE DE DIALETOS (encoding + separador por arquivo)
+# Chave: caminho (+ membro do ZIP), tamanho e mtime. Se o arquivo mudar,
+# a chave muda e o dialeto é detectado de novo.
+_cache_dialetos = None
+
+
+def _chave_dialeto(fonte):
+    caminho = fonte[0] if isinstance(fonte, tuple) else fonte
+    info = os.stat(caminho)
+    nome = os.path.abspath(caminho)
+    if isinstance(fonte, tuple):
+        nome += "::" + fonte[1]
+    return f"{nome}|{info.st_size}|{info.st_mtime_ns}"
+
+
+def _ler_cache_dialetos():
+    try:
+        with open(ARQUIVO_CACHE_DIALETOS, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _salvar_cache_dialetos(chave, dialeto):
+    """Acrescenta uma entrada no manifesto (relê antes, para não perder
+    entradas gravadas por outros processos) e descarta versões antigas
+    do mesmo arquivo."""
+    cache = _ler_cache_dialetos()
+    prefixo = chave.rsplit("|", 2)[0] + "|"
+    cache = {k: v for k, v in cache.items() if not k.startswith(prefixo)}
+    cache[chave] = dialeto
+
+    temporario = f"{ARQUIVO_CACHE_DIALETOS}.{os.getpid()}.tmp"
+    try:
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2, ensure_ascii=False)
+        os.replace(temporario, ARQUIVO_CACHE_DIALETOS)
+    except OSError:
+        pass  # cache é só otimização
+
+
+def detectar_dialeto(caminho_arquivo):
+    """
+    Retorna (encoding, separador) do arquivo, usando o cache em
+    ARQUIVO_CACHE_DIALETOS. Na falta, lê uma amostra de 100 KB uma única
+    vez e detecta os dois a partir dela.
+    """
+    global _cache_dialetos
+    if _cache_dialetos is None:
+        _cache_dialetos = _ler_cache_dialetos()
+
+    try:
+        chave = _chave_dialeto(caminho_arquivo)
+    except OSError:
+        chave = None
+
+    if chave and chave in _cache_dialetos:
+        d = _cache_dialetos[chave]
+        return d["encoding"], d["separador"]
+
+    try:
+        with abrir_fonte(caminho_arquivo) as f:
+            amostra = f.read(100000)
+        encoding = _encoding_da_amostra(amostra)
+        primeira_linha = amostra.decode(encoding, errors="ignore").splitlines()[0] if amostra else ""
+        separador = _separador_da_linha(primeira_linha)
+    except Exception:
+        return "utf-8", ";"
+
+    if chave:
+        dialeto = {"encoding": encoding, "separador": separador}
+        _cache_dialetos[chave] = dialeto
+        _salvar_cache_dialetos(chave, dialeto)
+
+    return encoding, separador
+
+
+def ler_tamanho_memoria(texto):
+    """'512MB' / '2GB' / '1.5G' / '1048576' -> bytes."""
+    unidades = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024 ** 2, "MB": 1024 ** 2,
+                "G": 1024 ** 3, "GB": 1024 ** 3}
+    m = re.fullmatch(r"\s*([\d.]+)\s*([A-Za-z]*)\s*", str(texto))
+    if not m or m.group(2).upper() not in unidades:
+        raise ValueError(f"Tamanho de memória inválido: {texto!r} (use, por exemplo, 512MB ou 2GB)")
+    return int(float(m.group(1)) * unidades[m.group(2).upper()])
+
+
+def formatar_bytes(n):
+    for unidade in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:.0f} {unidade}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+class TamanhoChunk:
+    """
+    Decide quantas linhas ler no próximo chunk.
+
+    Sem memoria_maxima: sempre 'chunksize' (padrão: CHUNK_SIZE).
+    CHUNK_SIZE e o teto (FATOR_CHUNK_MAXIMO * CHUNK_SIZE) são lidos na hora,
+    então mudar CHUNK_SIZE depois do import vale para as próximas leituras.
+    Com memoria_maxima (bytes): o 1º chunk é uma amostra pequena; depois,
+    linhas = memoria_maxima / (bytes_por_linha * FATOR_MEMORIA_CHUNK),
+    com bytes_por_linha = maior valor medido até agora (memory_usage deep).
+
+    'aviso' fica preenchido se o orçamento forçar chunks muito pequenos.
+    """
+
+    def __init__(self, chunksize=None, memoria_maxima=None):
+        # CHUNK_SIZE lido aqui (e não como default) para valer o valor atual do módulo
+        self.chunksize = CHUNK_SIZE if chunksize is None else chunksize
+        self.memoria_maxima = memoria_maxima
+        self.bytes_por_linha = None
+        self.menor_chunk = None
+
+    def proximo(self):
+        if not self.memoria_maxima:
+            return self.chunksize
+        if self.bytes_por_linha is None:
+            return min(self.chunksize, LINHAS_AMOSTRA_MEMORIA)
+
+        linhas = int(self.memoria_maxima / (self.bytes_por_linha * FATOR_MEMORIA_CHUNK))
+        linhas = max(CHUNK_MINIMO, min(linhas, FATOR_CHUNK_MAXIMO * CHUNK_SIZE))
+        if self.menor_chunk is None or linhas < self.menor_chunk:
+            self.menor_chunk = linhas
+        return linhas
+
+    def observar(self, chunk):
+        if not self.memoria_maxima or len(chunk) == 0:
+            return
+        por_linha = chunk.memory_usage(index=True, deep=True).sum() / len(chunk)
+        self.bytes_por_linha = max(self.bytes_por_linha or 0.0, por_linha)
+
+    @property
+    def aviso(self):
+        if self.menor_chunk is None or self.menor_chunk >= CHUNK_PEQUENO_AVISO:
+            return None
+        return (
+            f"orçamento de memória ({formatar_bytes(self.memoria_maxima)}) forçou chunks de "
+            f"{self.menor_chunk:,} linhas (~{self.bytes_por_linha:,.0f} bytes/linha)"
+        )
+
+
+def opcoes_esquema(cabecalho, colunas_valores_br=None, esquema=None):
+    """
+    Opções do pd.read_csv para um cabeçalho:
+    - com esquema: usecols (por nome normalizado) + dtype compacto por coluna;
+      as colunas VALOR_BR usam o parser pt-BR
+    - sem esquema: colunas_valores_br como número pt-BR e o resto como texto
+
+    Se nenhuma coluna do cabeçalho estiver no esquema, lê tudo (sem projeção).
+    """
+    normalizadas = dict(zip(cabecalho, _colunas_normalizadas(tuple(cabecalho))))
+    valores = set(colunas_valores_br or ())
+    opcoes = {}
+
+    if esquema and any(n in esquema for n in normalizadas.values()):
+        opcoes["usecols"] = lambda c: normalizar_nome_coluna(c) in esquema
+        valores |= {n for n, tipo in esquema.items() if tipo == VALOR_BR}
+        opcoes["dtype"] = {
+            c: esquema[n] for c, n in normalizadas.items()
+            if n in esquema and esquema[n] != VALOR_BR
+        }
+    else:
+        opcoes["dtype"] = {c: str for c, n in normalizadas.items() if n not in valores}
+
+    if valores:
+        opcoes.update(OPCOES_LEITURA_BR)
+    return opcoes
+
+
+def iterar_chunks_texto(caminho_arquivo, chunksize=None, colunas_valores_br=None, tamanho=None,
+                        esquema=None, prefiltro=None):
     """
     Itera por chunks de CSV/TXT sem carregar o arquivo inteiro na memória.
-    Detecta encoding e separador automaticamente.
+    Detecta encoding e separador automaticamente (com cache, ver detectar_dialeto).
+
+    Aceita um caminho ou uma tupla (caminho_zip, membro): neste caso o
+    membro é lido como stream de dentro do ZIP, sem extrair para o disco.
+
+    colunas_valores_br: nomes (normalizados) das colunas de valor em pt-BR.
+    Elas são convertidas para float já na leitura (decimal ',' e milhar '.');
+    as demais colunas são lidas como texto.
+
+    tamanho: TamanhoChunk que decide as linhas de cada chunk (padrão:
+    sempre 'chunksize', ou o CHUNK_SIZE atual se omitido). Com orçamento de
+    memória, cada chunk é lido com reader.get_chunk(n), com n recalculado a
+    partir dos chunks anteriores.
+
+    esquema: {coluna normalizada: tipo} da etapa (ex: ESQUEMA_FILTRO):
+    só essas colunas são lidas, já com dtype compacto (ver opcoes_esquema).
+
+    prefiltro: Prefiltro que descarta linhas ainda em bytes, antes do
+    parser (ver prefiltro.py); as linhas descartadas ficam contadas nele.
+    """
+    encoding, separador = detectar_dialeto(caminho_arquivo)
+    tamanho = tamanho or TamanhoChunk(chunksize)
+
+    opcoes = {}
+    cabecalho = ()
+    if colunas_valores_br or esquema or prefiltro:
+        with abrir_fonte(caminho_arquivo) as f:
+            cabecalho = pd.read_csv(f, sep=separador, encoding=encoding, nrows=0).columns
+    if colunas_valores_br or esquema:
+        opcoes = opcoes_esquema(cabecalho, colunas_valores_br, esquema)
+
+    with abrir_fonte(caminho_arquivo) as f:
+        if prefiltro is not None:
+            f = prefiltro.envolver(f, _colunas_normalizadas(tuple(cabecalho)), encoding, separador)
+
+        with pd.read_csv(
+            f,
+            sep=separador,
+            encoding=encoding,
+            on_bad_lines="skip",
+            low_memory=False,
+            iterator=True,
+            **opcoes
+        ) as leitor:
+            while True:
+                try:
+                    chunk = leitor.get_chunk(tamanho.proximo())
+                except StopIteration:
+                    return
+                tamanho.observar(chunk)
+                yield chunk
+
+
+def iterar_chunks_excel(caminho_arquivo, chunksize=None, colunas_valores_br=None, tamanho=None,
+                        esquema=None):
+    """
+    Itera por chunks de uma planilha .xlsx sem carregar a pasta de trabalho
+    inteira (openpyxl em modo read_only: as linhas são lidas em stream do XML).
+    Usa a primeira aba; a primeira linha é o cabeçalho.
+
+    Mesmo contrato de iterar_chunks_texto(): colunas_valores_br ficam como
+    vieram da planilha (número ou texto pt-BR, convertido depois por
+    converter_valores) e as demais colunas viram texto.
+
+    .xls (formato binário antigo) não tem leitura em stream: cai no
+    pd.read_excel do arquivo inteiro, entregue em fatias.
+
+    tamanho e esquema: como em iterar_chunks_texto (a projeção é feita
+    linha a linha, já que o openpyxl não tem usecols).
+    """
+    ext = os.path.splitext(nome_fonte(caminho_arquivo))[1].lower()
+    tamanho = tamanho or TamanhoChunk(chunksize)
+    if esquema:
+        colunas_valores_br = set(colunas_valores_br or ()) | {n for n, t in esquema.items() if t == VALOR_BR}
+
+    if ext == ".xls":
+        with abrir_fonte(caminho_arquivo) as f:
+            df = pd.read_excel(f, dtype=object)
+        df = df[_projetar(list(df.columns), esquema)]
+        inicio = 0
+        while inicio < len(df):
+            linhas = tamanho.proximo()
+            chunk = _chunk_excel(df.iloc[inicio:inicio + linhas].reset_index(drop=True), colunas_valores_br, esquema)
+            tamanho.observar(chunk)
+            inicio += linhas
+            yield chunk
+        return
+
+    from openpyxl import load_workbook
+
+    with abrir_fonte(caminho_arquivo) as f:
+        if isinstance(caminho_arquivo, tuple):
+            # o openpyxl faz seek no arquivo: membro de ZIP vai para um buffer
+            # temporário (só o .xlsx compactado, não a planilha expandida)
+            origem = tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024)
+            shutil.copyfileobj(f, origem)
+            origem.seek(0)
+        else:
+            origem = f
+
+        wb = load_workbook(origem, read_only=True, data_only=True)
+        try:
+            linhas = wb.worksheets[0].iter_rows(values_only=True)
+            cabecalho = next(linhas, None)
+            if cabecalho is None:
+                return
+            colunas = [
+                str(c) if c is not None else f"Unnamed: {i}"
+                for i, c in enumerate(cabecalho)
+            ]
+            projetadas = _projetar(colunas, esquema)
+            indices = [colunas.index(c) for c in projetadas]
+            colunas = projetadas
+
+            bloco = []
+            limite = tamanho.proximo()
+            for linha in linhas:
+                if all(v is None for v in linha):
+                    continue
+                bloco.append([linha[i] if i < len(linha) else None for i in indices])
+                if len(bloco) >= limite:
+                    chunk = _chunk_excel(pd.DataFrame(bloco, columns=colunas, dtype=object), colunas_valores_br, esquema)
+                    tamanho.observar(chunk)
+                    yield chunk
+                    bloco = []
+                    limite = tamanho.proximo()
+            if bloco:
+                yield _chunk_excel(pd.DataFrame(bloco, columns=colunas, dtype=object), colunas_valores_br, esquema)
+        finally:
+            wb.close()
+            if origem is not f:
+                origem.close()
+
+
+def _projetar(colunas, esquema=None):
+    """Colunas cujo nome normalizado está no esquema (todas, se nenhuma estiver)."""
+    if not esquema:
+        return colunas
+    projetadas = [c for c in colunas if normalizar_nome_coluna(c) in esquema]
+    return projetadas or colunas
+
+
+def _chunk_excel(df, colunas_valores_br=None, esquema=None):
+    """
+    Colunas de valor: só números -> float64; mistura de números e texto
+    pt-BR -> tudo texto pt-BR (converter_valores trata e conta malformados).
+    Demais colunas viram texto, como no CSV, ou o tipo do esquema.
     """
-    encoding = detectar_encoding(caminho_arquivo)
-    separador = detectar_separador(caminho_arquivo, encoding)
+    for col in df.columns:
+        serie = df[col]
+        nome = normalizar_nome_coluna(col)
+        if colunas_valores_br and nome in colunas_valores_br:
+            vazio = serie.isna()
+            eh_numero = serie.map(lambda v: isinstance(v, (int, float))).astype(bool) & ~vazio
+            if (eh_numero | vazio).all():
+                df[col] = serie.astype("float64")
+            else:
+                df[col] = serie.where(
+                    ~eh_numero,
+                    serie[eh_numero].map(lambda v: repr(float(v)).replace(".", ","))
+                )
+            continue
+        df[col] = serie.where(serie.isna(), serie.astype(str)).astype("str")
+        if esquema and nome in esquema:
+            df[col] = df[col].astype(esquema[nome])
+    return df
 
-    for chunk in pd.read_csv(
-        caminho_arquivo,
-        sep=separador,
-        encoding=encoding,
-        on_bad_lines="skip",
-        low_memory=False,
-        chunksize=chunksize
-    ):
-        yield chunk
+
+def iterar_chunks_arquivo(caminho_arquivo, colunas=None, bruto=False, tamanho=None, esquema=None,
+                          prefiltro=None):
+    """
+    Itera por chunks de qualquer entrada do pipeline:
+    - tabelas do formato intermediário (.parquet / .npcol)
+      -> leitura tipada, com projeção opcional de 'colunas' (nomes normalizados)
+    - CSV/TXT -> iterar_chunks_texto(). Com bruto=True (arquivos da ANS),
+      as COLUNAS_VALORES são lidas já como número no formato pt-BR
+    - Excel -> iterar_chunks_excel() (stream das linhas com openpyxl)
+
+    tamanho: TamanhoChunk (orçamento de memória) para CSV/TXT/Excel; as
+    tabelas binárias são lidas parte por parte, como foram gravadas.
+    esquema: colunas/tipos da etapa para CSV/TXT/Excel (nas tabelas
+    binárias, a projeção é por 'colunas' e os tipos já vêm gravados).
+    prefiltro: só para CSV/TXT (ver iterar_chunks_texto).
+    """
+    ext = os.path.splitext(nome_fonte(caminho_arquivo))[1].lower()
+
+    if not isinstance(caminho_arquivo, tuple) and eh_tabela_binaria(caminho_arquivo):
+        yield from iterar_tabela(caminho_arquivo, colunas=colunas, chunksize=CHUNK_SIZE)
+    elif ext in [".csv", ".txt"]:
+        yield from iterar_chunks_texto(
+            caminho_arquivo,
+            colunas_valores_br=COLUNAS_VALORES if bruto else None,
+            tamanho=tamanho,
+            esquema=esquema,
+            prefiltro=prefiltro
+        )
+    else:
+        yield from iterar_chunks_excel(
+            caminho_arquivo,
+            colunas_valores_br=COLUNAS_VALORES if bruto else None,
+            tamanho=tamanho,
+            esquema=esquema
+        )
 
 
 def ler_arquivo(caminho_arquivo):
@@ -375,68 +1048,90 @@ def ler_arquivo(caminho_arquivo):
         return None
 
 
+def normalizar_nome_coluna(coluna):
+    """
+    'Descrição da Conta' -> 'descricao_da_conta'
+
+    Acentos são removidos de forma genérica (decomposição Unicode NFKD
+    + remoção dos sinais diacríticos), sem lista fixa de caracteres.
+    """
+    nome = str(coluna).strip().lower().replace(" ", "_")
+    nome = unicodedata.normalize("NFKD", nome)
+    return "".join(c for c in nome if not unicodedata.combining(c))
+
+
+@lru_cache(maxsize=256)
+def _colunas_normalizadas(colunas):
+    # O cabeçalho é fixo por arquivo: com o cache, o mapeamento é
+    # calculado uma vez por arquivo, e não uma vez por chunk.
+    return tuple(normalizar_nome_coluna(c) for c in colunas)
+
+
 def normalizar_colunas(df):
-    df_norm = df.copy()
-
-    df_norm.columns = (
-        df_norm.columns
-        .str.strip()
-        .str.lower()
-        .str.replace(' ', '_', regex=False)
-        .str.replace('ã', 'a', regex=False)
-        .str.replace('õ', 'o', regex=False)
-        .str.replace('á', 'a', regex=False)
-        .str.replace('é', 'e', regex=False)
-        .str.replace('í', 'i', regex=False)
-        .str.replace('ó', 'o', regex=False)
-        .str.replace('ú', 'u', regex=False)
-        .str.replace('â', 'a', regex=False)
-        .str.replace('ê', 'e', regex=False)
-        .str.replace('ô', 'o', regex=False)
-        .str.replace('ç', 'c', regex=False)
-    )
+    """
+    Normaliza os nomes das colunas NO PRÓPRIO DataFrame (sem copiar os dados)
+    e o retorna, para uso encadeado.
+    """
+    colunas = tuple(df.columns)
+    novas = _colunas_normalizadas(colunas)
+
+    if novas != colunas:
+        df.columns = novas
 
-    return df_norm
+    return df
 
 
-def filtrar_despesas_assistenciais(df):
+def filtrar_despesas_assistenciais(df, indice=None):
     """
     Filtro mais aderente a 'assistenciais/sinistros' sem depender de um layout único.
     Estratégia:
     1) pega apenas contas da classe 3 (despesas)
     2) se existir coluna descritiva, filtra por PALAVRAS_CHAVE
+
+    A regra é decidida uma vez por par (conta, descrição) no IndiceContas;
+    passe o mesmo 'indice' para todos os chunks de um arquivo para
+    reaproveitar as decisões (e depois exportá-lo).
     """
     df = normalizar_colunas(df)
 
     if "cd_conta_contabil" not in df.columns:
         return df.iloc[0:0]  # vazio
 
-    df["cd_conta_contabil"] = df["cd_conta_contabil"].astype(str)
-    df = df[df["cd_conta_contabil"].str.startswith("3")]
-
-    if df.empty:
-        return df
+    if indice is None:
+        indice = IndiceContas(PALAVRAS_CHAVE, CLASSE_DESPESAS)
 
     # tenta achar uma coluna de texto para aplicar palavras-chave
-    possiveis_colunas_texto = [
-        "descricao", "ds_descricao", "descricao_conta", "ds_conta",
-        "nome_conta", "conta", "ds_linha", "descricao_linha"
-    ]
-    col_texto = next((c for c in possiveis_colunas_texto if c in df.columns), None)
-
-    # se não tiver coluna de texto, volta só com a regra da conta
-    if not col_texto:
-        return df
-
-    # filtra por palavras-chave (case-insensitive)
-    padrao = "|".join(re.escape(p) for p in PALAVRAS_CHAVE)
-    mask = (
-        df[col_texto]
-        .astype(str)
-        .str.lower()
-        .str.contains(padrao, na=False)
+    # (sem coluna de texto, vale só a regra da conta)
+    col_texto = next((c for c in COLUNAS_DESCRICAO if c in df.columns), None)
+    descricoes = df[col_texto] if col_texto else None
+
+    # assign em vez de atribuir na fatia (SettingWithCopyWarning no pandas < 3)
+    return df[indice.mascara(df["cd_conta_contabil"], descricoes)].assign(
+        cd_conta_contabil=lambda d: d["cd_conta_contabil"].astype(str)
     )
-    return df[mask]
+
+
+def gravar_indice_contas(resultados, pasta_destino=PASTA_INDICE_CONTAS):
+    """Junta os índices de conta de cada arquivo e grava ARQUIVO_INDICE_CONTAS."""
+    indice = IndiceContas(PALAVRAS_CHAVE, CLASSE_DESPESAS)
+    for res in resultados:
+        if res.get("contas") is not None:
+            indice.juntar(res["contas"])
+    if not len(indice):
+        return
+
+    os.makedirs(pasta_destino, exist_ok=True)
+    indice.exportar(os.path.join(pasta_destino, ARQUIVO_INDICE_CONTAS))
+    mantidas = indice.contas_mantidas()
+    print(f"✓ Índice de contas salvo: {ARQUIVO_INDICE_CONTAS}"
+          f" ({len(indice)} pares conta/descrição, {len(mantidas)} conta(s) mantida(s))\n")
+
+
+def gravar_relatorio_normalizacao(metadados, pasta_destino):
+    df_meta = pd.DataFrame(metadados)
+    caminho_relatorio = os.path.join(pasta_destino, "_RELATORIO.csv")
+    df_meta.to_csv(caminho_relatorio, sep=";", encoding="utf-8", index=False)
+    print("✓ Relatório salvo: _RELATORIO.csv\n")
 
 
 def etapa4_normalizar():
@@ -454,8 +1149,14 @@ def etapa4_normalizar():
         return False
 
     os.makedirs(pasta_destino, exist_ok=True)
+    # sobra de execuções anteriores, quando o índice de contas era normalizado como dado
+    remover_outros_formatos(os.path.join(pasta_destino, "_INDICE_CONTAS_normalizado"), None)
 
-    arquivos = [f for f in os.listdir(pasta_origem) if f.endswith((".csv", ".txt", ".xlsx", ".xls"))]
+    # arquivos com '_' no início são auxiliares (índices/relatórios), não dados
+    arquivos = [
+        f for f in os.listdir(pasta_origem)
+        if not f.startswith("_") and (f.endswith((".csv", ".txt", ".xlsx", ".xls")) or eh_tabela_binaria(f))
+    ]
     if not arquivos:
         print("✗ Nenhum arquivo encontrado!")
         return False
@@ -469,52 +1170,35 @@ def etapa4_normalizar():
         print(f"[{i}/{len(arquivos)}] Normalizando: {arquivo}")
 
         caminho_origem = os.path.join(pasta_origem, arquivo)
-        ext = os.path.splitext(caminho_origem)[1].lower()
-
         nome_base = os.path.splitext(arquivo)[0]
-        nome_saida = f"{nome_base}_normalizado.csv"
-        caminho_saida = os.path.join(pasta_destino, nome_saida)
-
-        # remove saída anterior se existir
-        if os.path.exists(caminho_saida):
-            os.remove(caminho_saida)
-
-        escreveu_header = False
-        linhas_total = 0
         colunas_total = None
 
         try:
-            if ext in [".csv", ".txt"]:
-                for chunk in iterar_chunks_texto(caminho_origem):
+            # remove saída anterior se existir
+            caminho_base = os.path.join(pasta_destino, f"{nome_base}_normalizado")
+            tamanho = TamanhoChunk(memoria_maxima=MEMORIA_MAXIMA)
+            with EscritorTabela(caminho_base, FORMATO_INTERMEDIARIO) as escritor:
+                for indice, chunk in enumerate(iterar_chunks_arquivo(caminho_origem, tamanho=tamanho)):
                     chunk_norm = normalizar_colunas(chunk)
 
                     if colunas_total is None:
                         colunas_total = len(chunk_norm.columns)
 
-                    chunk_norm.to_csv(
-                        caminho_saida,
-                        sep=";",
-                        encoding="utf-8",
-                        index=False,
-                        mode="a",
-                        header=not escreveu_header
-                    )
-                    escreveu_header = True
-                    linhas_total += len(chunk_norm)
-
-            else:
-                # Excel (não incremental)
-                df = pd.read_excel(caminho_origem)
-                df_norm = normalizar_colunas(df)
-                linhas_total = len(df_norm)
-                colunas_total = len(df_norm.columns)
-                df_norm.to_csv(caminho_saida, sep=";", encoding="utf-8", index=False)
+                    escritor.escrever(chunk_norm)
+                    etapa_atual().somar(linhas_entrada=len(chunk), linhas_saida=len(chunk_norm), chunks=1)
+                    registrar_chunk("etapa4_normalizar", arquivo, indice, len(chunk), len(chunk_norm))
 
         except Exception as e:
             print(f"  ✗ Erro: {e}\n")
             continue
 
-        tamanho_mb = os.path.getsize(caminho_saida) / (1024 * 1024)
+        nome_saida = os.path.basename(escritor.caminho)
+        linhas_total = escritor.linhas
+        tamanho_saida = tamanho_bytes(escritor.caminho) if linhas_total else 0
+        tamanho_mb = tamanho_saida / (1024 * 1024)
+        etapa_atual().somar(bytes_lidos=tamanho_bytes(caminho_origem), bytes_escritos=tamanho_saida)
+        if tamanho.aviso:
+            print(f"  ⚠ {tamanho.aviso}")
         print(f"  ✓ Salvo: {nome_saida} | Linhas: {linhas_total:,} | Colunas: {colunas_total} | {tamanho_mb:.2f} MB\n")
 
         processados += 1
@@ -527,159 +1211,613 @@ def etapa4_normalizar():
         })
 
     if metadados:
-        df_meta = pd.DataFrame(metadados)
-        caminho_relatorio = os.path.join(pasta_destino, "_RELATORIO.csv")
-        df_meta.to_csv(caminho_relatorio, sep=";", encoding="utf-8", index=False)
-        print("✓ Relatório salvo: _RELATORIO.csv\n")
+        gravar_relatorio_normalizacao(metadados, pasta_destino)
 
     print(f"Resumo: {processados}/{len(arquivos)} arquivo(s) normalizado(s)\n")
     return processados > 0
 
 
 # ETAPA 5: CONSOLIDAÇÃO FINAL
-def etapa5_consolidar():
-    print("\nETAPA 5: CONSOLIDAÇÃO FINAL - INCREMENTAL")
-    print("=" * 60)
+def extrair_periodo(fonte):
+    """
+    Extrai (ano, trimestre) do nome do arquivo, ex: '1T2025.csv' -> (2025, '1T').
+    Para membro de ZIP sem o período no nome, tenta o nome do próprio ZIP.
+    Retorna None se não encontrar.
+    """
+    nomes = [nome_fonte(fonte)]
+    if isinstance(fonte, tuple):
+        nomes.append(os.path.basename(fonte[0]))
 
-    pasta_entrada = "dados_despesas_sinistros"
-    pasta_saida = "dados_consolidados"
-    os.makedirs(pasta_saida, exist_ok=True)
+    for nome in nomes:
+        match = re.search(r"([1-4])T(\d{4})", nome)
+        if match:
+            return int(match.group(2)), f"{match.group(1)}T"
+    return None
+
+
+def converter_colunas_valores(df):
+    """
+    Garante as COLUNAS_VALORES como float64 (no próprio DataFrame).
+    Retorna quantos valores estavam malformados (viraram NaN).
+    """
+    malformados = 0
+    for col in COLUNAS_VALORES:
+        if col in df.columns:
+            df[col], n = converter_valores(df[col])
+            malformados += n
+    return malformados
+
+
+def somar_chunk(chunk, acumulado):
+    """
+    Soma vl_saldo_final > 0 por reg_ans do chunk (já normalizado) no
+    AcumuladorPorChave. Ignora chunks sem as colunas necessárias.
+
+    Retorna a quantidade de valores malformados encontrados no chunk.
+    """
+    colunas_necessarias = {"reg_ans", "vl_saldo_final"}
+    if not colunas_necessarias.issubset(chunk.columns):
+        return 0
+
+    # numérico seguro (sem custo se a coluna já foi lida como número)
+    valores, malformados = converter_valores(chunk["vl_saldo_final"])
 
+    positivos = (valores > 0).to_numpy()
+    if not positivos.any():
+        return malformados
+
+    # códigos inteiros por reg_ans + np.bincount (sem groupby/dict por chunk)
+    chaves = chunk["reg_ans"].astype(str).to_numpy()
+    acumulado.adicionar(chaves[positivos], valores.to_numpy()[positivos])
+
+    return malformados
+
+
+def resumo_periodo(acumulado, ano, trimestre):
+    df = acumulado.para_dataframe("reg_ans", "valor_despesas")
+    df["ano"] = ano
+    df["trimestre"] = trimestre
+    return df
+
+
+def gravar_consolidado(consolidados_por_arquivo, pasta_saida="dados_consolidados"):
+    """
+    Junta os resumos por arquivo e grava o ZIP consolidado (CSV escrito
+    direto dentro dele), o CSV simples (opcional, GRAVAR_CSV_CONSOLIDADO) e
+    a tabela binária para o Teste 2, se o formato intermediário não for CSV.
+    """
+    if not consolidados_por_arquivo:
+        print("❌ Nenhum dado válido consolidado.")
+        return False
+
+    os.makedirs(pasta_saida, exist_ok=True)
     arquivo_csv = os.path.join(pasta_saida, "consolidado_despesas.csv")
     arquivo_zip = os.path.join(pasta_saida, "consolidado_despesas.zip")
 
+    df_final = pd.concat(consolidados_por_arquivo, ignore_index=True)
+    df_final["valor_despesas"] = df_final["valor_despesas"].round(2)
+    df_final = df_final.sort_values(by=["ano", "trimestre", "reg_ans"])
+
+    formato = resolver_formato(FORMATO_INTERMEDIARIO)
+    gravar_csv = GRAVAR_CSV_CONSOLIDADO or formato == "csv"
+    if not gravar_csv and os.path.exists(arquivo_csv):
+        os.remove(arquivo_csv)  # cópia antiga ficaria desatualizada
+
+    # ZIP e CSV simples na mesma passada; a tabela binária (que o Teste 2.1
+    # prefere, ver localizar_tabela) apaga as de outros formatos
+    gravados = gravar_csv_zip(
+        df_final,
+        arquivo_zip,
+        "consolidado_despesas.csv",
+        caminho_csv=arquivo_csv if gravar_csv else None,
+        nivel_compressao=NIVEL_COMPRESSAO_ZIP,
+    )
+    arquivo_binario = None
+    if formato != "csv":
+        arquivo_binario = gravar_tabela(
+            df_final, os.path.splitext(arquivo_csv)[0], formato,
+            manter_csv=gravar_csv, linhas_por_parte=CHUNK_SIZE
+        )
+        gravados.append(arquivo_binario)
+
+    etapa_atual().somar(
+        linhas_saida=len(df_final),
+        bytes_escritos=sum(tamanho_bytes(c) for c in gravados)
+    )
+
+    print("\n✅ Consolidação incremental concluída!")
+    if gravar_csv:
+        print(f"📁 CSV gerado: {arquivo_csv}")
+    print(f"🗜️ ZIP gerado: {arquivo_zip}")
+    if arquivo_binario:
+        print(f"🧱 Tabela binária: {arquivo_binario}")
+    print(f"📊 Total de registros: {len(df_final)}")
+
+    return True
+
+
+def assinatura_consolidacao():
+    """Assinatura da configuração da Etapa 5 (muda -> partições recalculadas)."""
+    return assinatura(
+        versao=VERSAO_PARTICOES,
+        esquema=ESQUEMA_CONSOLIDACAO,
+        formato=resolver_formato(FORMATO_INTERMEDIARIO),
+    )
+
+
+def consolidar_arquivo(pasta_entrada, arquivo, ano, trimestre):
+    """Soma vl_saldo_final por reg_ans de UM arquivo filtrado (None se não houver valores)."""
+    caminho = os.path.join(pasta_entrada, arquivo)
+    print(f"→ Consolidando: {arquivo}")
+
+    # acumulador: reg_ans -> soma(vl_saldo_final)
+    acumulado = AcumuladorPorChave()
+    malformados = 0
+    tamanho = TamanhoChunk(memoria_maxima=MEMORIA_MAXIMA)
+
+    # lê só as colunas do ESQUEMA_CONSOLIDACAO (tabela binária ou CSV)
+    etapa_atual().somar(bytes_lidos=tamanho_bytes(caminho))
+    chunks = iterar_chunks_arquivo(
+        caminho, colunas=list(ESQUEMA_CONSOLIDACAO), tamanho=tamanho, esquema=ESQUEMA_CONSOLIDACAO
+    )
+    for indice, chunk in enumerate(chunks):
+        malformados += somar_chunk(normalizar_colunas(chunk), acumulado)
+        etapa_atual().somar(linhas_entrada=len(chunk), chunks=1)
+        registrar_chunk("etapa5_consolidar", arquivo, indice, len(chunk))
+
+    if malformados:
+        print(f"  ⚠️ {malformados} valor(es) malformado(s) em vl_saldo_final (ignorados)")
+    if tamanho.aviso:
+        print(f"  ⚠️ {tamanho.aviso}")
+
+    if not acumulado:
+        print("  ⚠️ Nenhum valor válido encontrado.")
+        return None
+
+    return resumo_periodo(acumulado, ano, trimestre)
+
+
+def etapa5_consolidar(incremental=None):
+    """
+    Consolida os arquivos filtrados por ano/trimestre.
+
+    incremental=True (padrão: CONSOLIDACAO_INCREMENTAL): cada trimestre é
+    uma partição em 'dados_consolidados/particoes/' (ver particoes.py) e só
+    é recalculado se os arquivos de origem mudaram; o CSV/ZIP final é
+    montado a partir das partições.
+    """
+    if incremental is None:
+        incremental = CONSOLIDACAO_INCREMENTAL
+
+    print("\nETAPA 5: CONSOLIDAÇÃO FINAL - INCREMENTAL")
+    print("=" * 60)
+
+    pasta_entrada = "dados_despesas_sinistros"
+
     if not os.path.exists(pasta_entrada):
         print("❌ Pasta 'dados_despesas_sinistros' não encontrada.")
         return False
 
-    arquivos = [ f for f in os.listdir(pasta_entrada)
-        if f.endswith(".csv") and re.search(r"[1-4]T\d{4}", f)
-    ]
+    arquivos = sorted(f for f in os.listdir(pasta_entrada)
+        if (f.endswith(".csv") or eh_tabela_binaria(f)) and re.search(r"[1-4]T\d{4}", f)
+    )
     
     if not arquivos:
         print("❌ Nenhum arquivo de despesas encontrado para consolidar.")
         return False
 
-    consolidados_por_arquivo = []
-
+    # arquivos de cada trimestre (normalmente um só)
+    por_periodo = {}
     for arquivo in arquivos:
-        caminho = os.path.join(pasta_entrada, arquivo)
-        print(f"→ Consolidando: {arquivo}")
-
-        match = re.search(r"([1-4])T(\d{4})", arquivo)
-        if not match:
+        periodo = extrair_periodo(arquivo)
+        if not periodo:
+            print(f"→ {arquivo}")
             print("  ❌ Não foi possível identificar trimestre/ano pelo nome.")
             continue
+        por_periodo.setdefault(periodo, []).append(arquivo)
 
-        trimestre = f"{match.group(1)}T"
-        ano = int(match.group(2))
+    particoes = None
+    if incremental:
+        particoes = ParticoesConsolidado(PASTA_PARTICOES, assinatura_consolidacao(), FORMATO_INTERMEDIARIO)
 
-        # acumulador: reg_ans -> soma(vl_saldo_final)
-        acumulado = {}
+    consolidados_por_arquivo = []
+    recalculadas = 0
+
+    for periodo in sorted(por_periodo):
+        ano, trimestre = periodo
+        if particoes is not None:
+            # hash reaproveitado do manifesto se tamanho e mtime não mudaram
+            fontes = particoes.fontes(periodo, pasta_entrada, por_periodo[periodo])
+            resumo = particoes.ler(periodo, fontes)
+            if resumo is not None:
+                print(f"→ {trimestre}/{ano}: sem mudanças, partição reaproveitada")
+                if len(resumo):
+                    consolidados_por_arquivo.append(resumo)
+                continue
+
+        recalculadas += 1
+        resumos = []
+        erro = False
+        for arquivo in por_periodo[periodo]:
+            try:
+                resumo = consolidar_arquivo(pasta_entrada, arquivo, ano, trimestre)
+            except Exception as e:
+                print(f"  ❌ Erro ao processar: {e}")
+                erro = True
+                continue
+            if resumo is not None:
+                resumos.append(resumo)
+
+        consolidados_por_arquivo.extend(resumos)
+        # com erro, a partição não é gravada: na próxima execução tenta de novo
+        if particoes is not None and not erro:
+            particoes.gravar(periodo, pd.concat(resumos, ignore_index=True) if resumos else pd.DataFrame(), fontes)
+
+    if particoes is not None:
+        for chave in particoes.manter_apenas(por_periodo):
+            print(f"🗑️ Partição removida (arquivos de origem não existem mais): {chave}")
+        particoes.salvar_manifesto()
+        print(f"\n🧩 Partições: {recalculadas} recalculada(s), {len(por_periodo) - recalculadas} reaproveitada(s)")
+
+    return gravar_consolidado(consolidados_por_arquivo)
+
+
+# MODO FUNDIDO: FILTRAR + NORMALIZAR + CONSOLIDAR NUMA ÚNICA LEITURA
+def processar_arquivo_fundido(caminho, gravar_filtrados=False, gravar_normalizados=False, formato=None,
+                              memoria_maxima=None, prefiltrar=False):
+    """
+    Lê UM arquivo bruto uma única vez e, em cada chunk, aplica
+    filtro -> normalização -> soma por reg_ans.
+
+    As saídas intermediárias ('dados_despesas_sinistros/' e
+    'dados_normalizados/') são opcionais. Não imprime nada (pode rodar
+    em outro processo). Retorna um dict com nome, linhas, colunas,
+    malformados, normalizado (caminho gravado), resumo (DataFrame ou None)
+    e erro, além dos contadores para as métricas e o índice de contas
+    (como em filtrar_arquivo).
+    """
+    nome = nome_fonte(caminho)
+    resultado = {
+        "nome": nome, "linhas": 0, "colunas": None, "malformados": 0,
+        "normalizado": None, "resumo": None, "erro": None,
+        "linhas_lidas": 0, "chunks": 0, "bytes_lidos": 0, "bytes_escritos": 0,
+        "aviso_memoria": None, "contas": None
+    }
+
+    periodo = extrair_periodo(caminho)
+    if not periodo:
+        resultado["erro"] = "não foi possível identificar trimestre/ano pelo nome"
+        return resultado
+    ano, trimestre = periodo
+
+    nome_base = os.path.splitext(nome)[0] + "_despesas"
+    formato = formato or FORMATO_INTERMEDIARIO
+    escritores = []
+
+    acumulado = AcumuladorPorChave()
+    tamanho = TamanhoChunk(memoria_maxima=memoria_maxima)
+    indice = IndiceContas(PALAVRAS_CHAVE, CLASSE_DESPESAS)
+    prefiltro = criar_prefiltro(prefiltrar)
 
-        try:
-            for chunk in iterar_chunks_texto(caminho):
-                chunk = normalizar_colunas(chunk)
+    try:
+        if gravar_filtrados:
+            os.makedirs("dados_despesas_sinistros", exist_ok=True)
+            escritores.append(EscritorTabela(os.path.join("dados_despesas_sinistros", nome_base), formato))
+        if gravar_normalizados:
+            os.makedirs("dados_normalizados", exist_ok=True)
+            escritores.append(EscritorTabela(os.path.join("dados_normalizados", f"{nome_base}_normalizado"), formato))
 
-                colunas_necessarias = {"reg_ans", "vl_saldo_final"}
-                if not colunas_necessarias.issubset(chunk.columns):
-                    continue
+        resultado["bytes_lidos"] = tamanho_fonte(caminho)
 
-                # numérico seguro
-                vals = (
-                    chunk["vl_saldo_final"]
-                    .astype(str)
-                    .str.replace(".", "", regex=False)
-                    .str.replace(",", ".", regex=False)
-                )
-                chunk["vl_saldo_final"] = pd.to_numeric(vals, errors="coerce")
+        chunks = iterar_chunks_arquivo(
+            caminho, bruto=True, tamanho=tamanho, esquema=esquema_bruto(), prefiltro=prefiltro
+        )
+        for i, chunk in enumerate(chunks):
+            # filtrar_despesas_assistenciais já devolve as colunas normalizadas
+            filtrado = filtrar_despesas_assistenciais(chunk, indice)
 
-                chunk = chunk[chunk["vl_saldo_final"] > 0]
-                if chunk.empty:
-                    continue
+            resultado["linhas_lidas"] += len(chunk)
+            resultado["chunks"] += 1
+            registrar_chunk("etapa_fundida", nome, i, len(chunk), len(filtrado))
 
-                # soma do chunk por reg_ans
-                chunk["reg_ans"] = chunk["reg_ans"].astype(str)
-                soma_chunk = chunk.groupby("reg_ans")["vl_saldo_final"].sum()
+            if filtrado.empty:
+                continue
 
-                # acumula em dict (leve)
-                for reg, v in soma_chunk.items():
-                    acumulado[reg] = acumulado.get(reg, 0.0) + float(v)
+            resultado["malformados"] += converter_colunas_valores(filtrado)
+            for escritor in escritores:
+                escritor.escrever(filtrado)
 
-        except Exception as e:
-            print(f"  ❌ Erro ao processar: {e}")
+            resultado["linhas"] += len(filtrado)
+            resultado["colunas"] = len(filtrado.columns)
+            somar_chunk(filtrado, acumulado)
+
+    except Exception as e:
+        resultado["erro"] = str(e)
+        return resultado
+
+    finally:
+        for escritor in escritores:
+            escritor.fechar()
+
+    resultado["bytes_escritos"] = sum(tamanho_bytes(e.caminho) for e in escritores if e.linhas)
+    resultado["aviso_memoria"] = tamanho.aviso
+    resultado["contas"] = indice
+    if prefiltro is not None:
+        resultado["linhas_lidas"] += prefiltro.linhas_descartadas
+    if gravar_normalizados:
+        resultado["normalizado"] = escritores[-1].caminho
+    if acumulado:
+        resultado["resumo"] = resumo_periodo(acumulado, ano, trimestre)
+    return resultado
+
+
+def etapa_fundida(ler_de_zip=None, workers=None, gravar_filtrados=None, gravar_normalizados=None):
+    """
+    Substitui as Etapas 3, 4 e 5: cada linha bruta é lida/parseada uma
+    única vez (em vez de três). Aceita os mesmos modos da Etapa 3
+    (leitura direta do ZIP e processos em paralelo).
+    """
+    if ler_de_zip is None:
+        ler_de_zip = LER_DIRETO_DO_ZIP
+    if workers is None:
+        workers = WORKERS_FILTRO
+    if gravar_filtrados is None:
+        gravar_filtrados = GRAVAR_FILTRADOS
+    if gravar_normalizados is None:
+        gravar_normalizados = GRAVAR_NORMALIZADOS
+
+    print("=" * 70)
+    print("ETAPAS 3-5 (MODO FUNDIDO): FILTRAR + NORMALIZAR + CONSOLIDAR")
+    print("=" * 70)
+    print()
+
+    arquivos = listar_fontes_zip() if ler_de_zip else sorted(listar_fontes_extraidas())
+    if not arquivos:
+        print("✗ Nenhum arquivo encontrado.")
+        return False
+
+    paralelo = workers > 1 and len(arquivos) > 1
+    if paralelo:
+        workers = min(workers, len(arquivos))
+        print(f"Modo: {workers} processos em paralelo\n")
+
+    processar = partial(
+        processar_arquivo_fundido,
+        gravar_filtrados=gravar_filtrados,
+        gravar_normalizados=gravar_normalizados,
+        formato=FORMATO_INTERMEDIARIO,
+        memoria_maxima=memoria_por_processo(workers if paralelo else 1),
+        prefiltrar=PREFILTRO_BYTES
+    )
+
+    if paralelo:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            resultados = list(executor.map(processar, arquivos))
+    else:
+        resultados = (processar(caminho) for caminho in arquivos)
+
+    return concluir_fundido(resultados)
+
+
+def concluir_fundido(resultados):
+    """
+    Relatório por arquivo (na ordem de 'resultados'), relatório de
+    normalização, índice de contas e consolidado final a partir dos
+    resultados de processar_arquivo_fundido().
+    """
+    consolidados_por_arquivo = []
+    metadados = []
+    processados = []
+
+    for res in resultados:
+        processados.append(res)
+        print(f"→ Processando: {res['nome']}")
+        somar_metricas_arquivo(res, com_saida=False)
+
+        if res["erro"]:
+            print(f"  ❌ Erro ao processar: {res['erro']}")
             continue
 
-        if not acumulado:
+        if res["linhas"] == 0:
+            print("  ✗ Nenhuma despesa encontrada")
+            continue
+
+        print(f"  ✓ {res['linhas']} linhas de despesa")
+        if res["malformados"]:
+            print(f"  ⚠️ {res['malformados']} valor(es) malformado(s) (ignorados)")
+        if res["aviso_memoria"]:
+            print(f"  ⚠️ {res['aviso_memoria']}")
+        if res["normalizado"]:
+            metadados.append({
+                "arquivo_original": res["nome"],
+                "arquivo_normalizado": os.path.basename(res["normalizado"]),
+                "linhas": res["linhas"],
+                "colunas": res["colunas"],
+                "tamanho_mb": round(tamanho_bytes(res["normalizado"]) / (1024 * 1024), 2)
+            })
+
+        if res["resumo"] is None:
             print("  ⚠️ Nenhum valor válido encontrado.")
             continue
 
-        df_resumo = pd.DataFrame({
-            "reg_ans": list(acumulado.keys()),
-            "valor_despesas": list(acumulado.values()),
-            "ano": ano,
-            "trimestre": trimestre
-        })
+        consolidados_por_arquivo.append(res["resumo"])
+
+    if metadados:
+        gravar_relatorio_normalizacao(metadados, "dados_normalizados")
+    gravar_indice_contas(processados)
+
+    return gravar_consolidado(consolidados_por_arquivo)
+
+
+# MODO EM FLUXO: DOWNLOAD -> FILTRO/SOMA SOBREPOSTOS
+async def _baixar_para_fila(links, pasta, fila, downloads):
+    """Baixa os links (threads, até MAX_DOWNLOADS_SIMULTANEOS) e enfileira cada ZIP pronto."""
+    limite = asyncio.Semaphore(max(1, MAX_DOWNLOADS_SIMULTANEOS))
+
+    async def baixar(url):
+        async with limite:
+            res = await asyncio.to_thread(baixar_arquivo, url, pasta, CHECKSUMS_SHA256.get(url))
+        print(descrever_resultado(res))
+        downloads.append(res)
+        if res["status"] != "erro":
+            # fila cheia = processamento atrasado: o próximo download espera aqui
+            await fila.put(res["arquivo"])
+
+    await asyncio.gather(*(baixar(url) for url in links))
+
+
+async def _processar_da_fila(fila, executor, processar, resultados):
+    """Consome ZIPs da fila e processa cada arquivo de dados num processo do executor."""
+    loop = asyncio.get_running_loop()
+    while True:
+        caminho_zip = await fila.get()
+        if caminho_zip is None:
+            return
+        for fonte in fontes_do_zip(caminho_zip):
+            res = await loop.run_in_executor(executor, processar, fonte)
+            print(f"  ⚙️ {res['nome']} processado ({res['linhas']} linhas de despesa)")
+            resultados[fonte] = res
+
+
+async def _executar_em_fluxo(links, pasta, workers, processar):
+    fila = asyncio.Queue(maxsize=max(1, FILA_EM_FLUXO))
+    downloads, resultados = [], {}
+
+    async def produzir():
+        await _baixar_para_fila(links, pasta, fila, downloads)
+        for _ in range(workers):
+            await fila.put(None)  # fim: um aviso por consumidor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        tarefas = [asyncio.create_task(produzir())] + [
+            asyncio.create_task(_processar_da_fila(fila, executor, processar, resultados))
+            for _ in range(workers)
+        ]
+        try:
+            await asyncio.gather(*tarefas)
+        finally:
+            # se um lado falhar, o outro não fica esperando a fila para sempre
+            for tarefa in tarefas:
+                tarefa.cancel()
 
-        consolidados_por_arquivo.append(df_resumo)
+    return downloads, resultados
 
-    if not consolidados_por_arquivo:
-        print("❌ Nenhum dado válido consolidado.")
-        return False
 
-    df_final = pd.concat(consolidados_por_arquivo, ignore_index=True)
-    df_final["valor_despesas"] = df_final["valor_despesas"].round(2)
-    df_final = df_final.sort_values(by=["ano", "trimestre", "reg_ans"])
+def etapa_em_fluxo(workers=None, gravar_filtrados=None, gravar_normalizados=None):
+    """
+    Substitui as Etapas 1-5 com as etapas sobrepostas: enquanto um
+    trimestre ainda baixa, os já baixados são filtrados/somados em outros
+    processos (mesmo processamento do modo fundido, lendo direto do ZIP).
 
-    df_final.to_csv(arquivo_csv, sep=";", index=False, encoding="utf-8")
+    - downloads em threads, coordenados por asyncio (até MAX_DOWNLOADS_SIMULTANEOS)
+    - ZIPs prontos entram numa fila de no máximo FILA_EM_FLUXO itens
+    - 'workers' processos (padrão: WORKERS_FILTRO, mínimo 1) consomem a fila
 
-    with zipfile.ZipFile(arquivo_zip, "w", zipfile.ZIP_DEFLATED) as zf:
-        zf.write(arquivo_csv, arcname="consolidado_despesas.csv")
+    O relatório por arquivo sai no fim, na ordem dos arquivos (determinístico).
+    """
+    if workers is None:
+        workers = WORKERS_FILTRO
+    if gravar_filtrados is None:
+        gravar_filtrados = GRAVAR_FILTRADOS
+    if gravar_normalizados is None:
+        gravar_normalizados = GRAVAR_NORMALIZADOS
+    workers = max(1, workers)
 
-    print("\n✅ Consolidação incremental concluída!")
-    print(f"📁 CSV gerado: {arquivo_csv}")
-    print(f"🗜️ ZIP gerado: {arquivo_zip}")
-    print(f"📊 Total de registros: {len(df_final)}")
+    print("=" * 70)
+    print("ETAPAS 1-5 (MODO EM FLUXO): BAIXAR → FILTRAR + NORMALIZAR + CONSOLIDAR")
+    print("=" * 70)
+    print()
 
-    return True
+    links = [LINK1, LINK2, LINK3]
+    if not verificar_links(links):
+        return False
+
+    pasta = "dados_ans"
+    os.makedirs(pasta, exist_ok=True)
+    print(f"Baixando {len(links)} arquivo(s) e processando com {workers} processo(s)\n")
+
+    processar = partial(
+        processar_arquivo_fundido,
+        gravar_filtrados=gravar_filtrados,
+        gravar_normalizados=gravar_normalizados,
+        formato=FORMATO_INTERMEDIARIO,
+        memoria_maxima=memoria_por_processo(workers),
+        prefiltrar=PREFILTRO_BYTES
+    )
+
+    downloads, resultados = asyncio.run(_executar_em_fluxo(links, pasta, workers, processar))
+    etapa_atual().somar(bytes_escritos=sum(r["tamanho"] for r in downloads if r["status"] == "baixado"))
+
+    disponiveis = sum(1 for r in downloads if r["status"] != "erro")
+    print(f"\nDownloads: {disponiveis}/{len(links)} arquivo(s) disponível(is)\n")
+    if not resultados:
+        print("✗ Nenhum arquivo encontrado.")
+        return False
+
+    return concluir_fundido([resultados[fonte] for fonte in sorted(resultados)])
 
 
 # PIPELINE PRINCIPAL
 def executar_pipeline():
     """
     Executa todas as etapas do pipeline
+    (métricas de cada etapa em 'metricas/teste1_pipeline_<data>.json')
     """
+    with execucao("teste1_pipeline", log_por_chunk=LOG_METRICAS_POR_CHUNK) as rodada:
+        rodada["concluida"] = bool(_executar_etapas())
+
+
+def _executar_etapas():
     print()
     print("=" * 70)
     print("PIPELINE ANS - DEMONSTRAÇÕES CONTÁBEIS")
     print("=" * 70)
     print()
+
+    if MODO_EM_FLUXO:
+        # Etapas 1-5 sobrepostas (download + processamento ao mesmo tempo)
+        if not medir_chamada("etapa_em_fluxo", etapa_em_fluxo):
+            print("Pipeline interrompido no modo em fluxo (Etapas 1-5)")
+            return
+        return _concluir_pipeline(ler_de_zip=True, fundido=True)
     
     # Etapa 1: Baixar
-    if not etapa1_baixar_arquivos():
+    if not medir_chamada("etapa1_baixar_arquivos", etapa1_baixar_arquivos):
         print("Pipeline interrompido na Etapa 1")
         return
     
-    # Etapa 2: Descompactar
-    if not etapa2_descompactar():
+    # Etapa 2: Descompactar (desnecessária lendo direto dos ZIPs)
+    if LER_DIRETO_DO_ZIP:
+        print("Etapa 2 pulada: os arquivos serão lidos direto dos ZIPs\n")
+    elif not medir_chamada("etapa2_descompactar", etapa2_descompactar):
         print("Pipeline interrompido na Etapa 2")
         return
     
-    # Etapa 3: Filtrar
-    if not etapa3_filtrar():
-        print("Pipeline interrompido na Etapa 3")
-        return
-    
-    # Etapa 4: Normalizar
-    if not etapa4_normalizar():
-        print("Pipeline interrompido na Etapa 4")
-        return
-    
-    # Etapa 5: Consolidar
-    if not etapa5_consolidar():
-        print("Pipeline interrompido na Etapa 5")
-        return
+    if MODO_FUNDIDO:
+        # Etapas 3-5 numa única leitura de cada arquivo
+        if not medir_chamada("etapa_fundida", etapa_fundida):
+            print("Pipeline interrompido no modo fundido (Etapas 3-5)")
+            return
+    else:
+        # Etapa 3: Filtrar
+        if not medir_chamada("etapa3_filtrar", etapa3_filtrar):
+            print("Pipeline interrompido na Etapa 3")
+            return
+        
+        # Etapa 4: Normalizar
+        if not medir_chamada("etapa4_normalizar", etapa4_normalizar):
+            print("Pipeline interrompido na Etapa 4")
+            return
+        
+        # Etapa 5: Consolidar
+        if not medir_chamada("etapa5_consolidar", etapa5_consolidar):
+            print("Pipeline interrompido na Etapa 5")
+            return
     
+    return _concluir_pipeline(LER_DIRETO_DO_ZIP, MODO_FUNDIDO)
+
+
+def _concluir_pipeline(ler_de_zip, fundido):
     # Sucesso!
     print("=" * 70)
     print("PIPELINE CONCLUÍDO COM SUCESSO!")
@@ -687,18 +1825,21 @@ def executar_pipeline():
     print()
     print("Estrutura de pastas:")
     print("  • dados_ans/                  (ZIPs baixados)")
-    print("  • dados_extraidos/            (Arquivos descompactados)")
-    print("  • dados_despesas_sinistros/   (Filtrados)")
-    print("  • dados_normalizados/         (Normalizados)")
+    if not ler_de_zip:
+        print("  • dados_extraidos/            (Arquivos descompactados)")
+    if not fundido or GRAVAR_FILTRADOS:
+        print("  • dados_despesas_sinistros/   (Filtrados)")
+    if not fundido or GRAVAR_NORMALIZADOS:
+        print("  • dados_normalizados/         (Normalizados)")
     print("  • dados_consolidados/         (CSV + ZIP CONSOLIDADO)")
     print()
+    return True
 
 
 # PONTO DE ENTRADA
 if __name__ == "__main__":
     # Verificar dependências
     try:
-        import wget
         import pandas as pd
         import chardet
     except ImportError as e:
@@ -708,10 +1849,32 @@ if __name__ == "__main__":
         print()
         print("Execute:")
         print()
-        print("  pip install wget pandas chardet openpyxl")
+        print("  pip install pandas chardet openpyxl")
         print()
         print("=" * 70)
         exit(1)
     
+    parser = argparse.ArgumentParser(description="Pipeline ANS - demonstrações contábeis (Teste 1)")
+    parser.add_argument(
+        "--max-memory",
+        help="orçamento de memória para os chunks (ex: 512MB, 2GB); "
+             "o tamanho dos chunks se ajusta à largura dos arquivos"
+    )
+    parser.add_argument(
+        "--em-fluxo",
+        action="store_true",
+        help="processa cada ZIP assim que o download termina (sobrepõe download e processamento)"
+    )
+    args = parser.parse_args()
+
+    if args.em_fluxo:
+        MODO_EM_FLUXO = True
+
+    if args.max_memory:
+        try:
+            MEMORIA_MAXIMA = ler_tamanho_memoria(args.max_memory)
+        except ValueError as e:
+            parser.error(str(e))
+
     # Executar pipeline
     executar_pipeline()
\ No newline at end of file
@@ -1,101 +1,294 @@
 import os
+import shutil
+import tempfile
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from cnpj import cnpj_valido
+from faixas_csv import abrir_faixa, dividir_em_faixas, ler_cabecalho
+from formato_intermediario import (
+    ExportadorTabela,
+    colunas_tabela,
+    eh_tabela_binaria,
+    iterar_tabela,
+    ler_parte,
+    ler_tabela,
+    localizar_tabela,
+    partes_tabela,
+    resolver_formato,
+    tamanho_bytes,
+)
+from metricas import etapa_atual, execucao, medir_chamada
+from regras_validacao import Regra, ValidadorRegras, conjunto, intervalo, nao_vazio
 
 
 # CONFIGURAÇÃO
 ARQUIVO_ENTRADA = "dados_consolidados/consolidado_despesas.csv"
 PASTA_SAIDA = "dados_validados"
 
+# Formato das tabelas trocadas com as próximas etapas ("auto", "parquet", "numpy" ou "csv").
+# As saídas são sempre exportadas também em CSV.
+FORMATO_INTERMEDIARIO = "auto"
+
+# Modo em chunks: valida CHUNK_SIZE linhas por vez e vai acrescentando às
+# saídas (memória constante, independente do tamanho do consolidado).
+# Com False, o consolidado é lido inteiro e validado de uma vez.
+VALIDAR_EM_CHUNKS = False
+CHUNK_SIZE = 200000
+
+# Validação em paralelo: com WORKERS_VALIDACAO > 1, o consolidado é dividido
+# em faixas (CSV: faixas de bytes alinhadas em fim de linha; tabela binária:
+# uma parte por tarefa), cada faixa é validada em um processo e as saídas são
+# juntadas na ordem original. Contagens e arquivos iguais aos do modo serial.
+WORKERS_VALIDACAO = 1
+TAMANHO_FAIXA = 64 * 1024 * 1024  # bytes de CSV por tarefa (no mínimo 1 faixa por worker)
+
+# Tipos da leitura do CSV (códigos continuam texto)
+TIPOS_ENTRADA = {"reg_ans": str, "trimestre": str, "cnpj": str}
+
 os.makedirs(PASTA_SAIDA, exist_ok=True)
 
 
-# FUNÇÕES DE VALIDAÇÃO
-def validar_ano(valor):
-    if pd.isna(valor):
-        return False
-    try:
-        ano = int(valor)
-    except (ValueError, TypeError):
-        return False
-    return 2000 <= ano <= 2100
+# REGRAS DE VALIDAÇÃO (ver regras_validacao.py)
+# Cada regra vira uma máscara vetorizada; a ordem define o bit na máscara de
+# falhas e a ordem dos motivos em despesas_invalidas.csv.
+REGRAS = [
+    Regra("ano", "ano", intervalo(2000, 2100, inteiro=True), "ano fora de 2000-2100"),
+    Regra("trimestre", "trimestre", conjunto({"1T", "2T", "3T", "4T"}), "trimestre fora de 1T-4T"),
+    Regra("valor", "valor_despesas", intervalo(minimo=0, inclusivo=False), "valor_despesas ausente ou <= 0"),
+    Regra("reg_ans", "reg_ans", nao_vazio(), "reg_ans vazio"),
+]
 
-def validar_trimestre(valor):
-    if pd.isna(valor):
-        return False
-    t = str(valor).strip().upper()
-    return t in {"1T", "2T", "3T", "4T"}
+# Regras aplicadas só quando a coluna existe na entrada (o consolidado do
+# Teste 1 não tem CNPJ; ele é trazido do cadastro no Teste 2.2)
+REGRAS_OPCIONAIS = [
+    Regra("cnpj", "cnpj", cnpj_valido, "CNPJ inválido (dígitos verificadores)"),
+]
 
-def validar_valor(valor):
-    if pd.isna(valor):
-        return False
-    try:
-        v = float(valor)
-    except (ValueError, TypeError):
-        return False
-    return v > 0
+
+def regras_da_entrada(colunas):
+    colunas = set(colunas)
+    return REGRAS + [r for r in REGRAS_OPCIONAIS if r.coluna in colunas]
 
 
 # PIPELINE DE VALIDAÇÃO
-def validar_dados():
+def iterar_entrada(caminho, em_chunks):
+    """Chunks do consolidado (um só, com a tabela inteira, fora do modo em chunks)."""
+    if not em_chunks:
+        if eh_tabela_binaria(caminho):
+            yield ler_tabela(caminho)
+        else:
+            yield pd.read_csv(caminho, sep=";", dtype=TIPOS_ENTRADA)
+        return
+
+    vazio = True
+    for parte in iterar_tabela(caminho, chunksize=CHUNK_SIZE, dtype=TIPOS_ENTRADA):
+        # partes binárias maiores que CHUNK_SIZE são validadas em fatias
+        for inicio in range(0, len(parte), CHUNK_SIZE):
+            vazio = False
+            yield parte.iloc[inicio:inicio + CHUNK_SIZE]
+
+    if vazio and not eh_tabela_binaria(caminho):
+        # CSV só com cabeçalho: as saídas saem vazias, como no modo inteiro
+        yield pd.read_csv(caminho, sep=";", dtype=TIPOS_ENTRADA, nrows=0)
+
+
+def validar_chunk(df, validador):
+    """
+    Aplica as regras a um chunk.
+    Retorna (df_validos, df_invalidos com regras_falhas/motivos, falhas por regra).
+    """
+    # Máscara de bits por linha: bit i = regra i falhou (0 = registro válido)
+    falhas = validador.avaliar(df)
+    registro_valido = falhas == 0
+
+    # Separação
+    df_validos = df[registro_valido]
+    df_invalidos = df[~registro_valido].copy()
+
+    # Motivos das falhas (uma descrição por combinação de regras)
+    falhas_invalidos = falhas[~registro_valido]
+    df_invalidos["regras_falhas"] = falhas_invalidos
+    df_invalidos["motivos"] = validador.motivos(falhas_invalidos)
+
+    return df_validos, df_invalidos, validador.contar(falhas)
+
+
+def montar_faixas(caminho, workers):
+    """
+    Tarefas da validação em paralelo, em ordem: (inicio, fim) em bytes para
+    CSV, ou o caminho de uma parte para tabela binária.
+    """
+    if eh_tabela_binaria(caminho):
+        return partes_tabela(caminho)
+    quantidade = max(workers, -(-tamanho_bytes(caminho) // TAMANHO_FAIXA))
+    return dividir_em_faixas(caminho, quantidade)
+
+
+def iterar_faixa(caminho, faixa, chunk_size):
+    """Chunks de uma faixa (sempre pelo menos um, ainda que vazio)."""
+    if isinstance(faixa, str):
+        parte = ler_parte(faixa)
+        for inicio in range(0, max(len(parte), 1), chunk_size):
+            yield parte.iloc[inicio:inicio + chunk_size]
+        return
+
+    cabecalho = ler_cabecalho(caminho)
+    vazio = True
+    with abrir_faixa(caminho, *faixa, cabecalho=cabecalho) as f:
+        for chunk in pd.read_csv(f, sep=";", dtype=TIPOS_ENTRADA, chunksize=chunk_size):
+            vazio = False
+            yield chunk
+    if vazio:
+        with abrir_faixa(caminho, *faixa, cabecalho=cabecalho) as f:
+            yield pd.read_csv(f, sep=";", dtype=TIPOS_ENTRADA, nrows=0)
+
+
+def validar_faixa(indice, faixa, caminho, pasta_temporaria, formato, chunk_size):
+    """
+    Valida uma faixa do consolidado e grava as saídas em
+    '<pasta_temporaria>/faixa-NNNNN/', para o processo principal juntar.
+
+    Não imprime nada: pode rodar em outro processo (ProcessPoolExecutor).
+    As regras vêm de regras_da_entrada() (os testes são closures, não vão por pickle).
+    """
+    regras = regras_da_entrada(c.lower() for c in colunas_tabela(caminho))
+    validador = ValidadorRegras(regras)
+    pasta = os.path.join(pasta_temporaria, f"faixa-{indice:05d}")
+    os.makedirs(pasta)
+    resultado = {
+        "validas": os.path.join(pasta, "despesas_validadas"),
+        "invalidas": os.path.join(pasta, "despesas_invalidas"),
+        "linhas": 0,
+        "linhas_validas": 0,
+        "linhas_invalidas": 0,
+        "chunks": 0,
+        "falhas": dict.fromkeys((r.nome for r in regras), 0),
+    }
+
+    with ExportadorTabela(resultado["validas"], formato) as validas, \
+            ExportadorTabela(resultado["invalidas"], "csv") as invalidas:
+        for df in iterar_faixa(caminho, faixa, chunk_size):
+            df.columns = df.columns.str.lower()
+            df_validos, df_invalidos, contagem = validar_chunk(df, validador)
+            validas.escrever(df_validos)
+            invalidas.escrever(df_invalidos)
+
+            for regra, quantidade in contagem.items():
+                resultado["falhas"][regra] += quantidade
+            resultado["linhas"] += len(df)
+            resultado["linhas_validas"] += len(df_validos)
+            resultado["linhas_invalidas"] += len(df_invalidos)
+            resultado["chunks"] += 1
+
+    return resultado
+
+
+def validar_dados(em_chunks=None, workers=None):
+    """
+    Valida o consolidado e separa registros válidos e inválidos.
+
+    - padrão: lê tudo e valida de uma vez
+    - em_chunks (padrão: VALIDAR_EM_CHUNKS): CHUNK_SIZE linhas por vez
+    - workers > 1 (padrão: WORKERS_VALIDACAO): faixas em vários processos
+      (cada uma validada em chunks), juntadas na ordem original
+    """
+    if em_chunks is None:
+        em_chunks = VALIDAR_EM_CHUNKS
+    if workers is None:
+        workers = WORKERS_VALIDACAO
+
     print("\nTESTE 2.1 — VALIDAÇÃO DE DADOS")
     print("=" * 50)
 
-    if not os.path.exists(ARQUIVO_ENTRADA):
+    # usa a tabela do Teste 1 no formato configurado (ou a que existir)
+    caminho_entrada = localizar_tabela(os.path.splitext(ARQUIVO_ENTRADA)[0], FORMATO_INTERMEDIARIO)
+    if caminho_entrada is None:
         print("❌ Arquivo consolidado não encontrado.")
         return False
 
-    df = pd.read_csv(
-        ARQUIVO_ENTRADA,
-        sep=";",
-        dtype={"reg_ans": str, "trimestre": str},
-    )
+    # Normalização básica (nomes em minúsculas) + checagem da estrutura
+    colunas = [c.lower() for c in colunas_tabela(caminho_entrada)]
+    regras = regras_da_entrada(colunas)
+    validador = ValidadorRegras(regras)
+    faltantes = validador.colunas_faltantes(colunas)
+    if faltantes:
+        print("❌ Estrutura inesperada.")
+        print("Colunas ausentes:", faltantes)
+        return False
+
+    faixas = montar_faixas(caminho_entrada, workers) if workers > 1 else []
+    paralelo = len(faixas) > 1
+
+    total = {"linhas": 0, "linhas_validas": 0, "linhas_invalidas": 0, "chunks": 0}
+    falhas_por_regra = dict.fromkeys((r.nome for r in regras), 0)
+
+    def somar(resultado):
+        for chave in total:
+            total[chave] += resultado[chave]
+        for regra, quantidade in resultado["falhas"].items():
+            falhas_por_regra[regra] += quantidade
 
-    # Normalização básica
-    df.columns = df.columns.str.lower()
-
-    # Flags de validação
-    df["ano_valido"] = df["ano"].apply(validar_ano)
-    df["trimestre_valido"] = df["trimestre"].apply(validar_trimestre)
-    df["valor_valido"] = df["valor_despesas"].apply(validar_valor)
-    df["reg_ans_valido"] = df["reg_ans"].astype(str).str.strip().ne("") & df["reg_ans"].notna()
-
-    # Registro válido se TODAS as regras passarem
-    df["registro_valido"] = (
-        df["ano_valido"] &
-        df["trimestre_valido"] &
-        df["valor_valido"] &
-        df["reg_ans_valido"]
+    # as saídas dos workers ficam numa pasta temporária até serem juntadas
+    pasta_temporaria = tempfile.mkdtemp(prefix="_faixas-", dir=PASTA_SAIDA) if paralelo else None
+    try:
+        with ExportadorTabela(os.path.join(PASTA_SAIDA, "despesas_validadas"), FORMATO_INTERMEDIARIO) as validas, \
+                ExportadorTabela(os.path.join(PASTA_SAIDA, "despesas_invalidas"), "csv") as invalidas:
+            if paralelo:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    # map devolve na ordem das faixas -> saídas na ordem original
+                    for resultado in executor.map(
+                        validar_faixa, range(len(faixas)), faixas, repeat(caminho_entrada),
+                        repeat(pasta_temporaria), repeat(resolver_formato(FORMATO_INTERMEDIARIO)),
+                        repeat(CHUNK_SIZE)
+                    ):
+                        validas.anexar(resultado["validas"], resultado["linhas_validas"])
+                        invalidas.anexar(resultado["invalidas"], resultado["linhas_invalidas"])
+                        somar(resultado)
+            else:
+                for df in iterar_entrada(caminho_entrada, em_chunks):
+                    df.columns = df.columns.str.lower()
+                    df_validos, df_invalidos, contagem = validar_chunk(df, validador)
+
+                    # Salvar resultados (acrescenta ao que os chunks anteriores gravaram)
+                    validas.escrever(df_validos)
+                    invalidas.escrever(df_invalidos)
+                    somar({
+                        "linhas": len(df),
+                        "linhas_validas": len(df_validos),
+                        "linhas_invalidas": len(df_invalidos),
+                        "chunks": 1,
+                        "falhas": contagem,
+                    })
+    finally:
+        if pasta_temporaria:
+            shutil.rmtree(pasta_temporaria, ignore_errors=True)
+
+    saidas = validas.caminhos + invalidas.caminhos
+
+    etapa_atual().somar(
+        linhas_entrada=total["linhas"],
+        linhas_saida=total["linhas_validas"],
+        chunks=total["chunks"],
+        bytes_lidos=tamanho_bytes(caminho_entrada),
+        bytes_escritos=sum(tamanho_bytes(c) for c in saidas)
     )
 
-    # Separação
-    df_validos = df[df["registro_valido"]].copy()
-    df_invalidos = df[~df["registro_valido"]].copy()
-
-    # Remover colunas técnicas
-    colunas_remover = [
-        "ano_valido",
-        "trimestre_valido",
-        "valor_valido",
-        "reg_ans_valido",
-        "registro_valido"
-    ]
-
-    df_validos.drop(columns=colunas_remover, inplace=True)
-    df_invalidos.drop(columns=colunas_remover, inplace=True)
-
-    # Salvar resultados
-    caminho_validos = os.path.join(PASTA_SAIDA, "despesas_validadas.csv")
-    caminho_invalidos = os.path.join(PASTA_SAIDA, "despesas_invalidas.csv")
-
-    df_validos.to_csv(caminho_validos, sep=";", index=False, encoding="utf-8")
-    df_invalidos.to_csv(caminho_invalidos, sep=";", index=False, encoding="utf-8")
-
-    print(f"✅ Registros válidos: {len(df_validos)}")
-    print(f"⚠️ Registros inválidos: {len(df_invalidos)}")
+    print(f"✅ Registros válidos: {total['linhas_validas']}")
+    print(f"⚠️ Registros inválidos: {total['linhas_invalidas']}")
+    for regra, quantidade in falhas_por_regra.items():
+        if quantidade:
+            print(f"   - {regra}: {quantidade}")
+    if paralelo:
+        print(f"⚙️ Validado em {len(faixas)} faixa(s), {workers} processo(s)")
+    elif em_chunks:
+        print(f"🧩 Validado em {total['chunks']} chunk(s) de até {CHUNK_SIZE} linhas")
     print(f"📁 Saída: {PASTA_SAIDA}/")
 
     return True
 
 
 if __name__ == "__main__":
-    validar_dados()
+    with execucao("teste2_1_validacao"):
+        medir_chamada("validar_dados", validar_dados)
@@ -1,6 +1,10 @@
 import os
 import pandas as pd
-import wget
+
+from cnpj import cnpj_valido, normalizar_cnpj, somente_digitos
+from downloads import baixar_arquivo
+from formato_intermediario import eh_tabela_binaria, exportar_tabela, ler_tabela, localizar_tabela, tamanho_bytes
+from metricas import etapa_atual, execucao, medir_chamada
 
 
 # CONFIGURAÇÃO
@@ -15,6 +19,10 @@ CAD_LOCAL = os.path.join(PASTA_SAIDA, "Relatorio_cadop.csv")
 
 ARQUIVO_SAIDA = os.path.join(PASTA_SAIDA, "consolidado_enriquecido.csv")
 
+# Formato das tabelas trocadas com as próximas etapas ("auto", "parquet", "numpy" ou "csv").
+# A saída é sempre exportada também em CSV.
+FORMATO_INTERMEDIARIO = "auto"
+
 
 # HELPERS
 def normalizar_nome_coluna(s: str) -> str:
@@ -33,29 +41,63 @@ def normalizar_nome_coluna(s: str) -> str:
     return s
 
 
-def somente_digitos(x) -> str:
-    if pd.isna(x):
-        return ""
-    return "".join(ch for ch in str(x) if ch.isdigit())
+def resolver_duplicados(df: pd.DataFrame, chave: str, campos: dict) -> pd.DataFrame:
+    # Uma linha por valor de 'chave', com cada campo resolvido em colunas (sem apply por grupo):
+    # - valor: o mais frequente não-vazio; se empatar, o primeiro ordenado (None se não houver)
+    # - status_cadastro: CADASTRO_DUPLICADO se algum campo tem mais de um valor distinto (após strip)
+    partes = []
+    for nome, col in campos.items():
+        valores = df[col].dropna().astype(str)
+        valores = valores[valores.str.strip() != ""]
+        partes.append(pd.DataFrame({
+            "chave": df.loc[valores.index, chave].to_numpy(dtype=object),
+            "campo": nome,
+            "valor": valores.to_numpy(dtype=object),
+        }))
+    longo = pd.concat(partes, ignore_index=True)
+
+    # moda dos quatro campos de uma vez: contagem por (chave, campo, valor),
+    # maior contagem primeiro e, no empate, o menor valor
+    contagens = longo.value_counts(["chave", "campo", "valor"]).reset_index(name="n")
+    modas = (
+        contagens
+        .sort_values(["chave", "campo", "n", "valor"], ascending=[True, True, False, True], kind="stable")
+        .drop_duplicates(["chave", "campo"])
+        .pivot(index="chave", columns="campo", values="valor")
+    )
 
+    duplicado = (
+        longo.assign(valor=longo["valor"].str.strip())
+        .groupby(["chave", "campo"])["valor"].nunique()
+        .gt(1)
+        .groupby(level="chave").any()
+    )
 
-def escolher_modo_ou_primeiro(serie: pd.Series):
-    # Retorna o valor mais frequente não-nulo; se empatar, retorna o primeiro ordenado.
-    vals = [v for v in serie.dropna().astype(str).tolist() if v.strip() != ""]
-    if not vals:
-        return None
-    vc = pd.Series(vals).value_counts()
-    top = vc[vc == vc.max()].index.tolist()
-    return sorted(top)[0]
+    chaves = pd.Index(df[chave].unique(), dtype=object).sort_values()
+    out = modas.reindex(index=chaves, columns=list(campos)).astype(object)
+    out = out.where(out.notna(), None)
+    out["cnpj"] = chaves.astype(str)
+    out["status_cadastro"] = (
+        duplicado.reindex(chaves, fill_value=False)
+        .map({True: "CADASTRO_DUPLICADO", False: "OK"})
+    )
+    return out.reset_index(drop=True).rename_axis(columns=None)
 
 
 def baixar_cadastro_se_precisar():
-    if os.path.exists(CAD_LOCAL) and os.path.getsize(CAD_LOCAL) > 0:
-        print("✓ Cadastro já existe localmente.")
-        return
-    print(f"Baixando cadastro ANS...\nURL: {CAD_URL}")
-    wget.download(CAD_URL, out=CAD_LOCAL)
-    print("\n✓ Download OK")
+    # Requisição condicional (ETag / Last-Modified): só baixa se o cadastro mudou.
+    # Sem conexão, segue com a cópia local (se existir).
+    print(f"Verificando cadastro ANS...\nURL: {CAD_URL}")
+    res = baixar_arquivo(CAD_URL, PASTA_SAIDA)
+
+    if res["status"] == "baixado":
+        print("✓ Download OK (cadastro novo ou atualizado)")
+    elif res["status"] in ("nao_modificado", "existente"):
+        print("✓ Cadastro local já está atualizado.")
+    elif os.path.exists(CAD_LOCAL) and os.path.getsize(CAD_LOCAL) > 0:
+        print(f"⚠️ Não foi possível atualizar o cadastro ({res['erro']}). Usando cópia local.")
+    else:
+        raise RuntimeError(f"Não consegui baixar o cadastro: {res['erro']}")
 
 
 def achar_coluna(df: pd.DataFrame, termos):
@@ -98,13 +140,18 @@ def executar_enriquecimento():
     print("\nTESTE 2.2 — ENRIQUECIMENTO COM CADASTRO ANS")
     print("=" * 65)
 
-    # 1) Ler entrada (consolidado validado)
-    if not os.path.exists(ARQUIVO_ENTRADA):
+    # 1) Ler entrada (consolidado validado; no formato configurado, se existir)
+    caminho_entrada = localizar_tabela(os.path.splitext(ARQUIVO_ENTRADA)[0], FORMATO_INTERMEDIARIO)
+    if caminho_entrada is None:
         print(f"❌ Arquivo de entrada não encontrado: {ARQUIVO_ENTRADA}")
         print("Dica: rode o Teste 2.1 antes, ou aponte para o consolidado.")
         return False
 
-    df_cons = pd.read_csv(ARQUIVO_ENTRADA, sep=";", encoding="utf-8")
+    if eh_tabela_binaria(caminho_entrada):
+        df_cons = ler_tabela(caminho_entrada)
+    else:
+        df_cons = pd.read_csv(caminho_entrada, sep=";", encoding="utf-8")
+    linhas_lidas = len(df_cons)
     df_cons.columns = [normalizar_nome_coluna(c) for c in df_cons.columns]
 
     required = {"reg_ans", "ano", "trimestre", "valor_despesas"}
@@ -149,50 +196,31 @@ def executar_enriquecimento():
     df_cad[col_reg] = df_cad[col_reg].astype(str).str.strip()
     df_cad[col_cnpj] = df_cad[col_cnpj].astype(str).str.strip()
 
-    df_cad["cnpj_norm"] = df_cad[col_cnpj].apply(somente_digitos)
+    # CNPJ só com dígitos, 14 posições (zeros à esquerda), vetorizado (ver cnpj.py)
+    df_cad["cnpj_norm"] = normalizar_cnpj(df_cad[col_cnpj])
     df_cad_base = df_cad[df_cad["cnpj_norm"] != ""].copy()
 
-    # 5) Resolver duplicidade no cadastro por CNPJ (CORRIGIDO)
-    # Usa grp.name como chave do grupo (sempre existe)
+    # dígitos verificadores: CNPJ inválido não é tratado como match OK
+    invalidos = ~cnpj_valido(df_cad_base["cnpj_norm"])
+    cnpjs_invalidos = set(df_cad_base.loc[invalidos, "cnpj_norm"])
+    if cnpjs_invalidos:
+        print(f"⚠️ {len(cnpjs_invalidos)} CNPJ(s) com dígito verificador inválido no cadastro")
+
+    # 5) Resolver duplicidade no cadastro por CNPJ (vetorizado, ver resolver_duplicados)
     campos = {
         "registro_ans": col_reg,
         "modalidade": col_mod,
         "uf": col_uf,
         "razao_social": col_razao,
     }
+    df_cad_agg = resolver_duplicados(df_cad_base, "cnpj_norm", campos)
 
-    def agregador(grp: pd.DataFrame) -> pd.Series:
-        out = {}
-        status_dup = False
-
-        # ✅ chave do grupo (cnpj_norm)
-        cnpj_val = str(grp.name)
+    def norm_registro_ans(serie):
+        # só dígitos, sem zeros à esquerda
+        return pd.Series(somente_digitos(serie), index=serie.index).str.lstrip("0")
 
-        for out_name, col in campos.items():
-            uniques = grp[col].dropna().astype(str).str.strip()
-            uniques = uniques[uniques != ""].unique().tolist()
-            if len(uniques) > 1:
-                status_dup = True
-
-            out[out_name] = escolher_modo_ou_primeiro(grp[col])
-
-        out["cnpj"] = cnpj_val
-        out["status_cadastro"] = "CADASTRO_DUPLICADO" if status_dup else "OK"
-        return pd.Series(out)
-
-    df_cad_agg = (
-        df_cad_base
-        .groupby("cnpj_norm")          # ✅ importante para grp.name
-        .apply(agregador)
-        .reset_index(drop=True)
-    )
-
-    def norm_registro_ans(x):
-        s = somente_digitos(x)
-        return s.lstrip("0")  # remove zeros à esquerda
-
-    df_cons["reg_ans"] = df_cons["reg_ans"].apply(norm_registro_ans)
-    df_cad_base[col_reg] = df_cad_base[col_reg].apply(norm_registro_ans)
+    df_cons["reg_ans"] = norm_registro_ans(df_cons["reg_ans"])
+    df_cad_base[col_reg] = norm_registro_ans(df_cad_base[col_reg])
 
 
     # 6) Trazer CNPJ para o consolidado via RegistroANS (reg_ans)
@@ -217,6 +245,7 @@ def executar_enriquecimento():
     df_enriq["status_match"] = "OK"
     df_enriq.loc[df_enriq["cnpj"].eq(""), "status_match"] = "SEM_CNPJ_NO_CONSOLIDADO"
     df_enriq.loc[df_enriq["cnpj"].ne("") & df_enriq["registro_ans"].isna(), "status_match"] = "SEM_MATCH_NO_CADASTRO"
+    df_enriq.loc[df_enriq["cnpj"].isin(cnpjs_invalidos), "status_match"] = "CNPJ_INVALIDO"
 
     # 9) Salvar saída enriquecida
     colunas_saida = [
@@ -232,7 +261,15 @@ def executar_enriquecimento():
         "status_cadastro",
     ]
 
-    df_enriq[colunas_saida].to_csv(ARQUIVO_SAIDA, sep=";", index=False, encoding="utf-8")
+    saidas = exportar_tabela(df_enriq[colunas_saida], os.path.splitext(ARQUIVO_SAIDA)[0], FORMATO_INTERMEDIARIO)
+
+    etapa_atual().somar(
+        linhas_entrada=linhas_lidas,
+        linhas_saida=len(df_enriq),
+        chunks=1,
+        bytes_lidos=tamanho_bytes(caminho_entrada) + tamanho_bytes(CAD_LOCAL),
+        bytes_escritos=sum(tamanho_bytes(c) for c in saidas if c)
+    )
 
     print("\n✅ Enriquecimento concluído!")
     print(f"📄 Saída: {ARQUIVO_SAIDA}")
@@ -247,4 +284,5 @@ def executar_enriquecimento():
 
 
 if __name__ == "__main__":
-    executar_enriquecimento()
+    with execucao("teste2_2_enriquecimento"):
+        medir_chamada("executar_enriquecimento", executar_enriquecimento)
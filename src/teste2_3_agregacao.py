@@ -1,6 +1,9 @@
 import os
 import pandas as pd
-import zipfile
+
+from formato_intermediario import eh_tabela_binaria, gravar_csv_zip, ler_tabela, localizar_tabela, tamanho_bytes
+from metricas import etapa_atual, execucao, medir_chamada
+from numeros_br import converter_valores
 
 
 # CONFIGURAÇÃO
@@ -11,19 +14,29 @@ os.makedirs(PASTA_SAIDA, exist_ok=True)
 ARQUIVO_SAIDA = os.path.join(PASTA_SAIDA, "despesas_agregadas.csv")
 ARQUIVO_ZIP = os.path.join(PASTA_SAIDA, "Teste_Roberta_Moreira.zip")
 
+# O CSV é gravado direto dentro do ZIP; a cópia simples ao lado é opcional
+NIVEL_COMPRESSAO_ZIP = 6   # 1 (mais rápido) a 9 (menor arquivo)
+GRAVAR_CSV_SIMPLES = True
+
 
 # PIPELINE DE AGREGAÇÃO
 def executar_agregacao():
     print("\nTESTE 2.3 — AGREGAÇÃO DE DESPESAS")
     print("=" * 60)
 
-    if not os.path.exists(ARQUIVO_ENTRADA):
+    # tabela do Teste 2.2 (binária no formato "auto", senão o CSV)
+    caminho_entrada = localizar_tabela(os.path.splitext(ARQUIVO_ENTRADA)[0])
+    if caminho_entrada is None:
         print("❌ Arquivo enriquecido não encontrado.")
         return False
 
 
     # 1) Leitura
-    df = pd.read_csv(ARQUIVO_ENTRADA, sep=";", encoding="utf-8")
+    if eh_tabela_binaria(caminho_entrada):
+        df = ler_tabela(caminho_entrada)
+    else:
+        df = pd.read_csv(caminho_entrada, sep=";", encoding="utf-8")
+    linhas_lidas = len(df)
 
     # Normalização defensiva
     df.columns = df.columns.str.lower()
@@ -41,13 +54,11 @@ def executar_agregacao():
         print("Colunas encontradas:", list(df.columns))
         return False
 
-    # Garantir tipos corretos
-    df["valor_despesas"] = (
-        df["valor_despesas"].astype(str)
-        .str.replace(".", "", regex=False)
-        .str.replace(",", ".", regex=False)
-    )
-    df["valor_despesas"] = pd.to_numeric(df["valor_despesas"], errors="coerce")
+    # Garantir tipos corretos: a leitura já entrega float (a entrada usa
+    # ponto decimal, gravada pelo Teste 2.2); texto só em caso de valor malformado
+    df["valor_despesas"], malformados = converter_valores(df["valor_despesas"], decimal=".")
+    if malformados:
+        print(f"⚠️ {malformados} valor(es) malformado(s) em valor_despesas (ignorados)")
     df = df.dropna(subset=["valor_despesas"])
 
     # manter só registros com match OK no cadastro
@@ -91,20 +102,29 @@ def executar_agregacao():
     )
 
 
-    # 4) SALVAR RESULTADO
-    agrupado.to_csv(
-        ARQUIVO_SAIDA,
-        sep=";",
-        index=False,
-        encoding="utf-8"
+    # 4) SALVAR RESULTADO (CSV compactado direto no ZIP, sem reler do disco)
+    if not GRAVAR_CSV_SIMPLES and os.path.exists(ARQUIVO_SAIDA):
+        os.remove(ARQUIVO_SAIDA)  # cópia antiga ficaria desatualizada
+
+    gravados = gravar_csv_zip(
+        agrupado,
+        ARQUIVO_ZIP,
+        "despesas_agregadas.csv",
+        caminho_csv=ARQUIVO_SAIDA if GRAVAR_CSV_SIMPLES else None,
+        nivel_compressao=NIVEL_COMPRESSAO_ZIP,
     )
 
-    # Compactar
-    with zipfile.ZipFile(ARQUIVO_ZIP, "w", zipfile.ZIP_DEFLATED) as zf:
-        zf.write(ARQUIVO_SAIDA, arcname="despesas_agregadas.csv")
+    etapa_atual().somar(
+        linhas_entrada=linhas_lidas,
+        linhas_saida=len(agrupado),
+        chunks=1,
+        bytes_lidos=tamanho_bytes(caminho_entrada),
+        bytes_escritos=sum(tamanho_bytes(c) for c in gravados)
+    )
 
     print("✅ Agregação concluída com sucesso!")
-    print(f"📄 CSV: {ARQUIVO_SAIDA}")
+    if GRAVAR_CSV_SIMPLES:
+        print(f"📄 CSV: {ARQUIVO_SAIDA}")
     print(f"📦 ZIP: {ARQUIVO_ZIP}")
     print(f"📊 Operadoras/UF distintas: {len(agrupado)}")
 
@@ -112,4 +132,5 @@ def executar_agregacao():
 
 
 if __name__ == "__main__":
-    executar_agregacao()
+    with execucao("teste2_3_agregacao"):
+        medir_chamada("executar_agregacao", executar_agregacao)
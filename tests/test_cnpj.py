@@ -0,0 +1,103 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cnpj import cnpj_valido, normalizar_cnpj, somente_digitos
+
+
+def digitos_referencia(valor):
+    if valor is None or (isinstance(valor, float) and np.isnan(valor)):
+        return ""
+    return "".join(c for c in str(valor) if c in "0123456789")
+
+
+def normalizar_referencia(valor):
+    digitos = digitos_referencia(valor)
+    if not digitos or len(digitos) > 14:
+        return digitos
+    return digitos.zfill(14)
+
+
+def dv(digitos, pesos):
+    resto = sum(int(d) * p for d, p in zip(digitos, pesos)) % 11
+    return "0" if resto < 2 else str(11 - resto)
+
+
+def valido_referencia(valor):
+    digitos = digitos_referencia(valor)
+    if not digitos or len(digitos) > 14:
+        return False
+    digitos = digitos.zfill(14)
+    if len(set(digitos)) == 1:
+        return False
+    dv1 = dv(digitos[:12], [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+    dv2 = dv(digitos[:12] + dv1, [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+    return digitos[12:] == dv1 + dv2
+
+
+def cnpj_com_dv(rng):
+    base = "".join(rng.choice("0123456789") for _ in range(12))
+    dv1 = dv(base, [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+    return base + dv1 + dv(base + dv1, [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+
+def valor_aleatorio(rng):
+    cnpj = cnpj_com_dv(rng)
+    escolha = rng.randrange(10)
+    if escolha == 0:
+        return f"{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:8]}/{cnpj[8:12]}-{cnpj[12:]}"
+    if escolha == 1:
+        return cnpj.lstrip("0") or "0"              # sem zeros à esquerda
+    if escolha == 2:
+        return cnpj[:13] + str((int(cnpj[13]) + 1) % 10)  # DV errado
+    if escolha == 3:
+        return cnpj + rng.choice("0123456789")      # mais de 14 dígitos
+    if escolha == 4:
+        return rng.choice(["", "  ", "N/A", None, "-./"])
+    if escolha == 5:
+        return rng.choice("0123456789") * 14        # sequência repetida
+    if escolha == 6:
+        return f" {cnpj} "
+    if escolha == 7:
+        return "ção" + cnpj[:7] + "x" + cnpj[7:]
+    return cnpj
+
+
+def test_igual_a_referencia_python():
+    rng = random.Random(24)
+    valores = [valor_aleatorio(rng) for _ in range(20000)]
+
+    assert list(normalizar_cnpj(valores)) == [normalizar_referencia(v) for v in valores]
+    assert list(cnpj_valido(valores)) == [valido_referencia(v) for v in valores]
+    assert list(somente_digitos(valores)) == [digitos_referencia(v) for v in valores]
+
+
+def test_exemplos():
+    assert list(normalizar_cnpj(["11.222.333/0001-81", "1222333000181", None])) == [
+        "11222333000181", "01222333000181", ""
+    ]
+    assert list(cnpj_valido(["11.222.333/0001-81", "11.222.333/0001-80", "00000000000000"])) == [
+        True, False, False
+    ]
+
+
+@pytest.mark.parametrize("valores", [
+    pd.Series([11222333000181, 1222333000181]),
+    pd.Series([11222333000181.0, np.nan]),
+    pd.Series([11222333000181, None], dtype="Int64"),
+])
+def test_colunas_numericas(valores):
+    esperado = ["11222333000181", "01222333000181" if valores.notna().all() else ""]
+    assert list(normalizar_cnpj(valores)) == esperado
+
+
+def test_vazio_e_layout_longo():
+    assert len(normalizar_cnpj([])) == 0
+    assert len(cnpj_valido(pd.Series([], dtype=object))) == 0
+
+    # textos com mais de 64 caracteres usam o agrupamento por bytes do layout
+    longo = "x" * 70 + "11.222.333/0001-81"
+    assert list(normalizar_cnpj([longo, "11222333000181"])) == ["11222333000181"] * 2
+    assert list(cnpj_valido([longo])) == [True]
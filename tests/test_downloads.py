@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import downloads
+
+
+CONTEUDO = bytes(range(256)) * 4000  # ~1 MB
+
+
+class ServidorTeste:
+    """Servidor HTTP local com ETag, Range/If-Range e 304 (o que o http.server não tem)."""
+
+    def __init__(self):
+        self.recursos = {}
+        self.requisicoes = []  # (método, caminho, cabeçalhos)
+        self.cortes = []       # GETs seguintes mandam só esses bytes do corpo
+        self.corrompidos = 0   # GETs seguintes mandam o corpo com um byte trocado
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self._responder(corpo=False)
+
+            def do_GET(self):
+                self._responder(corpo=True)
+
+            def _responder(self, corpo):
+                servidor.requisicoes.append((self.command, self.path, dict(self.headers)))
+                recurso = servidor.recursos.get(self.path)
+                if recurso is None:
+                    self.send_error(404)
+                    return
+
+                conteudo, etag = recurso["conteudo"], recurso["etag"]
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+
+                inicio = 0
+                intervalo = self.headers.get("Range")
+                if_range = self.headers.get("If-Range")
+                if intervalo and (if_range is None or if_range == etag):
+                    inicio = int(intervalo.split("=")[1].rstrip("-"))
+                    if inicio >= len(conteudo):
+                        self.send_error(416)
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {inicio}-{len(conteudo) - 1}/{len(conteudo)}")
+                else:
+                    self.send_response(200)
+
+                dados = conteudo[inicio:]
+                self.send_header("Content-Length", str(len(dados)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                if not corpo:
+                    return
+
+                if servidor.corrompidos:
+                    servidor.corrompidos -= 1
+                    dados = bytes([dados[0] ^ 0xFF]) + dados[1:]
+                if servidor.cortes:
+                    dados = dados[:servidor.cortes.pop(0)]
+                self.wfile.write(dados)
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.http.serve_forever, daemon=True)
+
+    def url(self, caminho):
+        return f"http://127.0.0.1:{self.http.server_address[1]}{caminho}"
+
+    def publicar(self, caminho, conteudo, etag):
+        self.recursos[caminho] = {"conteudo": conteudo, "etag": etag}
+        return self.url(caminho)
+
+    def gets(self):
+        return [r for r in self.requisicoes if r[0] == "GET"]
+
+
+@pytest.fixture
+def servidor():
+    s = ServidorTeste()
+    s.thread.start()
+    yield s
+    s.http.shutdown()
+    s.http.server_close()
+
+
+def ler(caminho):
+    with open(caminho, "rb") as f:
+        return f.read()
+
+
+def test_download_completo_e_cache(servidor, tmp_path):
+    url = servidor.publicar("/2025/1T2025.zip", CONTEUDO, '"v1"')
+
+    res = downloads.baixar_arquivo(url, str(tmp_path))
+
+    assert res["status"] == "baixado"
+    assert ler(tmp_path / "1T2025.zip") == CONTEUDO
+    assert not (tmp_path / "1T2025.zip.part").exists()
+    cache = json.loads((tmp_path / downloads.ARQUIVO_CACHE).read_text(encoding="utf-8"))
+    assert cache[url] == {"etag": '"v1"', "last_modified": None, "tamanho": len(CONTEUDO)}
+
+
+def test_304_reaproveita_copia_local(servidor, tmp_path):
+    url = servidor.publicar("/1T2025.zip", CONTEUDO, '"v1"')
+    downloads.baixar_arquivo(url, str(tmp_path))
+    servidor.requisicoes.clear()
+
+    res = downloads.baixar_arquivo(url, str(tmp_path))
+
+    assert res["status"] == "nao_modificado"
+    assert res["tamanho"] == len(CONTEUDO)
+    (get,) = servidor.gets()
+    assert get[2]["If-None-Match"] == '"v1"'
+
+
+def test_arquivo_mudou_no_servidor_baixa_de_novo(servidor, tmp_path):
+    url = servidor.publicar("/1T2025.zip", CONTEUDO, '"v1"')
+    downloads.baixar_arquivo(url, str(tmp_path))
+    servidor.publicar("/1T2025.zip", CONTEUDO[::-1], '"v2"')
+
+    res = downloads.baixar_arquivo(url, str(tmp_path))
+
+    assert res["status"] == "baixado"
+    assert ler(tmp_path / "1T2025.zip") == CONTEUDO[::-1]
+
+
+def test_retoma_parcial_com_range_e_if_range(servidor, tmp_path):
+    url = servidor.publicar("/1T2025.zip", CONTEUDO, '"v1"')
+    (tmp_path / "1T2025.zip.part").write_bytes(CONTEUDO[:300000])
+
+    res = downloads.baixar_arquivo(url, str(tmp_path))
+
+    assert res["status"] == "baixado"
+    assert ler(tmp_path / "1T2025.zip") == CONTEUDO
+    (get,) = servidor.gets()
+    assert get[2]["Range"] == "bytes=300000-"
+    assert get[2]["If-Range"] == '"v1"'
+
+
+def test_parcial_de_outra_versao_recomeca(servidor, tmp_path, monkeypatch):
+    # o arquivo mudou entre o HEAD e o GET: o If-Range não confere, o servidor
+    # ignora o Range e manda o arquivo inteiro (200), sem emendar versões
+    url = servidor.publicar("/1T2025.zip", CONTEUDO, '"v2"')
+    (tmp_path / "1T2025.zip.part").write_bytes(b"x" * 300000)
+    consultar = downloads.consultar_remoto
+    monkeypatch.setattr(downloads, "consultar_remoto", lambda u: {**consultar(u), "etag": '"v1"'})
+
+    res = downloads.baixar_arquivo(url, str(tmp_path))
+
+    assert res["status"] == "baixado"
+    assert ler(tmp_path / "1T2025.zip") == CONTEUDO
+    (get,) = servidor.gets()
+    assert get[2]["If-Range"] == '"v1"'
+
+
+def test_download_interrompido_e_retomado(servidor, tmp_path):
+    url = servidor.publicar("/1T2025.zip", CONTEUDO, '"v1"')
+    servidor.cortes = [100000]
+
+    res = downloads.baixar_arquivo(url, str(tmp_path))
+
+    assert res["status"] == "baixado"
+    assert ler(tmp_path / "1T2025.zip") == CONTEUDO
+    primeiro, segundo = servidor.gets()
+    assert "Range" not in primeiro[2]
+    assert segundo[2]["Range"] == "bytes=100000-"
+
+
+def test_checksum_errado_baixa_de_novo(servidor, tmp_path):
+    url = servidor.publicar("/1T2025.zip", CONTEUDO, '"v1"')
+    sha = hashlib.sha256(CONTEUDO).hexdigest()
+    servidor.corrompidos = 1
+
+    res = downloads.baixar_arquivo(url, str(tmp_path), sha256_esperado=sha)
+
+    assert res["status"] == "baixado"
+    assert ler(tmp_path / "1T2025.zip") == CONTEUDO
+    assert len(servidor.gets()) == 2
+
+
+def test_checksum_sempre_errado_nao_grava_destino(servidor, tmp_path):
+    url = servidor.publicar("/1T2025.zip", CONTEUDO, '"v1"')
+    servidor.corrompidos = downloads.TENTATIVAS
+
+    res = downloads.baixar_arquivo(url, str(tmp_path), sha256_esperado=hashlib.sha256(CONTEUDO).hexdigest())
+
+    assert res["status"] == "erro"
+    assert "checksum" in res["erro"]
+    assert not (tmp_path / "1T2025.zip").exists()
+
+
+def test_existente_completo_nao_baixa(servidor, tmp_path):
+    url = servidor.publicar("/1T2025.zip", CONTEUDO, '"v1"')
+    (tmp_path / "1T2025.zip").write_bytes(CONTEUDO)
+
+    res = downloads.baixar_arquivo(url, str(tmp_path), usar_cache=False)
+
+    assert res["status"] == "existente"
+    assert servidor.gets() == []
+
+
+@pytest.mark.parametrize("estrago", ["truncado", "corrompido"])
+def test_copia_local_estragada_com_etag_no_cache(servidor, tmp_path, estrago):
+    url = servidor.publicar("/1T2025.zip", CONTEUDO, '"v1"')
+    sha = hashlib.sha256(CONTEUDO).hexdigest()
+    downloads.baixar_arquivo(url, str(tmp_path), sha256_esperado=sha)
+
+    destino = tmp_path / "1T2025.zip"
+    if estrago == "truncado":
+        destino.write_bytes(CONTEUDO[:1000])
+    else:
+        destino.write_bytes(b"\xff" + CONTEUDO[1:])
+    servidor.requisicoes.clear()
+
+    res = downloads.baixar_arquivo(url, str(tmp_path), sha256_esperado=sha)
+
+    assert res["status"] == "baixado"
+    assert ler(destino) == CONTEUDO
+    assert all("If-None-Match" not in r[2] for r in servidor.gets())
+
+
+def test_baixar_varios_mantem_ordem(servidor, tmp_path, capsys):
+    urls = [servidor.publicar(f"/{i}T2025.zip", CONTEUDO[i:], f'"{i}"') for i in range(1, 5)]
+
+    resultados = downloads.baixar_varios(urls, str(tmp_path), max_simultaneos=2)
+
+    assert [r["url"] for r in resultados] == urls
+    assert all(r["status"] == "baixado" for r in resultados)
+    for i in range(1, 5):
+        assert ler(tmp_path / f"{i}T2025.zip") == CONTEUDO[i:]
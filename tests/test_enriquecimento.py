@@ -0,0 +1,87 @@
+import importlib
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def enriquecimento(tmp_path, monkeypatch):
+    # o módulo cria a pasta de saída (caminho relativo) ao ser importado
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("teste2_2_enriquecimento")
+
+
+def escolher_modo_ou_primeiro(serie):
+    vals = [v for v in serie.dropna().astype(str).tolist() if v.strip() != ""]
+    if not vals:
+        return None
+    vc = pd.Series(vals).value_counts()
+    top = vc[vc == vc.max()].index.tolist()
+    return sorted(top)[0]
+
+
+def resolver_referencia(df, chave, campos):
+    """Implementação anterior (groupby().apply por CNPJ)."""
+    def agregador(grp):
+        out = {}
+        status_dup = False
+        for out_name, col in campos.items():
+            uniques = grp[col].dropna().astype(str).str.strip()
+            if len(uniques[uniques != ""].unique()) > 1:
+                status_dup = True
+            out[out_name] = escolher_modo_ou_primeiro(grp[col])
+        out["cnpj"] = str(grp.name)
+        out["status_cadastro"] = "CADASTRO_DUPLICADO" if status_dup else "OK"
+        return pd.Series(out)
+
+    return df.groupby(chave).apply(agregador).reset_index(drop=True)
+
+
+def cadastro_aleatorio(linhas, seed):
+    rng = np.random.default_rng(seed)
+    valores = np.array(["A", "B", " A", "A ", "", "  ", "b", "Z", None, "ção"], dtype=object)
+    return pd.DataFrame({
+        "cnpj_norm": rng.integers(0, linhas // 2, linhas).astype(str).astype(object),
+        "registro": valores[rng.integers(0, len(valores), linhas)],
+        "modalidade": valores[rng.integers(0, 4, linhas)],
+        "uf": np.array(["SP", "RJ"], dtype=object)[rng.integers(0, 2, linhas)],
+        "razao": None,
+    })
+
+
+CAMPOS = {"registro_ans": "registro", "modalidade": "modalidade", "uf": "uf", "razao_social": "razao"}
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_resolver_duplicados_igual_ao_agregador(enriquecimento, seed):
+    df = cadastro_aleatorio(2000, seed)
+
+    obtido = enriquecimento.resolver_duplicados(df, "cnpj_norm", CAMPOS)
+    esperado = resolver_referencia(df, "cnpj_norm", CAMPOS)
+
+    assert list(obtido.columns) == list(esperado.columns)
+    assert len(obtido) == len(esperado)
+    for coluna in esperado.columns:
+        assert obtido[coluna].isna().tolist() == esperado[coluna].isna().tolist(), coluna
+        assert obtido[coluna].dropna().tolist() == esperado[coluna].dropna().tolist(), coluna
+
+
+def test_empate_e_divergencia(enriquecimento):
+    df = pd.DataFrame({
+        "cnpj_norm": ["2", "2", "2", "2", "1", "1"],
+        "registro": ["B", "A", "B", "A", "X", " X "],
+        "modalidade": ["M", "M", None, "", "N", "N"],
+        "uf": ["SP", "SP", "SP", "SP", None, ""],
+        "razao": None,
+    })
+
+    obtido = enriquecimento.resolver_duplicados(df, "cnpj_norm", CAMPOS)
+
+    assert obtido["cnpj"].tolist() == ["1", "2"]
+    assert obtido["registro_ans"].tolist() == [" X ", "A"]  # empate -> primeiro ordenado
+    assert obtido["uf"].tolist() == [None, "SP"]
+    assert obtido["razao_social"].tolist() == [None, None]
+    # "X" e " X " são o mesmo valor após strip; "A"/"B" divergem
+    assert obtido["status_cadastro"].tolist() == ["OK", "CADASTRO_DUPLICADO"]
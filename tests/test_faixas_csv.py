@@ -0,0 +1,76 @@
+import random
+
+import pandas as pd
+import pytest
+
+from faixas_csv import abrir_faixa, dividir_em_faixas, ler_cabecalho
+
+
+def gravar(tmp_path, conteudo):
+    caminho = tmp_path / "consolidado.csv"
+    caminho.write_bytes(conteudo)
+    return str(caminho)
+
+
+def csv_aleatorio(rng, linhas, final=b"\n"):
+    cabecalho = b"CNPJ;RazaoSocial;Trimestre;Ano;ValorDespesas\n"
+    corpo = b"\n".join(
+        f"{rng.randint(0, 10**14):014d};OPERADORA {'X' * rng.randint(0, 40)};{rng.randint(1, 4)}T;2025;{rng.random() * 1e6:.2f}"
+        .encode("utf-8")
+        for _ in range(linhas)
+    )
+    return cabecalho + corpo + (final if linhas else b"")
+
+
+@pytest.mark.parametrize("quantidade", [1, 2, 3, 7, 50, 5000])
+@pytest.mark.parametrize("final", [b"\n", b""])
+def test_faixas_cobrem_o_arquivo_em_fim_de_linha(tmp_path, quantidade, final):
+    conteudo = csv_aleatorio(random.Random(quantidade), 1000, final)
+    caminho = gravar(tmp_path, conteudo)
+    inicio_dados = len(ler_cabecalho(caminho))
+
+    faixas = dividir_em_faixas(caminho, quantidade)
+
+    assert 1 <= len(faixas) <= quantidade
+    assert faixas[0][0] == inicio_dados
+    assert faixas[-1][1] == len(conteudo)
+    for (_, fim), (inicio, _) in zip(faixas, faixas[1:]):
+        assert fim == inicio  # sem buraco nem sobreposição
+        assert conteudo[inicio - 1:inicio] == b"\n"  # corte logo depois de um '\n'
+    assert all(inicio < fim for inicio, fim in faixas)
+
+
+@pytest.mark.parametrize("quantidade", [1, 4, 15])
+def test_faixas_lidas_reproduzem_o_arquivo(tmp_path, quantidade):
+    conteudo = csv_aleatorio(random.Random(0), 3000)
+    caminho = gravar(tmp_path, conteudo)
+    cabecalho = ler_cabecalho(caminho)
+
+    lidos = []
+    for inicio, fim in dividir_em_faixas(caminho, quantidade):
+        with abrir_faixa(caminho, inicio, fim, cabecalho) as f:
+            bruto = f.read()
+        assert bruto.startswith(cabecalho)
+        lidos.append(bruto[len(cabecalho):])
+    assert cabecalho + b"".join(lidos) == conteudo
+
+    partes = []
+    for inicio, fim in dividir_em_faixas(caminho, quantidade):
+        with abrir_faixa(caminho, inicio, fim) as f:
+            partes.append(pd.read_csv(f, sep=";", dtype=str))
+    esperado = pd.read_csv(caminho, sep=";", dtype=str)
+    pd.testing.assert_frame_equal(pd.concat(partes, ignore_index=True), esperado)
+
+
+def test_so_cabecalho_nao_tem_faixas(tmp_path):
+    assert dividir_em_faixas(gravar(tmp_path, b"a;b\n"), 4) == []
+    assert dividir_em_faixas(gravar(tmp_path, b"a;b"), 4) == []
+
+
+def test_linha_maior_que_a_faixa(tmp_path):
+    conteudo = b"a;b\n" + b"1;" + b"x" * 5000 + b"\n2;y\n"
+    caminho = gravar(tmp_path, conteudo)
+
+    faixas = dividir_em_faixas(caminho, 10)
+
+    assert faixas == [(4, 4 + 5003), (4 + 5003, len(conteudo))]
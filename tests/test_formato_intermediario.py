@@ -0,0 +1,116 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import formato_intermediario as fi
+
+
+@pytest.mark.parametrize("formato", ["numpy", "csv"])
+def test_projecao_ignora_colunas_ausentes(tmp_path, formato):
+    df = pd.DataFrame({"cd_conta_contabil": ["411", "412"], "vl_saldo_final": [1.5, 2.0]})
+    caminho = fi.gravar_tabela(df, str(tmp_path / "1T2025_despesas"), formato)
+
+    chunks = list(fi.iterar_tabela(caminho, colunas=["reg_ans", "vl_saldo_final"]))
+
+    assert [list(c.columns) for c in chunks] == [["vl_saldo_final"]]
+    assert chunks[0]["vl_saldo_final"].tolist() == [1.5, 2.0]
+    assert list(fi.ler_tabela(caminho, colunas=["reg_ans"]).columns) == []
+
+
+def test_ler_parte_numpy_com_projecao(tmp_path):
+    df = pd.DataFrame({"reg_ans": ["1", None], "valor": [1.0, 2.0]})
+    caminho = fi.gravar_tabela(df, str(tmp_path / "t"), "numpy")
+    (parte,) = fi.partes_tabela(caminho)
+
+    lido = fi.ler_parte(parte, colunas=["valor", "ausente", "reg_ans"])
+
+    assert list(lido.columns) == ["valor", "reg_ans"]
+    assert lido["reg_ans"].iloc[0] == "1"
+    assert pd.isna(lido["reg_ans"].iloc[1])
+
+
+def tabela_tipada(linhas=1000):
+    rng = np.random.default_rng(8)
+    descricoes = np.array(["EVENTOS CONHECIDOS", "SINISTROS AVISADOS", "OUTRAS"], dtype=object)
+    df = pd.DataFrame({
+        "reg_ans": pd.Categorical(rng.integers(0, 50, linhas).astype(str)),
+        "descricao": pd.Categorical(descricoes[rng.integers(0, 3, linhas)]),
+        "trimestre": pd.Categorical(["1T", "2T"] * (linhas // 2), categories=["1T", "2T", "3T", "4T"], ordered=True),
+        "ano": pd.Categorical([2025] * linhas),
+        "uf": np.array(["SP", "RJ", None], dtype=object)[rng.integers(0, 3, linhas)],
+        "razao_social": [f"OPERADORA {i}" for i in range(linhas)],
+        "valor": rng.random(linhas),
+        "linhas": rng.integers(0, 10, linhas),
+    })
+    df.loc[::7, "reg_ans"] = None
+    return df
+
+
+def test_roundtrip_numpy_preserva_tipos(tmp_path):
+    df = tabela_tipada()
+    caminho = fi.gravar_tabela(df, str(tmp_path / "t"), "numpy", linhas_por_parte=300)
+
+    lido = fi.ler_tabela(caminho)
+
+    for coluna in ("reg_ans", "descricao", "trimestre", "ano"):
+        assert isinstance(lido[coluna].dtype, pd.CategoricalDtype), coluna
+        assert list(lido[coluna].cat.categories) == list(df[coluna].cat.categories), coluna
+        assert lido[coluna].astype(object).where(lido[coluna].notna(), None).tolist() == \
+            df[coluna].astype(object).where(df[coluna].notna(), None).tolist(), coluna
+    assert lido["trimestre"].cat.ordered
+    assert lido["valor"].dtype == np.float64 and (lido["valor"] == df["valor"]).all()
+    assert lido["linhas"].dtype == df["linhas"].dtype and (lido["linhas"] == df["linhas"]).all()
+    for coluna in ("uf", "razao_social"):
+        assert not isinstance(lido[coluna].dtype, pd.CategoricalDtype)
+        assert lido[coluna].isna().tolist() == df[coluna].isna().tolist()
+        assert lido[coluna].dropna().tolist() == df[coluna].dropna().tolist()
+
+
+def test_numpy_guarda_codigos_em_vez_de_texto(tmp_path):
+    df = tabela_tipada(4000)
+    caminho = fi.gravar_tabela(df, str(tmp_path / "t"), "numpy")
+    (parte,) = fi.partes_tabela(caminho)
+    indice = {nome: i for i, nome in enumerate(df.columns)}
+
+    codigos = np.load(os.path.join(parte, f"{indice['descricao']}.npy"))
+    dicionario = np.load(os.path.join(parte, f"{indice['uf']}.npy"))
+
+    assert codigos.dtype == np.int8 and dicionario.dtype == np.int8
+    assert os.path.exists(os.path.join(parte, f"{indice['uf']}.dicionario.npy"))
+    assert os.path.exists(os.path.join(parte, f"{indice['razao_social']}.nulos.npy"))
+
+    # colunas repetitivas (o caso dos arquivos filtrados) ficam menores que o CSV
+    repetitivas = df[["reg_ans", "descricao", "trimestre", "uf"]]
+    binario = fi.tamanho_bytes(fi.gravar_tabela(repetitivas, str(tmp_path / "r"), "numpy"))
+    assert binario < os.path.getsize(fi.gravar_tabela(repetitivas, str(tmp_path / "r"), "csv")) / 3
+
+
+def test_localizar_tabela_prefere_formato_configurado(tmp_path, capsys):
+    df = pd.DataFrame({"a": [1, 2]})
+    base = str(tmp_path / "consolidado")
+    fi.exportar_tabela(df, base, "numpy")  # .csv + .npcol
+
+    # data de modificação não importa (ex: checkout que reescreve o CSV)
+    os.utime(base + ".csv", (2**31, 2**31))
+    assert fi.localizar_tabela(base) == base + ".npcol"
+    assert fi.localizar_tabela(base, "numpy") == base + ".npcol"
+    assert fi.localizar_tabela(base, "csv") == base + ".csv"
+    assert fi.localizar_tabela(str(tmp_path / "outra")) is None
+
+    # outra tabela binária sobrando: ignorada com aviso
+    os.makedirs(base + ".parquet")
+    assert fi.localizar_tabela(base, "numpy") == base + ".npcol"
+    assert "ignorando" in capsys.readouterr().out
+
+
+def test_gravar_apaga_outros_formatos(tmp_path):
+    df = pd.DataFrame({"a": [1, 2]})
+    base = str(tmp_path / "t")
+    fi.exportar_tabela(df, base, "numpy")
+
+    fi.exportar_tabela(df, base, "csv")
+
+    assert not os.path.exists(base + ".npcol")
+    assert fi.localizar_tabela(base, "numpy") == base + ".csv"
@@ -0,0 +1,59 @@
+import os
+
+import pandas as pd
+
+import particoes
+
+
+def test_hash_reaproveitado_quando_tamanho_e_mtime_nao_mudam(tmp_path, monkeypatch):
+    origem = tmp_path / "origem"
+    origem.mkdir()
+    (origem / "1T2025_despesas.csv").write_text("reg_ans;vl_saldo_final\n1;2,0\n", encoding="utf-8")
+    pasta = str(tmp_path / "particoes")
+    periodo = (2025, "1T")
+    resumo = pd.DataFrame({"reg_ans": ["1"], "valor": [2.0]})
+
+    p = particoes.ParticoesConsolidado(pasta, "v1", "numpy")
+    fontes = p.fontes(periodo, str(origem), ["1T2025_despesas.csv"])
+    p.gravar(periodo, resumo, fontes)
+    p.salvar_manifesto()
+
+    chamadas = []
+    sha256 = particoes.sha256_caminho
+    monkeypatch.setattr(particoes, "sha256_caminho", lambda c: chamadas.append(c) or sha256(c))
+
+    # sem mudança: nenhum hash recalculado, partição reaproveitada
+    p = particoes.ParticoesConsolidado(pasta, "v1", "numpy")
+    fontes = p.fontes(periodo, str(origem), ["1T2025_despesas.csv"])
+    assert chamadas == []
+    pd.testing.assert_frame_equal(p.ler(periodo, fontes), resumo)
+
+    # mtime novo, mesmo conteúdo: recalcula o hash, mas reaproveita a partição
+    arquivo = origem / "1T2025_despesas.csv"
+    os.utime(arquivo, ns=(arquivo.stat().st_atime_ns, arquivo.stat().st_mtime_ns + 10**9))
+    fontes = p.fontes(periodo, str(origem), ["1T2025_despesas.csv"])
+    assert len(chamadas) == 1
+    assert p.ler(periodo, fontes) is not None
+    p.salvar_manifesto()
+
+    # o mtime novo foi para o manifesto: a próxima execução não relê
+    p = particoes.ParticoesConsolidado(pasta, "v1", "numpy")
+    p.fontes(periodo, str(origem), ["1T2025_despesas.csv"])
+    assert len(chamadas) == 1
+
+    # conteúdo mudou: partição desatualizada
+    arquivo.write_text("reg_ans;vl_saldo_final\n1;3,0\n", encoding="utf-8")
+    fontes = p.fontes(periodo, str(origem), ["1T2025_despesas.csv"])
+    assert p.ler(periodo, fontes) is None
+
+
+def test_estado_de_tabela_em_pasta_muda_com_as_partes(tmp_path):
+    tabela = tmp_path / "t.npcol"
+    (tabela / "00000").mkdir(parents=True)
+    (tabela / "00000" / "0.npy").write_bytes(b"abc")
+    antes = particoes.estado_caminho(str(tabela))
+
+    (tabela / "00000" / "0.npy").write_bytes(b"abcd")
+
+    assert antes[0] == 3
+    assert particoes.estado_caminho(str(tabela))[0] == 4
@@ -0,0 +1,59 @@
+import importlib
+import os
+
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    # o pipeline usa caminhos relativos (roda a partir da raiz do projeto)
+    monkeypatch.chdir(tmp_path)
+    modulo = importlib.import_module("teste1_pipeline")
+    monkeypatch.setattr(modulo, "FORMATO_INTERMEDIARIO", "csv")
+    return modulo
+
+
+def test_etapa4_ignora_indice_de_contas(pipeline, tmp_path):
+    origem = tmp_path / "dados_despesas_sinistros"
+    origem.mkdir()
+    (origem / "1T2025_despesas.csv").write_text(
+        "data;reg_ans;cd_conta_contabil;descricao;vl_saldo_final\n"
+        "2025-01-01;123456;311;EVENTOS;1000.5\n",
+        encoding="utf-8",
+    )
+    (origem / pipeline.ARQUIVO_INDICE_CONTAS).write_text(
+        "cd_conta_contabil;descricao;manter;motivo;linhas\n311;EVENTOS;True;classe;1\n", encoding="utf-8"
+    )
+
+    assert pipeline.etapa4_normalizar()
+
+    normalizados = sorted(os.listdir(tmp_path / "dados_normalizados"))
+    assert "1T2025_despesas_normalizado.csv" in normalizados
+    assert not any("INDICE" in nome for nome in normalizados)
+
+
+def test_indice_de_contas_fora_da_entrada_da_etapa4(pipeline, tmp_path):
+    indice = pipeline.IndiceContas(pipeline.PALAVRAS_CHAVE, pipeline.CLASSE_DESPESAS)
+    indice.mascara(pd.Series(["311", "411"]), pd.Series(["EVENTOS", "OUTRAS"]))
+
+    pipeline.gravar_indice_contas([{"contas": indice}])
+
+    assert (tmp_path / "dados_consolidados" / pipeline.ARQUIVO_INDICE_CONTAS).exists()
+    assert not (tmp_path / "dados_despesas_sinistros").exists()
+
+
+def test_chunk_size_lido_na_hora(pipeline, tmp_path, monkeypatch):
+    arquivo = tmp_path / "dados.csv"
+    arquivo.write_text("a;b\n" + "".join(f"{i};x\n" for i in range(10)), encoding="utf-8")
+    monkeypatch.setattr(pipeline, "CHUNK_SIZE", 3)
+
+    tamanhos = [len(chunk) for chunk in pipeline.iterar_chunks_texto(str(arquivo))]
+
+    assert tamanhos == [3, 3, 3, 1]
+
+    # teto do orçamento de memória acompanha o CHUNK_SIZE atual
+    monkeypatch.setattr(pipeline, "CHUNK_SIZE", 20)
+    tamanho = pipeline.TamanhoChunk(memoria_maxima=10**12)
+    tamanho.bytes_por_linha = 1.0
+    assert tamanho.proximo() == pipeline.FATOR_CHUNK_MAXIMO * 20
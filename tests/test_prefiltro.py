@@ -0,0 +1,115 @@
+import csv
+import io
+import random
+
+import pandas as pd
+import pytest
+
+from prefiltro import Prefiltro, filtrar_bloco
+
+
+def filtrar_referencia(dados, indice_campo, separador, prefixo):
+    """Versão Python simples de filtrar_bloco (linha a linha, com o módulo csv)."""
+    mantidas, descartadas = [], 0
+    for linha in dados.decode("latin-1").splitlines(keepends=True):
+        campos = next(csv.reader([linha.rstrip("\n")], delimiter=separador), [])
+        if len(campos) > indice_campo and not campos[indice_campo].startswith(prefixo):
+            descartadas += 1
+        else:
+            mantidas.append(linha)
+    return "".join(mantidas).encode("latin-1"), descartadas
+
+
+def linhas_aleatorias(rng, n, campos, aspas):
+    valores = ["3", "31", "311", "4", "41", "", "x3", "3;1", "a;b", "ção", '"3"', "3 ", " 3"]
+    linhas = []
+    for _ in range(n):
+        quantidade = rng.choice([campos, campos, campos, campos - 2, campos + 1, 1, 0])
+        linha = []
+        for _ in range(max(0, quantidade)):
+            v = rng.choice(valores)
+            if aspas or ";" in v or '"' in v:
+                v = '"' + v.replace('"', '""') + '"'
+            linha.append(v)
+        linhas.append(";".join(linha))
+    return linhas
+
+
+@pytest.mark.parametrize("aspas", [False, True])
+@pytest.mark.parametrize("indice_campo", [0, 1, 3])
+@pytest.mark.parametrize("final", ["\n", ""])
+def test_filtrar_bloco_igual_referencia(aspas, indice_campo, final):
+    rng = random.Random(indice_campo * 10 + aspas)
+    for _ in range(30):
+        dados = ("\n".join(linhas_aleatorias(rng, rng.randint(1, 40), 5, aspas)) + final).encode("latin-1")
+        if not dados:
+            continue
+
+        obtido = filtrar_bloco(dados, indice_campo, b";", b"3")
+
+        assert obtido == filtrar_referencia(dados, indice_campo, ";", "3")
+
+
+def test_layout_ans_todo_entre_aspas():
+    dados = (
+        b'"2025-01-01";"123456";"311";"EVENTOS";"1.000,00"\n'
+        b'"2025-01-01";"123456";"411";"OUTRAS";"2,00"\n'
+        b'"2025-01-01";"654321";"3";"DESPESAS";"3,50"\n'
+    )
+
+    filtrado, descartadas = filtrar_bloco(dados, 2, b";", b"31")
+
+    assert descartadas == 2
+    assert filtrado == dados.splitlines(keepends=True)[0]
+
+
+def test_linha_com_menos_campos_passa():
+    dados = b"a;b;4\nsem separador\n\nx;y\n"
+
+    filtrado, descartadas = filtrar_bloco(dados, 2, b";", b"3")
+
+    assert (filtrado, descartadas) == (b"sem separador\n\nx;y\n", 1)
+
+
+def test_bloco_vazio():
+    assert filtrar_bloco(b"", 1, b";", b"3") == (b"", 0)
+
+
+def csv_ans(rng, linhas):
+    texto = ["DATA;REG_ANS;CD_CONTA_CONTABIL;DESCRICAO;VL_SALDO_FINAL"]
+    for _ in range(linhas):
+        conta = rng.choice(["311", "3411", "411", "21", "1"])
+        texto.append(f'"2025-01-01";"{rng.randint(1, 999)}";"{conta}";"DESC; {conta}";"{rng.randint(0, 9999)},50"')
+    return ("\n".join(texto) + "\n").encode("latin-1")
+
+
+@pytest.mark.parametrize("tamanho_bloco", [64, 1000, 1 << 20])
+def test_prefiltro_no_read_csv(tamanho_bloco):
+    dados = csv_ans(random.Random(tamanho_bloco), 500)
+    colunas = ["data", "reg_ans", "cd_conta_contabil", "descricao", "vl_saldo_final"]
+    prefiltro = Prefiltro("cd_conta_contabil", "3", tamanho_bloco=tamanho_bloco, proporcao_maxima=1.0)
+
+    stream = prefiltro.envolver(io.BytesIO(dados), colunas, "latin-1", ";")
+    obtido = pd.read_csv(stream, sep=";", dtype=str, encoding="latin-1")
+
+    esperado = pd.read_csv(io.BytesIO(dados), sep=";", dtype=str, encoding="latin-1")
+    esperado = esperado[esperado["CD_CONTA_CONTABIL"].str.startswith("3")].reset_index(drop=True)
+    pd.testing.assert_frame_equal(obtido, esperado)
+    assert prefiltro.linhas_descartadas == 500 - len(esperado)
+
+
+def test_prefiltro_desliga_quando_quase_tudo_passa():
+    dados = csv_ans(random.Random(1), 200).replace(b'"411"', b'"311"').replace(b'"21"', b'"31"').replace(b'"1"', b'"3"')
+    prefiltro = Prefiltro("cd_conta_contabil", "3", tamanho_bloco=256, proporcao_maxima=0.4)
+    colunas = ["data", "reg_ans", "cd_conta_contabil", "descricao", "vl_saldo_final"]
+
+    saida = prefiltro.envolver(io.BytesIO(dados), colunas, "latin-1", ";").read()
+
+    assert not prefiltro.ativo
+    assert saida == dados
+
+
+def test_prefiltro_ignora_coluna_ausente_e_encoding_incompativel():
+    bruto = io.BytesIO(b"a;b\n1;2\n")
+    assert Prefiltro("cd_conta_contabil", "3").envolver(bruto, ["a", "b"], "utf-8", ";") is bruto
+    assert Prefiltro("a", "3").envolver(bruto, ["a", "b"], "utf-16", ";") is bruto
@@ -0,0 +1,71 @@
+import importlib
+import random
+
+import pandas as pd
+import pytest
+
+from formato_intermediario import gravar_tabela
+
+
+@pytest.fixture
+def validacao(tmp_path, monkeypatch):
+    # o módulo usa caminhos relativos (roda a partir da raiz do projeto)
+    monkeypatch.chdir(tmp_path)
+    modulo = importlib.import_module("teste2_1_validacao")
+    monkeypatch.setattr(modulo, "PASTA_SAIDA", "dados_validados")
+    (tmp_path / "dados_validados").mkdir(exist_ok=True)
+    (tmp_path / "dados_consolidados").mkdir()
+    return modulo
+
+
+def gravar_consolidado(tmp_path, linhas):
+    rng = random.Random(linhas)
+    texto = ["reg_ans;ano;trimestre;valor_despesas"]
+    for _ in range(linhas):
+        texto.append(";".join([
+            rng.choice([str(rng.randint(1, 999999)), "", " "]),
+            rng.choice(["2025", "2024", "1999", "abc", ""]),
+            rng.choice(["1T", "2T", "3T", "4T", "5T", " 1t", ""]),
+            rng.choice([f"{rng.random() * 1e5:.2f}", "0", "-3.5", "x", ""]),
+        ]))
+    (tmp_path / "dados_consolidados" / "consolidado_despesas.csv").write_text("\n".join(texto) + "\n", encoding="utf-8")
+
+
+def saidas(tmp_path):
+    return {
+        nome: (tmp_path / "dados_validados" / nome).read_bytes()
+        for nome in ("despesas_validadas.csv", "despesas_invalidas.csv")
+    }
+
+
+@pytest.mark.parametrize("workers,faixa", [(2, 64 * 1024 * 1024), (4, 2000), (3, 500)])
+def test_paralelo_igual_ao_serial(validacao, tmp_path, monkeypatch, workers, faixa):
+    monkeypatch.setattr(validacao, "FORMATO_INTERMEDIARIO", "csv")
+    monkeypatch.setattr(validacao, "CHUNK_SIZE", 97)
+    gravar_consolidado(tmp_path, 2000)
+
+    assert validacao.validar_dados(em_chunks=False, workers=1)
+    serial = saidas(tmp_path)
+
+    assert validacao.validar_dados(em_chunks=True, workers=1)
+    assert saidas(tmp_path) == serial
+
+    monkeypatch.setattr(validacao, "TAMANHO_FAIXA", faixa)
+    assert validacao.validar_dados(workers=workers)
+    assert saidas(tmp_path) == serial
+
+
+def test_paralelo_por_partes_da_tabela_binaria(validacao, tmp_path, monkeypatch):
+    monkeypatch.setattr(validacao, "FORMATO_INTERMEDIARIO", "numpy")
+    gravar_consolidado(tmp_path, 1500)
+    caminho_csv = tmp_path / "dados_consolidados" / "consolidado_despesas.csv"
+    df = pd.read_csv(caminho_csv, sep=";", dtype=str, keep_default_na=False)
+    caminho_csv.unlink()
+    gravar_tabela(df, str(tmp_path / "dados_consolidados" / "consolidado_despesas"), "numpy", linhas_por_parte=400)
+
+    assert validacao.validar_dados(workers=1)
+    serial = saidas(tmp_path)
+    assert serial["despesas_invalidas.csv"].count(b"\n") > 100
+
+    assert validacao.validar_dados(workers=3)
+    assert saidas(tmp_path) == serial